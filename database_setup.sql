@@ -5,6 +5,7 @@
 -- =====================================================
 
 -- Drop existing tables if they exist (in correct order to handle foreign keys)
+DROP TABLE IF EXISTS "ProcessedEvent" CASCADE;
 DROP TABLE IF EXISTS "TimeTable" CASCADE;
 DROP TABLE IF EXISTS "Students" CASCADE;
 DROP TABLE IF EXISTS "Teacher" CASCADE;
@@ -115,6 +116,20 @@ CREATE TABLE "TimeTable" (
         ON UPDATE CASCADE
 );
 
+-- ProcessedEvent Table (client event IDs already recorded; a replayed
+-- entry/exit/zone event with the same ID is not recorded again)
+CREATE TABLE "ProcessedEvent" (
+    "Event_ID" UUID PRIMARY KEY,
+    "Type" VARCHAR(20) NOT NULL,
+    "TimeTable_ID" INTEGER,
+    "ProcessedAt" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT "fk_processedevent_timetable" 
+        FOREIGN KEY ("TimeTable_ID") 
+        REFERENCES "TimeTable"("TimeTable_ID") 
+        ON DELETE SET NULL 
+        ON UPDATE CASCADE
+);
+
 -- =====================================================
 -- CREATE INDEXES (Optional - for better performance)
 -- =====================================================
@@ -129,6 +144,7 @@ CREATE INDEX idx_timetable_teacher ON "TimeTable"("Teacher_ID");
 CREATE INDEX idx_timetable_student ON "TimeTable"("Student_ID");
 CREATE INDEX idx_timetable_zone ON "TimeTable"("Zone_id");
 CREATE INDEX idx_timetable_persontype ON "TimeTable"("PersonType");
+CREATE INDEX idx_processedevent_processedat ON "ProcessedEvent"("ProcessedAt");
 
 -- =====================================================
 -- SAMPLE INSERT STATEMENTS
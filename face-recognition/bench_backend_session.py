@@ -0,0 +1,187 @@
+"""
+IntelliSight - Backend Session Benchmark
+Author: IntelliSight Team
+Description: Event throughput with a new connection per request vs. a pooled keep-alive session
+
+Starts a local stub of the backend (login, health and the timetable
+endpoints) on a free port and posts the same entry events with
+module-level requests.post, as the backend clients used to, and with the
+pooled session from utils.create_http_session. The stub counts accepted
+TCP connections, so the reuse is visible next to the timings. Finally
+BackendAPI itself sends the events through its dispatcher, which batches
+them into bulk requests.
+
+Usage:
+    python bench_backend_session.py
+    python bench_backend_session.py --events 2000 --latency-ms 2
+"""
+
+import json
+import time
+import logging
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+from utils import create_http_session, load_config
+
+
+class StubBackend(ThreadingHTTPServer):
+    """Minimal keep-alive stand-in for the IntelliSight backend"""
+    
+    daemon_threads = True
+    
+    def __init__(self, latency: float = 0.0):
+        """
+        Start the stub on a free localhost port
+        
+        Args:
+            latency: Seconds each event request takes
+        """
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.connections = 0
+        self.events = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+    
+    @property
+    def url(self) -> str:
+        """Base URL of the stub"""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like the backend routes used by BackendAPI"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    # Like Node's HTTP server; otherwise Nagle's algorithm delays the body
+    # write that follows the headers on a kept-alive connection
+    disable_nagle_algorithm = True
+    
+    def setup(self):
+        """Count each accepted TCP connection"""
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+    
+    def log_message(self, *args):
+        """Keep the benchmark output quiet"""
+    
+    def _reply(self, status: int, body: Dict):
+        """Send a JSON response on the kept-alive connection"""
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def do_GET(self):
+        """Health check"""
+        self._reply(200, {'success': True})
+    
+    def do_POST(self):
+        """Login and timetable events (single or bulk)"""
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        
+        if self.path.endswith('/auth/login'):
+            self._reply(200, {'success': True, 'data': {'token': 'benchmark'}})
+            return
+        
+        time.sleep(self.server.latency)
+        
+        if self.path.endswith('/bulk'):
+            count = len(body['events'])
+            with self.server.lock:
+                self.server.events += count
+            results = [{'index': i, 'eventId': event.get('eventId'), 'success': True}
+                       for i, event in enumerate(body['events'])]
+            self._reply(200, {'success': True, 'data': {'recorded': count, 'duplicates': 0, 'rejected': 0,
+                                                        'results': results}})
+            return
+        
+        with self.server.lock:
+            self.server.events += 1
+        self._reply(201 if self.path.endswith('/entry') else 200, {'success': True, 'data': {}})
+
+
+def run(server: StubBackend, events: int, post: Callable) -> Dict:
+    """
+    Post entry events one after another
+    
+    Args:
+        server: Running stub backend
+        events: Number of events
+        post: requests.post or Session.post
+    
+    Returns:
+        Dictionary with events per second and TCP connections opened
+    """
+    url = f"{server.url}/api/timetable/entry"
+    headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer benchmark'}
+    connections = server.connections
+    
+    start = time.perf_counter()
+    for i in range(events):
+        payload = {"personType": "STUDENT", "personId": i % 50 + 1, "zoneId": 1, "cameraId": 1}
+        response = post(url, json=payload, headers=headers, timeout=5)
+        assert response.status_code == 201, response.text
+    elapsed = time.perf_counter() - start
+    
+    return {'rate': events / elapsed, 'connections': server.connections - connections}
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from send_to_backend import BackendAPI
+    
+    parser = argparse.ArgumentParser(description="Benchmark backend HTTP connection reuse")
+    parser.add_argument('--events', type=int, default=1000, help='Events per run (default: 1000)')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='Simulated backend processing time per event (default: 0)')
+    
+    args = parser.parse_args()
+    
+    # Per-event log lines would dominate the timings
+    logging.disable(logging.INFO)
+    
+    server = StubBackend(args.latency_ms / 1000.0)
+    print(f"Stub backend at {server.url}, {args.events} events per run\n")
+    
+    results = {}
+    results['requests.post'] = run(server, args.events, requests.post)
+    
+    session = create_http_session()
+    results['pooled session'] = run(server, args.events, session.post)
+    session.close()
+    
+    for name, result in results.items():
+        print(f"{name:>16}: {result['rate']:8.0f} events/s, {result['connections']:5d} TCP connections")
+    
+    print(f"\nSpeed-up: {results['pooled session']['rate'] / results['requests.post']['rate']:.1f}x")
+    
+    # End to end: BackendAPI with its dispatcher and pooled session
+    with tempfile.TemporaryDirectory() as directory:
+        config = dict(load_config(), backend_url=server.url, api_base_url=f"{server.url}/api",
+                      offline_log_file=f"{directory}/offline.jsonl", dispatch_queue_size=args.events)
+        api = BackendAPI(config)
+        api.login()
+        delivered = server.events
+        connections = server.connections
+        
+        start = time.perf_counter()
+        for i in range(args.events):
+            api.send_entry("STUDENT", i % 50 + 1, zone_id=1)
+        submitted = time.perf_counter() - start
+        api.dispatcher.queue.join()
+        elapsed = time.perf_counter() - start
+        api.close()
+        
+        print(f"\nBackendAPI ({config['dispatch_workers']} dispatch workers, "
+              f"batches of up to {config['bulk_batch_size']}): "
+              f"{args.events / elapsed:.0f} events/s delivered "
+              f"({server.events - delivered} delivered, {server.connections - connections} TCP connections), "
+              f"submit {submitted / args.events * 1e6:.1f} us/event")
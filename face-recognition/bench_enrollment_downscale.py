@@ -0,0 +1,111 @@
+"""
+IntelliSight - Enrollment Detection Benchmark
+Author: IntelliSight Team
+Description: Per-image encoding time at full resolution vs. downscale-before-detect
+
+Generates a synthetic set of large (phone-sized) JPEGs and times
+train_encodings.extract_face_encodings on each with and without the
+detection-resolution cap. Pass --face with a real portrait to paste it
+into every synthetic image so a face is actually found and encoded.
+
+Usage:
+    python bench_enrollment_downscale.py --count 5 --width 4000 --height 3000
+    python bench_enrollment_downscale.py --face dataset/student_1/img1.jpg
+"""
+
+import os
+import cv2
+import time
+import tempfile
+import numpy as np
+from typing import List
+from train_encodings import extract_face_encodings
+
+
+def make_synthetic_images(directory: str, count: int, width: int, height: int,
+                          face_path: str = None) -> List[str]:
+    """
+    Write synthetic large JPEG images
+    
+    Args:
+        directory: Output directory
+        count: Number of images
+        width: Image width in pixels
+        height: Image height in pixels
+        face_path: Optional portrait pasted at a third of the image height
+    
+    Returns:
+        List of image paths
+    """
+    rng = np.random.default_rng(0)
+    face = cv2.imread(face_path) if face_path else None
+    paths = []
+    
+    for i in range(count):
+        # Smooth background with sensor-like noise (compresses like a photo)
+        gradient = np.linspace(40, 200, width, dtype=np.float32)[None, :, None]
+        image = np.broadcast_to(gradient, (height, width, 3)).copy()
+        image += rng.normal(0, 8, image.shape).astype(np.float32)
+        image = np.clip(image, 0, 255).astype(np.uint8)
+        
+        if face is not None:
+            size = height // 3
+            patch = cv2.resize(face, (size * face.shape[1] // face.shape[0], size))
+            y, x = height // 3, (width - patch.shape[1]) // 2
+            image[y:y + patch.shape[0], x:x + patch.shape[1]] = patch
+        
+        path = os.path.join(directory, f"synthetic_{i + 1}.jpg")
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        paths.append(path)
+    
+    return paths
+
+
+def time_extraction(paths: List[str], method: str, max_detect_size: int) -> List[float]:
+    """
+    Time extract_face_encodings per image
+    
+    Args:
+        paths: Image paths
+        method: Detection method ('hog' or 'cnn')
+        max_detect_size: Detection resolution cap (0 = full resolution)
+    
+    Returns:
+        Per-image seconds
+    """
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        extract_face_encodings(path, method=method, max_detect_size=max_detect_size)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Benchmark downscale-before-detect for enrollment")
+    parser.add_argument('--count', type=int, default=5, help='Number of synthetic images (default: 5)')
+    parser.add_argument('--width', type=int, default=4032, help='Image width (default: 4032, 12 MP)')
+    parser.add_argument('--height', type=int, default=3024, help='Image height (default: 3024, 12 MP)')
+    parser.add_argument('--face', type=str, default=None, help='Portrait pasted into every image')
+    parser.add_argument('--method', type=str, default='hog', choices=['hog', 'cnn'],
+                       help='Face detection method (default: hog)')
+    parser.add_argument('--max-detect-size', type=int, default=1024,
+                       help='Detection resolution cap to compare against full resolution (default: 1024)')
+    
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_synthetic_images(tmp, args.count, args.width, args.height, args.face)
+        print(f"Benchmarking {len(paths)} images of {args.width}x{args.height} ({args.method})\n")
+        
+        results = {}
+        for label, cap in (("full resolution", 0), (f"capped at {args.max_detect_size}px", args.max_detect_size)):
+            timings = time_extraction(paths, args.method, cap)
+            results[label] = np.mean(timings)
+            print(f"{label:>22}: {np.mean(timings) * 1000:8.1f} ms/image "
+                  f"(min {np.min(timings) * 1000:.1f}, max {np.max(timings) * 1000:.1f})")
+        
+        full, capped = results.values()
+        print(f"\nSpeed-up: {full / capped:.1f}x")
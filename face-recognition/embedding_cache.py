@@ -0,0 +1,192 @@
+"""
+IntelliSight - Embedding Cache
+Author: IntelliSight Team
+Description: Persistent per-image cache of face boxes and encodings for training runs
+
+Entries are keyed by the SHA-1 of the image content plus the detection method
+and the face model version, so a retrain only encodes new or changed images.
+A second table remembers (size, mtime) per path so unchanged files are not
+re-hashed on every run. Storage is SQLite (standard library) in WAL mode.
+"""
+
+import os
+import sqlite3
+import hashlib
+import numpy as np
+from typing import Iterable, Optional, Tuple
+from utils import setup_logging
+
+logger = setup_logging()
+
+
+def face_model_version() -> str:
+    """Version string of the face detection/encoding models in use"""
+    try:
+        import dlib
+        import face_recognition
+        return (f"face_recognition-{getattr(face_recognition, '__version__', 'unknown')}"
+                f"/dlib-{getattr(dlib, '__version__', 'unknown')}")
+    except ImportError:
+        return "unknown"
+
+
+def file_sha1(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute SHA-1 of a file's content
+    
+    Args:
+        path: File path
+        block_size: Read size in bytes
+    
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed cache of (face box, encoding) per image content hash"""
+    
+    def __init__(self, cache_path: str = "models/embedding_cache.sqlite",
+                 detection_method: str = "hog", model_version: str = None):
+        """
+        Initialize embedding cache
+        
+        Args:
+            cache_path: SQLite database path
+            detection_method: Face detection method the entries belong to
+            model_version: Face model version (detected if None)
+        """
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        
+        self.cache_path = cache_path
+        self.detection_method = detection_method
+        self.model_version = model_version or face_model_version()
+        self.hits = 0
+        self.misses = 0
+        
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " box TEXT,"             # 'top,right,bottom,left' or NULL if no face
+            " encoding BLOB)"        # float64 encoding bytes or NULL if no face
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER,"
+            " mtime_ns INTEGER,"
+            " sha1 TEXT)"
+        )
+        self.conn.commit()
+    
+    def key_for(self, path: str) -> str:
+        """
+        Cache key of an image: content hash + detection method + model version
+        
+        Args:
+            path: Image path
+        
+        Returns:
+            Cache key
+        """
+        st = os.stat(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, sha1 FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            sha1 = row[2]
+        else:
+            sha1 = file_sha1(path)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha1) VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, sha1)
+            )
+        
+        return f"{sha1}:{self.detection_method}:{self.model_version}"
+    
+    def get(self, key: str) -> Tuple[bool, Optional[Tuple[int, int, int, int]], Optional[np.ndarray]]:
+        """
+        Look up a cached result
+        
+        Args:
+            key: Cache key from key_for
+        
+        Returns:
+            Tuple of (found, box, encoding); box and encoding are None for
+            images where no face was detected
+        """
+        row = self.conn.execute(
+            "SELECT box, encoding FROM embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        
+        if row is None:
+            self.misses += 1
+            return False, None, None
+        
+        self.hits += 1
+        box = tuple(int(v) for v in row[0].split(',')) if row[0] else None
+        encoding = np.frombuffer(row[1], dtype=np.float64).copy() if row[1] is not None else None
+        return True, box, encoding
+    
+    def put(self, key: str, box: Optional[Tuple[int, int, int, int]], encoding: Optional[np.ndarray]):
+        """
+        Store a result (call commit() to persist a batch)
+        
+        Args:
+            key: Cache key from key_for
+            box: Face box (top, right, bottom, left) or None
+            encoding: Face encoding or None
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO embeddings (key, box, encoding) VALUES (?, ?, ?)",
+            (
+                key,
+                ','.join(str(int(v)) for v in box) if box is not None else None,
+                np.asarray(encoding, dtype=np.float64).tobytes() if encoding is not None else None
+            )
+        )
+    
+    def commit(self):
+        """Persist pending writes"""
+        self.conn.commit()
+    
+    def prune(self, keep_keys: Iterable[str], keep_paths: Iterable[str]):
+        """
+        Drop entries for images that are no longer in the dataset
+        
+        Args:
+            keep_keys: Cache keys still in use
+            keep_paths: Image paths still in the dataset
+        """
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_keys (key TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_paths (path TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM keep_keys")
+        self.conn.execute("DELETE FROM keep_paths")
+        self.conn.executemany("INSERT OR IGNORE INTO keep_keys VALUES (?)", ((k,) for k in keep_keys))
+        self.conn.executemany("INSERT OR IGNORE INTO keep_paths VALUES (?)", ((p,) for p in keep_paths))
+        
+        # Other detection methods of the current model version are kept
+        removed = self.conn.execute(
+            "DELETE FROM embeddings WHERE key NOT IN (SELECT key FROM keep_keys)"
+            " AND (key LIKE ? OR key NOT LIKE ?)",
+            (f"%:{self.detection_method}:{self.model_version}", f"%:{self.model_version}")
+        ).rowcount
+        self.conn.execute("DELETE FROM files WHERE path NOT IN (SELECT path FROM keep_paths)")
+        self.conn.commit()
+        
+        if removed:
+            logger.info(f"Embedding cache: pruned {removed} stale entries")
+    
+    def close(self):
+        """Commit and close the database"""
+        self.conn.commit()
+        self.conn.close()
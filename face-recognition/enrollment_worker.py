@@ -0,0 +1,136 @@
+"""
+IntelliSight - Persistent Enrollment Worker
+Author: IntelliSight Team
+Description: Long-running face enrollment worker that keeps dlib models warm
+
+Protocol (JSON lines over stdin/stdout):
+    → {"id": "42", "personType": "STUDENT", "personId": 5, "images": ["a.jpg"], "replace": true}
+    ← {"id": "42", "success": true, "message": "...", "result": {...}}
+
+    → {"id": "43", "type": "ping"}
+    ← {"id": "43", "success": true, "message": "pong"}
+
+On startup the worker writes {"type": "ready"} once models are loaded.
+Jobs are processed one at a time; run several workers for concurrency
+(gallery updates are serialised with a lock file).
+Logs go to stderr so stdout carries protocol messages only.
+"""
+
+import sys
+import json
+import time
+from typing import Dict
+from utils import setup_logging, load_config
+from train_encodings import enroll_person
+
+logger = setup_logging()
+
+
+class EnrollmentWorker:
+    """Serve enrollment jobs from a line-oriented JSON stream"""
+    
+    def __init__(self, config: Dict = None, output_path: str = None, detection_method: str = "hog"):
+        """
+        Initialize enrollment worker
+        
+        Args:
+            config: Configuration dictionary
+            output_path: Gallery file to update (defaults to model_path)
+            detection_method: Face detection method ('hog' or 'cnn')
+        """
+        self.config = config or load_config()
+        self.output_path = output_path or self.config.get('model_path', 'models/encodings.pickle')
+        self.detection_method = detection_method
+        self.jobs_done = 0
+    
+    def handle(self, job: Dict) -> Dict:
+        """
+        Run one job
+        
+        Args:
+            job: Job dictionary
+            
+        Returns:
+            Response dictionary
+        """
+        job_id = job.get('id')
+        
+        if job.get('type') == 'ping':
+            return {'id': job_id, 'success': True, 'message': 'pong'}
+        
+        started = time.time()
+        try:
+            images = job.get('images') or []
+            if isinstance(images, str):
+                images = [p for p in images.split(',') if p]
+            
+            result = enroll_person(
+                person_type=job['personType'],
+                person_id=int(job['personId']),
+                image_paths=images,
+                output_path=job.get('output', self.output_path),
+                detection_method=job.get('method', self.detection_method),
+                replace=job.get('replace', True)
+            )
+            self.jobs_done += 1
+            result['seconds'] = round(time.time() - started, 3)
+            return {
+                'id': job_id,
+                'success': True,
+                'message': 'Face encodings generated successfully',
+                'result': result
+            }
+        
+        except Exception as e:
+            logger.error(f"Enrollment job {job_id} failed: {e}")
+            return {'id': job_id, 'success': False, 'message': str(e)}
+    
+    def serve(self, stdin=None, stdout=None):
+        """
+        Process jobs until stdin is closed
+        
+        Args:
+            stdin: Input stream (default: sys.stdin)
+            stdout: Output stream (default: sys.stdout)
+        """
+        stdin = stdin or sys.stdin
+        stdout = stdout or sys.stdout
+        
+        def reply(message: Dict):
+            stdout.write(json.dumps(message) + '\n')
+            stdout.flush()
+        
+        reply({'type': 'ready'})
+        logger.info(f"Enrollment worker ready (gallery: {self.output_path})")
+        
+        for line in stdin:
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                reply({'id': None, 'success': False, 'message': f"Invalid job: {e}"})
+                continue
+            
+            reply(self.handle(job))
+        
+        logger.info(f"Enrollment worker exiting after {self.jobs_done} jobs")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="IntelliSight persistent enrollment worker")
+    parser.add_argument('--output', type=str, default=None,
+                       help='Gallery file to update (default: MODEL_PATH)')
+    parser.add_argument('--method', type=str, default='hog', choices=['hog', 'cnn'],
+                       help='Face detection method: hog (faster) or cnn (more accurate)')
+    
+    args = parser.parse_args()
+    
+    try:
+        EnrollmentWorker(output_path=args.output, detection_method=args.method).serve()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,288 @@
+"""
+IntelliSight - Event Dispatcher
+Author: IntelliSight Team
+Description: Send backend events from background workers so the frame loop never waits on the network
+
+The live loops hand every entry/exit/zone event to submit(), which only
+puts it on an in-memory queue. A small pool of worker threads (bounded
+concurrency) delivers the events in batches: a worker takes up to
+batch_size queued events, waiting at most `linger` seconds after the first
+one for more to arrive. Failed events are retried with jittered
+exponential backoff. Events that still fail, or that arrive while the
+backend is known to be offline, go to the offline store and are replayed
+by the periodic sync, which also runs on a worker (run_in_background).
+
+On stop() the queue is drained for a short while; whatever is left is
+written to the offline store, so no event is lost on shutdown.
+"""
+
+import time
+import queue
+import atexit
+import random
+import threading
+from typing import Callable, Dict, List
+from utils import setup_logging
+
+logger = setup_logging()
+
+
+class EventDispatcher:
+    """Deliver events on background threads with retries and an offline fallback"""
+    
+    def __init__(self, deliver: Callable[[List[Dict]], List[bool]], fallback: Callable[[Dict], None],
+                 can_send: Callable[[], bool] = lambda: True, workers: int = 2,
+                 queue_size: int = 1000, max_retries: int = 3, backoff: float = 0.5,
+                 backoff_max: float = 10.0, batch_size: int = 1, linger: float = 0.0,
+                 name: str = 'events'):
+        """
+        Initialize dispatcher
+        
+        Args:
+            deliver: Send a batch of events, returning per event whether it
+                is done (False = retry later)
+            fallback: Store one event offline
+            can_send: False while the backend is known to be unreachable
+                (events then go straight to the fallback)
+            workers: Worker threads, i.e. concurrent requests
+            queue_size: Events queued before submit() falls back to the offline store
+            max_retries: Retries after the first failed attempt
+            backoff: Base delay in seconds (doubled per retry, full jitter)
+            backoff_max: Upper bound for one retry delay
+            batch_size: Most events delivered together
+            linger: Seconds to wait for a batch to fill
+            name: Thread name prefix for logs
+        """
+        self.deliver = deliver
+        self.fallback = fallback
+        self.can_send = can_send
+        self.workers = max(1, workers)
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.batch_size = max(1, batch_size)
+        self.linger = max(0.0, linger)
+        self.name = name
+        
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.threads = []
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        
+        # Statistics
+        self.submitted = 0
+        self.delivered = 0
+        self.batches = 0
+        self.retried = 0
+        self.stored_offline = 0
+    
+    def start(self) -> 'EventDispatcher':
+        """
+        Start the worker threads
+        
+        Returns:
+            self
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        
+        # Scripts that never call stop() still keep their queued events
+        atexit.register(self.stop)
+        
+        logger.info(f"Event dispatcher started ({self.workers} worker(s), queue {self.queue.maxsize})")
+        return self
+    
+    def submit(self, event: Dict) -> bool:
+        """
+        Queue an event (never blocks)
+        
+        Args:
+            event: Event dictionary
+        
+        Returns:
+            True if queued, False if it was stored offline instead
+        """
+        with self.lock:
+            self.submitted += 1
+        
+        if not self.stopping.is_set():
+            try:
+                self.queue.put_nowait(event)
+                return True
+            except queue.Full:
+                logger.warning("Event queue full - storing event offline")
+        
+        self._store_offline(event)
+        return False
+    
+    def run_in_background(self, job: Callable[[], None]) -> bool:
+        """
+        Run a job (e.g. an offline sync) on a worker thread
+        
+        Args:
+            job: Callable without arguments
+        
+        Returns:
+            True if queued
+        """
+        if self.stopping.is_set():
+            return False
+        
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except queue.Full:
+            return False
+    
+    def _run(self):
+        """Worker loop"""
+        while True:
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self.stopping.is_set():
+                    return
+                continue
+            
+            batch, job = [], None
+            if callable(item):
+                job = item
+            else:
+                batch = self._collect(item)
+                if callable(batch[-1]):
+                    job = batch.pop()
+            
+            try:
+                if batch:
+                    self._dispatch(batch)
+                if job and not self.stopping.is_set():
+                    job()
+            except Exception as e:
+                logger.error(f"Event dispatcher error: {e}")
+            finally:
+                for _ in range(len(batch) + (job is not None)):
+                    self.queue.task_done()
+    
+    def _collect(self, first: Dict) -> List:
+        """
+        Gather a batch starting with `first`
+        
+        Waits up to the linger time for more events. A queued job ends the
+        batch and is appended to it; it runs after the batch is delivered.
+        
+        Args:
+            first: First event of the batch
+            
+        Returns:
+            List of events, possibly ending with a job
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.linger
+        
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            
+            batch.append(item)
+            if callable(item):
+                break
+        
+        return batch
+    
+    def _dispatch(self, batch: List[Dict]):
+        """
+        Deliver a batch, retrying failed events with jittered backoff before falling back
+        
+        Args:
+            batch: Events
+        """
+        pending = batch
+        attempt = 0
+        
+        while pending and self.can_send() and not self.stopping.is_set():
+            try:
+                done = self.deliver(pending)
+            except Exception as e:
+                logger.error(f"Event delivery error: {e}")
+                done = [False] * len(pending)
+            with self.lock:
+                self.batches += 1
+                self.delivered += sum(1 for ok in done if ok)
+            pending = [event for event, ok in zip(pending, done) if not ok]
+            
+            if not pending or attempt >= self.max_retries:
+                break
+            
+            # Full jitter keeps several workers from retrying in lockstep
+            delay = random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+            attempt += 1
+            with self.lock:
+                self.retried += len(pending)
+            if self.stopping.wait(delay):
+                break
+        
+        for event in pending:
+            self._store_offline(event)
+    
+    def _store_offline(self, event: Dict):
+        """Hand an event to the offline store"""
+        try:
+            self.fallback(event)
+            with self.lock:
+                self.stored_offline += 1
+        except Exception as e:
+            logger.error(f"Failed to store event offline: {e}")
+    
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the workers, storing undelivered events offline
+        
+        Args:
+            timeout: Seconds to wait for queued events to be delivered
+        """
+        if not self.threads:
+            return
+        
+        # Give the queue a chance to drain, then stop retrying
+        drained = threading.Event()
+        threading.Thread(target=lambda: (self.queue.join(), drained.set()), daemon=True).start()
+        drained.wait(timeout)
+        self.stopping.set()
+        
+        for thread in self.threads:
+            thread.join(timeout=self.backoff_max + 1.0)
+        self.threads = []
+        
+        # Whatever is still queued goes to the offline store
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if not callable(item):
+                self._store_offline(item)
+            self.queue.task_done()
+        
+        logger.info(f"Event dispatcher stopped: {self.get_stats()}")
+    
+    def get_stats(self) -> Dict:
+        """
+        Get dispatcher statistics
+        
+        Returns:
+            Dictionary with queue depth and event counters
+        """
+        with self.lock:
+            return {
+                'queued': self.queue.qsize(),
+                'submitted': self.submitted,
+                'delivered': self.delivered,
+                'batches': self.batches,
+                'retried': self.retried,
+                'stored_offline': self.stored_offline,
+            }
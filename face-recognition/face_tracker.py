@@ -0,0 +1,438 @@
+"""
+IntelliSight - Face Tracker
+Author: IntelliSight Team
+Description: Detect-once, track-between face tracking with identities attached to tracks
+
+Full face detection only runs every `detect_interval` processed frames, or
+as soon as a track is lost. In between, track boxes are moved with sparse
+optical flow (default), an OpenCV KCF/CSRT tracker, or simply held in
+place ('none'). Detections are associated with tracks by IoU, and a
+recognized identity stays with its track, so a face is only re-encoded
+when its track is new, still unconfirmed or due for re-verification.
+
+Identities are confirmed by temporal voting: each match of a track's face
+is a vote, and a label is locked once it has `vote_min` of the last
+`vote_window` votes. A single-frame false match therefore never reaches
+the trackers; a locked identity is only re-checked periodically, and a
+disagreeing re-check is just one more vote.
+
+Detections are applied from the pipeline's detect workers while frames
+are tracked on the capture thread, so all access goes through a lock.
+The capture thread claims a detection when it schedules one; until the
+result is applied, later frames are tracked instead of being sent to
+detection too.
+"""
+
+import cv2
+import time
+import threading
+import numpy as np
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+from gallery_matcher import UNKNOWN_LABEL
+from utils import setup_logging
+
+logger = setup_logging()
+
+TRACKER_TYPES = ('none', 'flow', 'kcf', 'csrt')
+
+
+def box_iou(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> float:
+    """
+    Intersection over union of two (x, y, w, h) boxes
+    
+    Args:
+        a: First box
+        b: Second box
+    
+    Returns:
+        IoU in 0..1
+    """
+    x1 = max(a[0], b[0])
+    y1 = max(a[1], b[1])
+    x2 = min(a[0] + a[2], b[0] + b[2])
+    y2 = min(a[1] + a[3], b[1] + b[3])
+    
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def _create_cv_tracker(tracker_type: str):
+    """Create an OpenCV single-object tracker, or None if this build lacks it"""
+    name = f"Tracker{tracker_type.upper()}_create"
+    for module in (cv2, getattr(cv2, 'legacy', None)):
+        factory = getattr(module, name, None) if module is not None else None
+        if factory is not None:
+            return factory()
+    return None
+
+
+class Track:
+    """One tracked face"""
+    
+    __slots__ = ('track_id', 'box', 'label', 'votes', 'last_verified', 'misses', 'lost',
+                 'points', 'cv_tracker')
+    
+    def __init__(self, track_id: int, box: Tuple[int, int, int, int], vote_window: int = 5):
+        """
+        Initialize track
+        
+        Args:
+            track_id: Unique track ID
+            box: Face box (x, y, w, h)
+            vote_window: Recent match labels kept for voting
+        """
+        self.track_id = track_id
+        self.box = tuple(float(v) for v in box)
+        self.label: Optional[str] = None   # Confirmed identity (None until locked)
+        self.votes = deque(maxlen=vote_window)  # Labels of the recent matches
+        self.last_verified = 0.0           # Capture time of the last vote for the identity
+        self.misses = 0                    # Consecutive detections without a match
+        self.lost = False                  # Motion tracking failed since the last detection
+        self.points: Optional[np.ndarray] = None  # Optical flow feature points
+        self.cv_tracker = None
+    
+    def int_box(self) -> Tuple[int, int, int, int]:
+        """Track box as integer (x, y, w, h)"""
+        return tuple(int(round(v)) for v in self.box)
+
+
+class FaceTracker:
+    """Face tracks of one camera"""
+    
+    def __init__(self, tracker_type: str = 'flow', detect_interval: int = 5,
+                 iou_threshold: float = 0.3, max_misses: int = 1,
+                 reverify_interval: float = 2.0, vote_window: int = 5,
+                 vote_min: int = 3, flow_width: int = 320, detection_timeout: float = 2.0):
+        """
+        Initialize face tracker
+        
+        Args:
+            tracker_type: How boxes move between detections ('none', 'flow', 'kcf', 'csrt')
+            detect_interval: Processed frames between full detections
+            iou_threshold: Minimum IoU to associate a detection with a track
+            max_misses: Detections a track may miss before it is dropped
+            reverify_interval: Seconds after which a locked identity is re-checked
+            vote_window: Recent matches considered per track
+            vote_min: Votes within the window needed to lock an identity
+            flow_width: Width of the grayscale image used for optical flow
+            detection_timeout: Seconds after which a claimed detection that
+                never arrived no longer blocks a new one
+        """
+        tracker_type = tracker_type.lower()
+        if tracker_type not in TRACKER_TYPES:
+            raise ValueError(f"Unknown tracker type: {tracker_type}")
+        
+        if tracker_type in ('kcf', 'csrt') and _create_cv_tracker(tracker_type) is None:
+            logger.warning(f"OpenCV {tracker_type.upper()} tracker not available "
+                           f"(needs opencv-contrib-python), using optical flow")
+            tracker_type = 'flow'
+        
+        self.tracker_type = tracker_type
+        self.detect_interval = max(1, detect_interval)
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.reverify_interval = reverify_interval
+        self.vote_window = max(1, vote_window)
+        self.vote_min = min(max(1, vote_min), self.vote_window)
+        self.flow_width = flow_width
+        self.detection_timeout = detection_timeout
+        
+        self.lock = threading.Lock()
+        self.tracks: Dict[int, Track] = {}
+        self.next_id = 1
+        self.frames_since_detection = 0
+        self.last_detection = 0.0
+        self.prev_gray: Optional[np.ndarray] = None
+        self.flow_scale = 1.0
+        
+        # Capture time of the frame whose detection is in flight
+        self.pending_detection: Optional[float] = None
+        self.pending_since = 0.0
+        
+        # Statistics
+        self.detections = 0
+        self.tracked_frames = 0
+        self.votes = 0
+        self.confirmed = 0
+    
+    @property
+    def has_tracks(self) -> bool:
+        """True if any face is being tracked"""
+        return bool(self.tracks)
+    
+    def needs_detection(self) -> bool:
+        """
+        Decide whether the next processed frame needs full detection
+        
+        Returns:
+            True if no detection is in flight and there are no tracks, a
+            track was lost or the detection interval has elapsed
+        """
+        with self.lock:
+            return self._needs_detection()
+    
+    def _needs_detection(self) -> bool:
+        """needs_detection (lock held)"""
+        if (self.pending_detection is not None
+                and time.monotonic() - self.pending_since < self.detection_timeout):
+            return False
+        return (not self.tracks
+                or self.frames_since_detection >= self.detect_interval - 1
+                or any(track.lost for track in self.tracks.values()))
+    
+    def claim_detection(self, timestamp: float) -> bool:
+        """
+        Schedule full detection for a frame if one is needed
+        
+        Args:
+            timestamp: Capture time of the frame
+        
+        Returns:
+            True if the frame should be detected; the detection then counts
+            as in flight until apply_detections or cancel_detection
+        """
+        with self.lock:
+            if not self._needs_detection():
+                return False
+            self.pending_detection = timestamp
+            self.pending_since = time.monotonic()
+            return True
+    
+    def cancel_detection(self, timestamp: float):
+        """
+        Release a claimed detection that will not run (e.g. its frame was dropped)
+        
+        Args:
+            timestamp: Capture time passed to claim_detection
+        """
+        with self.lock:
+            if self.pending_detection == timestamp:
+                self.pending_detection = None
+    
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        """Downscaled grayscale frame for optical flow"""
+        h, w = frame.shape[:2]
+        self.flow_scale = min(1.0, self.flow_width / w)
+        if self.flow_scale < 1.0:
+            frame = cv2.resize(frame, (0, 0), fx=self.flow_scale, fy=self.flow_scale,
+                               interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    
+    def _init_motion(self, track: Track, frame: np.ndarray, gray: Optional[np.ndarray]):
+        """Start motion tracking of a track from its current box"""
+        track.lost = False
+        
+        if self.tracker_type == 'flow':
+            s = self.flow_scale
+            x, y, w, h = (int(v * s) for v in track.box)
+            mask = np.zeros_like(gray)
+            mask[max(0, y):y + h, max(0, x):x + w] = 255
+            track.points = cv2.goodFeaturesToTrack(gray, maxCorners=30, qualityLevel=0.01,
+                                                   minDistance=3, mask=mask)
+        elif self.tracker_type in ('kcf', 'csrt'):
+            track.cv_tracker = _create_cv_tracker(self.tracker_type)
+            track.cv_tracker.init(frame, track.int_box())
+    
+    def _needs_encoding(self, track: Track, timestamp: float) -> bool:
+        """Unconfirmed tracks and locked identities due for a re-check (lock held)"""
+        if track.label is None:
+            return True
+        return timestamp - track.last_verified >= self.reverify_interval
+    
+    def track(self, frame: np.ndarray) -> List[Tuple[Track, bool]]:
+        """
+        Move the tracks to a new frame without detection
+        
+        Args:
+            frame: Input image (BGR), the frame after the last tracked one
+        
+        Returns:
+            (track, needs_encoding) for every track still being followed
+            (lost tracks are excluded); unconfirmed tracks are encoded on
+            tracked frames until their first vote window is full
+        """
+        with self.lock:
+            self.frames_since_detection += 1
+            self.tracked_frames += 1
+            
+            if self.tracker_type == 'flow' and self.prev_gray is not None:
+                gray = self._gray(frame)
+                for track in self.tracks.values():
+                    self._track_flow(track, gray)
+                self.prev_gray = gray
+            elif self.tracker_type in ('kcf', 'csrt'):
+                for track in self.tracks.values():
+                    if track.cv_tracker is not None and not track.lost:
+                        ok, box = track.cv_tracker.update(frame)
+                        if ok:
+                            track.box = tuple(float(v) for v in box)
+                        else:
+                            track.lost = True
+            
+            return [(track, track.label is None and len(track.votes) < self.vote_window)
+                    for track in self.tracks.values() if not track.lost]
+    
+    def _track_flow(self, track: Track, gray: np.ndarray):
+        """Shift a track box by the median optical flow of its feature points"""
+        if track.lost or track.points is None or len(track.points) < 3:
+            track.lost = True
+            return
+        
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, track.points, None)
+        good = status.reshape(-1) == 1
+        
+        if np.count_nonzero(good) < 3:
+            track.lost = True
+            return
+        
+        dx, dy = np.median(new_points[good] - track.points[good], axis=0).reshape(-1) / self.flow_scale
+        x, y, w, h = track.box
+        track.box = (x + dx, y + dy, w, h)
+        track.points = new_points[good].reshape(-1, 1, 2)
+    
+    def _associate(self, boxes: List[Tuple[int, int, int, int]]) -> Dict[int, int]:
+        """Greedy IoU association, best pairs first (lock held); returns box index -> track_id"""
+        pairs = sorted(
+            ((box_iou(box, track.box), i, track_id)
+             for i, box in enumerate(boxes) for track_id, track in self.tracks.items()),
+            reverse=True
+        )
+        assigned: Dict[int, int] = {}
+        used_tracks = set()
+        for iou, i, track_id in pairs:
+            if iou < self.iou_threshold:
+                break
+            if i not in assigned and track_id not in used_tracks:
+                assigned[i] = track_id
+                used_tracks.add(track_id)
+        return assigned
+    
+    def apply_detections(self, frame: np.ndarray, boxes: List[Tuple[int, int, int, int]],
+                         timestamp: float) -> List[Tuple[int, bool]]:
+        """
+        Associate detected boxes with tracks, start new tracks and drop stale ones
+        
+        Args:
+            frame: Image (BGR) the boxes were detected on
+            boxes: Detected face boxes (x, y, w, h)
+            timestamp: Capture time of the frame
+        
+        Returns:
+            One (track_id, needs_encoding) pair per box; needs_encoding is
+            True for unconfirmed tracks and identities due for a re-check
+            (track_id 0: box of an outdated frame that matches no track)
+        """
+        with self.lock:
+            if self.pending_detection is not None and timestamp >= self.pending_detection:
+                self.pending_detection = None
+            
+            assigned = self._associate(boxes)
+            
+            # Detect workers may finish out of order; an older frame must not
+            # move the tracks back, but its matches still count as votes
+            if timestamp < self.last_detection:
+                return [(assigned[i], self._needs_encoding(self.tracks[assigned[i]], timestamp))
+                        if i in assigned else (0, False) for i in range(len(boxes))]
+            
+            self.detections += 1
+            self.frames_since_detection = 0
+            self.last_detection = timestamp
+            gray = self._gray(frame) if self.tracker_type == 'flow' else None
+            
+            # Unmatched tracks age out
+            used_tracks = set(assigned.values())
+            for track_id in list(self.tracks):
+                if track_id not in used_tracks:
+                    track = self.tracks[track_id]
+                    track.misses += 1
+                    if track.misses > self.max_misses:
+                        del self.tracks[track_id]
+            
+            result = []
+            for i, box in enumerate(boxes):
+                if i in assigned:
+                    track = self.tracks[assigned[i]]
+                    track.box = tuple(float(v) for v in box)
+                    track.misses = 0
+                else:
+                    track = Track(self.next_id, box, self.vote_window)
+                    self.next_id += 1
+                    self.tracks[track.track_id] = track
+                
+                self._init_motion(track, frame, gray)
+                
+                result.append((track.track_id, self._needs_encoding(track, timestamp)))
+            
+            if gray is not None:
+                self.prev_gray = gray
+            
+            return result
+    
+    def add_vote(self, track_id: int, label: str, timestamp: float) -> Optional[str]:
+        """
+        Record a match of a track's face and update its confirmed identity
+        
+        Args:
+            track_id: Track ID
+            label: Matched label ("Unknown" votes count too, but never lock)
+            timestamp: Capture time of the matched frame
+        
+        Returns:
+            Confirmed identity of the track after the vote, or None
+        """
+        with self.lock:
+            track = self.tracks.get(track_id)
+            if track is None:
+                return None
+            
+            self.votes += 1
+            track.votes.append(label)
+            
+            winner, count = Counter(track.votes).most_common(1)[0]
+            if winner != UNKNOWN_LABEL and count >= self.vote_min:
+                if track.label != winner:
+                    self.confirmed += 1
+                    logger.debug(f"Track {track_id} confirmed as {winner} ({count}/{len(track.votes)} votes)")
+                track.label = winner
+            elif track.label is not None and track.votes.count(track.label) < self.vote_min:
+                # Re-checks disagreed often enough: vote again from scratch
+                logger.debug(f"Track {track_id} lost identity {track.label}")
+                track.label = None
+            
+            if label == track.label:
+                track.last_verified = timestamp
+            
+            return track.label
+    
+    def get_label(self, track_id: int) -> Optional[str]:
+        """Confirmed identity of a track (None if unconfirmed or gone)"""
+        with self.lock:
+            track = self.tracks.get(track_id)
+            return track.label if track is not None else None
+    
+    def get_stats(self) -> Dict:
+        """
+        Get tracker statistics
+        
+        Returns:
+            Dictionary with active tracks, full detections, tracked frames,
+            identity votes and confirmations
+        """
+        return {
+            'tracks': len(self.tracks),
+            'detections': self.detections,
+            'tracked_frames': self.tracked_frames,
+            'votes': self.votes,
+            'confirmed': self.confirmed
+        }
+    
+    def reset(self):
+        """Drop all tracks"""
+        with self.lock:
+            self.tracks.clear()
+            self.prev_gray = None
+            self.frames_since_detection = 0
+            self.last_detection = 0.0
+            self.pending_detection = None
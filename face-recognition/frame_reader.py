@@ -0,0 +1,208 @@
+"""
+IntelliSight - Threaded Frame Reader
+Author: IntelliSight Team
+Description: Background camera capture that always hands out the newest frame
+
+A capture thread reads the camera continuously into a small ring buffer, so
+the driver's internal queue never fills up while the processing loop is busy.
+The processing loop takes the newest frame and the frames it skipped are
+counted as dropped. Recorded video files are not live, so for them the
+capture thread waits for the consumer instead of dropping frames.
+
+With decode_every > 1 the capture thread still grabs every frame (keeping
+the stream position current) but only decodes every Nth one, for
+consumers such as headless mode that never look at the others.
+"""
+
+import cv2
+import time
+import threading
+import numpy as np
+from collections import deque
+from typing import Dict, NamedTuple, Optional, Union
+from utils import setup_logging
+
+logger = setup_logging()
+
+
+class Frame(NamedTuple):
+    """A captured frame with its capture time"""
+    image: np.ndarray
+    timestamp: float  # time.time() when the frame was read from the camera
+    index: int        # Sequence number since the reader started (1-based)
+
+
+class FrameReader:
+    """Capture frames on a background thread, serving the latest one"""
+    
+    def __init__(self, source: Union[int, str] = 0, width: int = 640, height: int = 480,
+                 buffer_size: int = 1, decode_every: int = 1):
+        """
+        Initialize frame reader
+        
+        Args:
+            source: Camera index, stream URL or video file path
+            width: Requested capture width
+            height: Requested capture height
+            buffer_size: Frames kept in the ring buffer
+            decode_every: Decode only every Nth grabbed frame (1 = all)
+        """
+        # Numeric strings (e.g. from CLI or .env) are camera indices
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        
+        self.source = source
+        self.width = width
+        self.height = height
+        self.buffer_size = max(1, buffer_size)
+        self.decode_every = max(1, decode_every)
+        self.live = isinstance(source, int) or '://' in source
+        
+        self.capture = None
+        self.thread = None
+        self.buffer = deque(maxlen=self.buffer_size)
+        self.condition = threading.Condition()
+        self.running = False
+        self.ended = False
+        
+        # Statistics
+        self.frames_grabbed = 0
+        self.frames_captured = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.last_index = 0
+        self.last_latency = 0.0
+    
+    def start(self) -> 'FrameReader':
+        """
+        Open the camera and start the capture thread
+        
+        Returns:
+            self
+        """
+        self.capture = cv2.VideoCapture(self.source)
+        
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Failed to open camera: {self.source}")
+        
+        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        
+        # Keep the driver queue short; the ring buffer does the buffering
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, name="frame-reader", daemon=True)
+        self.thread.start()
+        
+        return self
+    
+    def _capture_loop(self):
+        """Read frames until stopped or the stream ends"""
+        while self.running:
+            ret = self.capture.grab()
+            timestamp = time.time()
+            
+            if ret:
+                self.frames_grabbed += 1
+                if self.frames_grabbed % self.decode_every:
+                    continue
+                ret, image = self.capture.retrieve()
+            
+            if not ret:
+                if self.live:
+                    logger.error("Failed to read frame from camera")
+                else:
+                    logger.info(f"End of video: {self.source}")
+                break
+            
+            with self.condition:
+                # Recorded files are paced by the consumer instead of dropping frames
+                while (not self.live and self.running
+                       and len(self.buffer) == self.buffer_size):
+                    self.condition.wait(0.1)
+                
+                self.frames_captured += 1
+                self.buffer.append(Frame(image, timestamp, self.frames_captured))
+                self.condition.notify_all()
+        
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+    
+    def read(self, timeout: float = 5.0) -> Optional[Frame]:
+        """
+        Take the newest frame not yet returned
+        
+        Older buffered frames are discarded and counted as dropped (live
+        sources); recorded files are returned in order.
+        
+        Args:
+            timeout: Seconds to wait for a new frame
+        
+        Returns:
+            Frame, or None if the stream ended or no frame arrived in time
+        """
+        deadline = time.time() + timeout
+        
+        with self.condition:
+            while not self.buffer:
+                remaining = deadline - time.time()
+                if self.ended or remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            
+            if self.live:
+                frame = self.buffer.pop()
+                self.buffer.clear()
+            else:
+                frame = self.buffer.popleft()
+            
+            self.condition.notify_all()
+        
+        # Every index skipped since the last read was captured but never processed
+        self.frames_dropped += frame.index - self.last_index - 1
+        self.frames_read += 1
+        self.last_index = frame.index
+        self.last_latency = time.time() - frame.timestamp
+        
+        return frame
+    
+    def get_stats(self) -> Dict:
+        """
+        Get capture statistics
+        
+        Returns:
+            Dictionary with grabbed, captured (decoded), processed and
+            dropped frame counts, drop ratio and the age of the last frame
+            when it was taken
+        """
+        return {
+            'grabbed': self.frames_grabbed,
+            'captured': self.frames_captured,
+            'read': self.frames_read,
+            'dropped': self.frames_dropped,
+            'drop_ratio': self.frames_dropped / self.last_index if self.last_index else 0.0,
+            'latency_ms': self.last_latency * 1000
+        }
+    
+    def stop(self):
+        """Stop the capture thread and release the camera"""
+        self.running = False
+        
+        with self.condition:
+            self.condition.notify_all()
+        
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        
+        if self.capture:
+            self.capture.release()
+            self.capture = None
+        
+        stats = self.get_stats()
+        logger.info(
+            f"Capture stats: {stats['captured']} captured, {stats['read']} processed, "
+            f"{stats['dropped']} dropped ({stats['drop_ratio']:.0%})"
+        )
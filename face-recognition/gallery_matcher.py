@@ -0,0 +1,564 @@
+"""
+IntelliSight - Gallery Matcher
+Author: IntelliSight Team
+Description: Vectorized nearest-neighbour matching of face encodings against the trained gallery
+
+The gallery is held as one contiguous float32 matrix with precomputed squared
+norms, so every face in a frame is matched with a single matrix product:
+
+    ||q - g||^2 = ||q||^2 + ||g||^2 - 2 * q.g
+"""
+
+import os
+import signal
+import threading
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from utils import setup_logging, load_encodings
+
+logger = setup_logging()
+
+UNKNOWN_LABEL = "Unknown"
+
+
+class Match(NamedTuple):
+    """Result of matching one face encoding against the gallery"""
+    label: str        # Best matching label, or "Unknown" if outside tolerance
+    distance: float   # Euclidean distance to the closest gallery encoding
+    margin: float     # Distance gap to the closest encoding of a different label
+
+
+class GalleryMatcher:
+    """Brute-force gallery matcher backed by a single float32 matrix"""
+    
+    def __init__(self, encodings: Sequence, label_ids: Sequence[int], labels: Sequence[str]):
+        """
+        Initialize gallery matcher
+        
+        Args:
+            encodings: Gallery encodings, shape (N, 128)
+            label_ids: Index into `labels` for each gallery row, shape (N,)
+            labels: Label table (e.g. ["STUDENT_1", "TEACHER_3", ...])
+        """
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        if self.encodings.size == 0:
+            # Training that found no faces still saves a (valid) empty gallery
+            self.encodings = np.empty((0, 128), dtype=np.float32)
+        elif self.encodings.ndim != 2:
+            self.encodings = self.encodings.reshape(len(label_ids), -1)
+        
+        self.label_ids = np.ascontiguousarray(label_ids, dtype=np.int32)
+        self.labels = list(labels)
+        self.sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        
+        if len(self.label_ids) != len(self.encodings):
+            raise ValueError(
+                f"Mismatch: {len(self.encodings)} encodings but {len(self.label_ids)} label ids"
+            )
+    
+    @classmethod
+    def from_encodings_data(cls, encodings_data: Dict) -> "GalleryMatcher":
+        """
+        Build matcher from the dictionary returned by utils.load_encodings
+        
+        Args:
+            encodings_data: Dictionary with 'encodings' and 'names' (or 'label_ids' and 'labels')
+        
+        Returns:
+            GalleryMatcher instance
+        """
+        if 'label_ids' in encodings_data and 'labels' in encodings_data:
+            # Binary gallery: label table is already factorised
+            return cls(encodings_data['encodings'], encodings_data['label_ids'],
+                       encodings_data['labels'])
+        
+        labels, label_ids = np.unique(np.asarray(encodings_data['names'], dtype=object),
+                                      return_inverse=True)
+        return cls(encodings_data['encodings'], label_ids, labels.tolist())
+    
+    def __len__(self) -> int:
+        return len(self.label_ids)
+    
+    def _squared_distances(self, queries: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """
+        Squared Euclidean distances between queries and gallery rows
+        
+        Args:
+            queries: Query matrix, shape (M, 128), float32
+            rows: Optional subset of gallery row indices
+        
+        Returns:
+            Distance matrix, shape (M, N) or (M, len(rows))
+        """
+        gallery = self.encodings if rows is None else self.encodings[rows]
+        sq_norms = self.sq_norms if rows is None else self.sq_norms[rows]
+        
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+        d2 = queries @ gallery.T
+        d2 *= -2.0
+        d2 += q_norms[:, None]
+        d2 += sq_norms[None, :]
+        np.maximum(d2, 0.0, out=d2)
+        return d2
+    
+    def _select(self, d2: np.ndarray, label_ids: np.ndarray, tolerance: float) -> List[Match]:
+        """
+        Pick best label and runner-up margin from a squared distance matrix
+        
+        Args:
+            d2: Squared distances, shape (M, K)
+            label_ids: Label id of each of the K columns
+            tolerance: Maximum distance for a positive match
+        
+        Returns:
+            List of Match, one per query row
+        """
+        best = np.argmin(d2, axis=1)
+        rows = np.arange(len(d2))
+        best_d = np.sqrt(d2[rows, best])
+        best_labels = label_ids[best]
+        
+        # Runner-up: closest gallery row belonging to a different identity
+        same_label = label_ids[None, :] == best_labels[:, None]
+        runner_up = np.sqrt(np.where(same_label, np.inf, d2).min(axis=1))
+        
+        matches = []
+        for i in range(len(d2)):
+            distance = float(best_d[i])
+            label = self.labels[best_labels[i]] if distance <= tolerance else UNKNOWN_LABEL
+            matches.append(Match(label, distance, float(runner_up[i] - best_d[i])))
+        return matches
+    
+    def match(self, face_encodings: Sequence, tolerance: float = 0.6) -> List[Match]:
+        """
+        Match all faces of a frame against the gallery
+        
+        Args:
+            face_encodings: Face encodings from face_recognition.face_encodings
+            tolerance: Maximum distance for a positive match (same as compare_faces)
+        
+        Returns:
+            List of Match, in the same order as face_encodings
+        """
+        if len(face_encodings) == 0:
+            return []
+        
+        if len(self) == 0:
+            return [Match(UNKNOWN_LABEL, float('inf'), 0.0) for _ in face_encodings]
+        
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(len(face_encodings), -1)
+        d2 = self._squared_distances(queries)
+        return self._select(d2, self.label_ids, tolerance)
+
+
+class IVFGalleryMatcher(GalleryMatcher):
+    """
+    Approximate matcher using an inverted-file (IVF) index
+    
+    Gallery rows are partitioned into `nlist` k-means cells. Each face is
+    compared exactly against the rows of its `nprobe` closest cells only, so
+    `nprobe` trades recall for latency (nprobe == nlist is exhaustive).
+    """
+    
+    def __init__(self, encodings: Sequence, label_ids: Sequence[int], labels: Sequence[str],
+                 nlist: int = 0, nprobe: int = 8, exact_fallback: bool = True):
+        """
+        Initialize IVF matcher
+        
+        Args:
+            encodings: Gallery encodings, shape (N, 128)
+            label_ids: Index into `labels` for each gallery row, shape (N,)
+            labels: Label table
+            nlist: Number of k-means cells (0 = sqrt(N))
+            nprobe: Number of cells searched per face
+            exact_fallback: Re-check faces that found no match with a full scan
+        """
+        super().__init__(encodings, label_ids, labels)
+        
+        n = len(self.encodings)
+        self.nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        self.exact_fallback = exact_fallback
+        
+        self.centroids, assignments = kmeans(self.encodings, self.nlist)
+        
+        # Rows grouped by cell: rows of cell c are order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assignments, kind='stable').astype(np.int64)
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(self.nlist + 1))
+        
+        logger.info(f"IVF index built: {self.nlist} cells, nprobe={self.nprobe}")
+    
+    def match(self, face_encodings: Sequence, tolerance: float = 0.6) -> List[Match]:
+        """
+        Match all faces of a frame against the probed cells of the gallery
+        
+        Args:
+            face_encodings: Face encodings from face_recognition.face_encodings
+            tolerance: Maximum distance for a positive match
+        
+        Returns:
+            List of Match, in the same order as face_encodings
+        """
+        if len(face_encodings) == 0 or len(self) == 0:
+            return super().match(face_encodings, tolerance)
+        
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(len(face_encodings), -1)
+        
+        # Stage 1: closest cells for every face in one product
+        c_d2 = queries @ self.centroids.T
+        c_d2 *= -2.0
+        c_d2 += np.einsum('ij,ij->i', self.centroids, self.centroids)[None, :]
+        probes = np.argpartition(c_d2, self.nprobe - 1, axis=1)[:, :self.nprobe]
+        
+        # Stage 2: exact re-rank over the candidate rows of each face
+        matches = []
+        for i, cells in enumerate(probes):
+            rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+            d2 = self._squared_distances(queries[i:i + 1], rows)
+            match = self._select(d2, self.label_ids[rows], tolerance)[0]
+            
+            if match.label == UNKNOWN_LABEL and self.exact_fallback:
+                match = self._select(self._squared_distances(queries[i:i + 1]),
+                                     self.label_ids, tolerance)[0]
+            matches.append(match)
+        
+        return matches
+
+
+class PrototypeGalleryMatcher(GalleryMatcher):
+    """
+    Two-stage matcher using per-identity prototypes
+    
+    Stage one compares each face against a few k-means prototypes per label
+    (stored in the gallery metadata by train_encodings.py). Stage two compares
+    exactly against the member encodings of the `top_k` closest identities, so
+    the final decision still uses the real encodings and `tolerance`.
+    """
+    
+    def __init__(self, encodings: Sequence, label_ids: Sequence[int], labels: Sequence[str],
+                 prototypes: Dict[str, np.ndarray] = None, top_k: int = 5,
+                 exact_fallback: bool = True):
+        """
+        Initialize prototype matcher
+        
+        Args:
+            encodings: Gallery encodings, shape (N, 128)
+            label_ids: Index into `labels` for each gallery row, shape (N,)
+            labels: Label table
+            prototypes: Mapping of label to prototype matrix (computed if None)
+            top_k: Number of candidate identities compared exactly
+            exact_fallback: Re-check faces that found no match with a full scan
+        """
+        super().__init__(encodings, label_ids, labels)
+        
+        self.exact_fallback = exact_fallback
+        
+        # Member rows grouped by label: rows of label l are order[offsets[l]:offsets[l + 1]]
+        self.order = np.argsort(self.label_ids, kind='stable').astype(np.int64)
+        self.offsets = np.searchsorted(self.label_ids[self.order], np.arange(len(self.labels) + 1))
+        
+        if not prototypes:
+            prototypes = compute_prototypes(self.encodings, self.label_ids, self.labels)
+        
+        # Prototype matrix grouped by label id, with column offsets per label
+        proto_rows = []
+        proto_counts = []
+        proto_label_ids = []
+        for label_id, label in enumerate(self.labels):
+            members = self.order[self.offsets[label_id]:self.offsets[label_id + 1]]
+            if len(members) == 0:
+                # Label left without rows: no prototype (a mean over no members is NaN)
+                continue
+            
+            label_protos = prototypes.get(label)
+            if label_protos is None or len(label_protos) == 0:
+                # Label without stored prototypes: use the mean of its members
+                label_protos = self.encodings[members].mean(axis=0, keepdims=True)
+            label_protos = np.asarray(label_protos, dtype=np.float32).reshape(-1, self.encodings.shape[1])
+            proto_rows.append(label_protos)
+            proto_counts.append(len(label_protos))
+            proto_label_ids.append(label_id)
+        
+        if not proto_rows:
+            proto_rows = [np.empty((0, self.encodings.shape[1]), dtype=np.float32)]
+        
+        self.prototypes = np.ascontiguousarray(np.concatenate(proto_rows), dtype=np.float32)
+        self.proto_sq_norms = np.einsum('ij,ij->i', self.prototypes, self.prototypes)
+        self.proto_offsets = np.concatenate([[0], np.cumsum(proto_counts)[:-1]]).astype(np.int64)
+        self.proto_label_ids = np.asarray(proto_label_ids, dtype=np.int64)
+        self.top_k = max(1, min(top_k, len(proto_label_ids)))
+        
+        logger.info(f"Prototype index built: {len(self.prototypes)} prototypes, top_k={self.top_k}")
+    
+    def match(self, face_encodings: Sequence, tolerance: float = 0.6) -> List[Match]:
+        """
+        Match all faces of a frame using prototypes, then exact member comparison
+        
+        Args:
+            face_encodings: Face encodings from face_recognition.face_encodings
+            tolerance: Maximum distance for a positive match
+        
+        Returns:
+            List of Match, in the same order as face_encodings
+        """
+        if len(face_encodings) == 0 or len(self) == 0:
+            return super().match(face_encodings, tolerance)
+        
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(len(face_encodings), -1)
+        
+        # Stage 1: closest prototype per label, then top-k labels per face
+        p_d2 = queries @ self.prototypes.T
+        p_d2 *= -2.0
+        p_d2 += self.proto_sq_norms[None, :]
+        label_d2 = np.minimum.reduceat(p_d2, self.proto_offsets, axis=1)
+        candidates = self.proto_label_ids[np.argpartition(label_d2, self.top_k - 1, axis=1)[:, :self.top_k]]
+        
+        # Stage 2: exact comparison against members of the candidate labels
+        matches = []
+        for i, label_ids in enumerate(candidates):
+            rows = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in label_ids])
+            d2 = self._squared_distances(queries[i:i + 1], rows)
+            match = self._select(d2, self.label_ids[rows], tolerance)[0]
+            
+            if match.label == UNKNOWN_LABEL and self.exact_fallback:
+                match = self._select(self._squared_distances(queries[i:i + 1]),
+                                     self.label_ids, tolerance)[0]
+            matches.append(match)
+        
+        return matches
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20,
+           seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lloyd's k-means on float32 rows
+    
+    Args:
+        data: Data matrix, shape (N, D)
+        k: Number of clusters
+        iterations: Maximum number of iterations
+        seed: Random seed for initialisation
+    
+    Returns:
+        Tuple of (centroids (k, D), assignments (N,))
+    """
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, len(data)))
+    
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    sq_norms = np.einsum('ij,ij->i', data, data)
+    assignments = np.zeros(len(data), dtype=np.int64)
+    
+    for iteration in range(iterations):
+        d2 = data @ centroids.T
+        d2 *= -2.0
+        d2 += sq_norms[:, None]
+        d2 += np.einsum('ij,ij->i', centroids, centroids)[None, :]
+        new_assignments = np.argmin(d2, axis=1)
+        
+        if iteration > 0 and np.array_equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+        
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            # Re-seed empty clusters with random rows
+            centroids[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+    
+    return centroids, assignments
+
+
+def compute_prototypes(encodings: Sequence, label_ids: Sequence[int], labels: Sequence[str],
+                       max_prototypes: int = 3, encodings_per_prototype: int = 10) -> Dict[str, np.ndarray]:
+    """
+    Compute k-means prototypes for every label of the gallery
+    
+    Args:
+        encodings: Gallery encodings, shape (N, 128)
+        label_ids: Index into `labels` for each gallery row
+        labels: Label table
+        max_prototypes: Maximum prototypes per label
+        encodings_per_prototype: Encodings needed for each extra prototype
+    
+    Returns:
+        Dictionary mapping label to prototype matrix (k, 128), float32
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    label_ids = np.asarray(label_ids)
+    prototypes = {}
+    
+    # Group rows by label once instead of masking the gallery per label
+    order = np.argsort(label_ids, kind='stable')
+    offsets = np.searchsorted(label_ids[order], np.arange(len(labels) + 1))
+    
+    for label_id, label in enumerate(labels):
+        members = encodings[order[offsets[label_id]:offsets[label_id + 1]]]
+        if len(members) == 0:
+            continue
+        
+        k = max(1, min(max_prototypes, len(members) // encodings_per_prototype))
+        if k == 1:
+            prototypes[label] = members.mean(axis=0, keepdims=True)
+        else:
+            prototypes[label], _ = kmeans(members, k)
+    
+    return prototypes
+
+
+def build_matcher(encodings_data: Dict, config: Dict = None) -> GalleryMatcher:
+    """
+    Build the gallery matcher used by the live recognition systems
+    
+    Args:
+        encodings_data: Dictionary returned by utils.load_encodings
+        config: Configuration dictionary
+    
+    Returns:
+        Matcher instance
+    """
+    config = config or {}
+    index = str(config.get('matcher_index', 'brute')).lower()
+    gallery_size = len(encodings_data['encodings'])
+    
+    # An index needs at least one encoding; empty galleries always use brute force
+    min_size = max(1, config.get('ann_min_gallery_size', 2000))
+    
+    if index == 'ivf' and gallery_size >= min_size:
+        base = GalleryMatcher.from_encodings_data(encodings_data)
+        matcher = IVFGalleryMatcher(
+            base.encodings, base.label_ids, base.labels,
+            nlist=config.get('ann_nlist', 0),
+            nprobe=config.get('ann_nprobe', 8),
+            exact_fallback=config.get('ann_exact_fallback', True)
+        )
+    elif index == 'prototype' and gallery_size >= min_size:
+        base = GalleryMatcher.from_encodings_data(encodings_data)
+        matcher = PrototypeGalleryMatcher(
+            base.encodings, base.label_ids, base.labels,
+            prototypes=encodings_data.get('metadata', {}).get('prototypes'),
+            top_k=config.get('prototype_top_k', 5),
+            exact_fallback=config.get('ann_exact_fallback', True)
+        )
+    else:
+        if index not in ('brute', 'ivf', 'prototype'):
+            logger.warning(f"Unknown matcher index '{index}', using brute force")
+        matcher = GalleryMatcher.from_encodings_data(encodings_data)
+    
+    logger.info(f"Gallery matcher ready: {len(matcher)} encodings, {len(matcher.labels)} persons")
+    return matcher
+
+
+class GalleryWatcher:
+    """
+    Hot-reload the gallery without restarting the camera loop
+    
+    A background thread watches the gallery file (and reload requests from a
+    signal). On change it loads the gallery and builds a new matcher off the
+    frame loop; the loop picks it up with take() and swaps its reference
+    between frames.
+    """
+    
+    def __init__(self, model_path: str, config: Dict = None, poll_interval: float = 5.0):
+        """
+        Initialize gallery watcher
+        
+        Args:
+            model_path: Gallery file to watch (pickle or .gallery)
+            config: Configuration dictionary passed to build_matcher
+            poll_interval: Seconds between file checks
+        """
+        self.model_path = model_path
+        self.config = config or {}
+        self.poll_interval = poll_interval
+        
+        self._signature = self._stat()
+        self._pending: Optional[GalleryMatcher] = None
+        self._lock = threading.Lock()
+        self._reload_requested = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """Get (mtime_ns, size) of the gallery file, or None if missing"""
+        try:
+            st = os.stat(self.model_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+    
+    def start(self):
+        """Start watching in a background thread"""
+        if self._thread is not None:
+            return
+        
+        self._thread = threading.Thread(target=self._watch, name="gallery-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.model_path} for gallery changes every {self.poll_interval}s")
+    
+    def stop(self):
+        """Stop the watcher thread"""
+        self._stop.set()
+        self._reload_requested.set()
+    
+    def request_reload(self, *_):
+        """Force a reload on the next check (usable as a signal handler)"""
+        self._reload_requested.set()
+    
+    def install_signal_handler(self):
+        """Reload on SIGHUP where the platform supports it"""
+        sighup = getattr(signal, 'SIGHUP', None)
+        if sighup is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(sighup, self.request_reload)
+            logger.info("Send SIGHUP to reload the face gallery")
+    
+    def _watch(self):
+        """Watcher loop: detect changes and build the new matcher"""
+        while not self._stop.is_set():
+            forced = self._reload_requested.wait(self.poll_interval)
+            self._reload_requested.clear()
+            if self._stop.is_set():
+                break
+            
+            signature = self._stat()
+            if signature is None or (signature == self._signature and not forced):
+                continue
+            
+            # Let a writer that does not rename atomically finish
+            self._stop.wait(0.5)
+            if self._stat() != signature:
+                continue
+            
+            try:
+                encodings_data = load_encodings(self.model_path)
+                if not encodings_data:
+                    continue
+                matcher = build_matcher(encodings_data, self.config)
+            except Exception as e:
+                logger.error(f"Gallery reload failed, keeping current gallery: {e}")
+                self._signature = signature
+                continue
+            
+            with self._lock:
+                self._pending = matcher
+            self._signature = signature
+            logger.info(f"🔄 Gallery reloaded: {len(matcher)} encodings, {len(matcher.labels)} persons")
+    
+    def take(self) -> Optional[GalleryMatcher]:
+        """
+        Get the newly built matcher, if any
+        
+        Returns:
+            New matcher to swap in, or None if nothing changed
+        """
+        if self._pending is None:
+            return None
+        
+        with self._lock:
+            matcher, self._pending = self._pending, None
+        return matcher
@@ -0,0 +1,144 @@
+"""
+IntelliSight - Headless Mode
+Author: IntelliSight Team
+Description: Signal-driven control and low-rate preview snapshots for display-less servers
+
+Without a window there is no keyboard, so the commands of the live
+scripts arrive as POSIX signals instead:
+
+    SIGINT / SIGTERM  quit (same as 'q')
+    SIGUSR1           sync offline entries (same as 's')
+    SIGUSR2           reset tracker (same as 'r')
+    SIGHUP            reload the face gallery (installed by GalleryWatcher)
+
+Windows has no SIGUSR1, SIGUSR2 or SIGHUP: there headless mode can only be
+stopped (Ctrl+C / Ctrl+Break), offline entries are synced by the automatic
+SYNC_INTERVAL sync and trackers are not reset manually.
+
+Rendering is skipped entirely. If a preview file is configured, an
+annotated copy of a frame is written there as a JPEG every few seconds,
+e.g. for a status page or `watch`-style inspection over SSH.
+"""
+
+import os
+import cv2
+import time
+import signal
+import threading
+import numpy as np
+from typing import Callable, Optional
+from utils import setup_logging
+
+logger = setup_logging()
+
+# Keyboard equivalents in windowed mode
+KEY_COMMANDS = {
+    ord('q'): 'quit',
+    ord('s'): 'sync',
+    ord('r'): 'reset',
+}
+
+COMMAND_SIGNALS = (
+    ('SIGINT', 'quit'),
+    ('SIGTERM', 'quit'),
+    ('SIGUSR1', 'sync'),
+    ('SIGUSR2', 'reset'),
+)
+
+
+class SignalControl:
+    """Turn process signals into the commands the live loops handle"""
+    
+    def __init__(self):
+        """Initialize signal control (handlers are installed by install())"""
+        self.quit_requested = threading.Event()
+        self._pending = []
+        self._lock = threading.Lock()
+    
+    def install(self):
+        """Install the signal handlers (main thread only, where the platform has them)"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        
+        available = []
+        for name, command in COMMAND_SIGNALS:
+            signum = getattr(signal, name, None)
+            if signum is not None:
+                signal.signal(signum, lambda *_, command=command: self.request(command))
+                available.append(f"{name}={command}")
+        
+        logger.info(f"Headless mode, control by signals: {', '.join(available)} (pid {os.getpid()})")
+    
+    def request(self, command: str):
+        """
+        Queue a command (usable from a signal handler)
+        
+        Args:
+            command: 'quit', 'sync' or 'reset'
+        """
+        if command == 'quit':
+            self.quit_requested.set()
+        with self._lock:
+            self._pending.append(command)
+    
+    def take_command(self) -> Optional[str]:
+        """
+        Take the next requested command
+        
+        Returns:
+            'quit' (once requested it is always returned first), 'sync',
+            'reset' or None
+        """
+        if self.quit_requested.is_set():
+            return 'quit'
+        with self._lock:
+            return self._pending.pop(0) if self._pending else None
+
+
+class PreviewWriter:
+    """Write an annotated frame to a JPEG file at a low rate"""
+    
+    def __init__(self, path: str, interval: float = 2.0, quality: int = 80):
+        """
+        Initialize preview writer
+        
+        Args:
+            path: Output JPEG path (replaced atomically)
+            interval: Seconds between snapshots
+            quality: JPEG quality
+        """
+        self.path = path
+        self.interval = interval
+        self.quality = quality
+        self.last_write = 0.0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    def due(self) -> bool:
+        """True when the next snapshot should be written"""
+        return time.time() - self.last_write >= self.interval
+    
+    def write(self, frame: np.ndarray, render: Callable[[np.ndarray], None]):
+        """
+        Render onto a copy of the frame and write it
+        
+        Args:
+            frame: Frame (left untouched)
+            render: Function drawing the overlay onto the copy in place
+        """
+        self.last_write = time.time()
+        snapshot = frame.copy()
+        render(snapshot)
+        
+        # Readers never see a partially written file
+        ok, data = cv2.imencode('.jpg', snapshot, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            logger.warning("Failed to encode preview frame")
+            return
+        
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data.tobytes())
+        os.replace(temp_path, self.path)
@@ -12,11 +12,13 @@ This script:
 6. Handles offline mode with local logging
 
 ZONE TRACKING ONLY - No attendance/entry-exit logging
+
+With --headless nothing is rendered or displayed: only the processed
+frames are decoded, control is by signals (see headless.py) and an
+optional preview JPEG is written at a low rate.
 """
 
 import cv2
-import face_recognition
-import numpy as np
 import time
 from datetime import datetime
 from collections import defaultdict
@@ -25,11 +27,14 @@ from utils import (
     setup_logging,
     load_config,
     load_encodings,
-    FaceDetector,
     FPSCounter,
     draw_face_box,
     draw_info_panel
 )
+from gallery_matcher import build_matcher, GalleryWatcher
+from frame_reader import FrameReader
+from headless import KEY_COMMANDS, PreviewWriter, SignalControl
+from pipeline import RecognitionPipeline
 from send_zone_to_backend import ZoneTrackingAPI
 
 logger = setup_logging()
@@ -54,17 +59,18 @@ class ZoneTracker:
         self.last_update: Dict[str, float] = {}  # label -> timestamp
         self.active_persons: Dict[str, float] = {}  # label -> last_seen
     
-    def update(self, recognized_labels: Set[str]) -> Set[str]:
+    def update(self, recognized_labels: Set[str], timestamp: float = None) -> Set[str]:
         """
         Update tracker with currently visible persons
         
         Args:
             recognized_labels: Set of person labels currently visible
+            timestamp: Capture time of the frame (defaults to now)
             
         Returns:
             Set of labels that need zone updates
         """
-        current_time = time.time()
+        current_time = timestamp if timestamp is not None else time.time()
         need_updates = set()
         
         # Check each recognized person
@@ -146,15 +152,17 @@ class LiveZoneTrackingSystem:
                 f"Please run train_encodings.py first."
             )
         
-        self.known_encodings = encodings_data['encodings']
-        self.known_names = encodings_data['names']
+        self.matcher = build_matcher(encodings_data, self.config)
         self.metadata = encodings_data.get('metadata', {})
         
-        logger.info(f"Loaded {len(self.known_names)} face encodings")
+        logger.info(f"Loaded {len(self.matcher)} face encodings")
         
-        # Initialize face detector
-        detection_method = self.config.get('detection_method', 'dnn')
-        self.face_detector = FaceDetector(method=detection_method)
+        # Watch the gallery so new enrollments are picked up without a restart
+        reload_interval = self.config.get('gallery_reload_interval', 5.0)
+        self.gallery_watcher = (
+            GalleryWatcher(model_path, self.config, reload_interval)
+            if reload_interval > 0 else None
+        )
         
         # Initialize backend API
         self.backend_api = ZoneTrackingAPI(self.config)
@@ -167,13 +175,21 @@ class LiveZoneTrackingSystem:
         
         # Recognition settings
         self.tolerance = self.config.get('recognition_tolerance', 0.6)
-        self.process_every_n_frames = self.config.get('process_every_n_frames', 2)
-        self.resize_scale = self.config.get('resize_scale', 0.25)
         
         # Camera settings
         self.camera_source = self.config.get('camera_source', 0)
         self.camera_width = self.config.get('camera_width', 640)
         self.camera_height = self.config.get('camera_height', 480)
+        self.capture_buffer_size = self.config.get('capture_buffer_size', 1)
+        
+        # Headless mode: no window, signals instead of keys
+        self.headless = self.config.get('headless', False)
+        self.process_every_n_frames = max(1, self.config.get('process_every_n_frames', 2))
+        preview_file = self.config.get('preview_file', '')
+        self.preview = (
+            PreviewWriter(preview_file, self.config.get('preview_interval', 2.0))
+            if self.headless and preview_file else None
+        )
         
         # Frame counter and FPS
         self.frame_count = 0
@@ -181,74 +197,6 @@ class LiveZoneTrackingSystem:
         
         logger.info(f"Zone tracking system initialized for Zone {zone_id}")
     
-    def recognize_faces(self, frame: np.ndarray) -> Dict[str, Tuple[int, int, int, int]]:
-        """
-        Recognize faces in frame
-        
-        Args:
-            frame: Input BGR frame
-            
-        Returns:
-            Dictionary mapping person labels to bounding boxes
-        """
-        # Detect faces
-        face_locations = self.face_detector.detect(frame)
-        
-        if not face_locations:
-            return {}
-        
-        # Resize for faster processing
-        small_frame = cv2.resize(frame, (0, 0), fx=self.resize_scale, fy=self.resize_scale)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        
-        # Convert face locations to face_recognition format
-        face_locations_rgb = []
-        for (x, y, w, h) in face_locations:
-            # Scale coordinates
-            x_scaled = int(x * self.resize_scale)
-            y_scaled = int(y * self.resize_scale)
-            w_scaled = int(w * self.resize_scale)
-            h_scaled = int(h * self.resize_scale)
-            
-            # Convert to (top, right, bottom, left) format
-            top = y_scaled
-            right = x_scaled + w_scaled
-            bottom = y_scaled + h_scaled
-            left = x_scaled
-            
-            face_locations_rgb.append((top, right, bottom, left))
-        
-        # Get face encodings
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations_rgb)
-        
-        # Match faces
-        recognized = {}
-        for i, face_encoding in enumerate(face_encodings):
-            # Compare with known faces
-            matches = face_recognition.compare_faces(
-                self.known_encodings,
-                face_encoding,
-                tolerance=self.tolerance
-            )
-            
-            name = "Unknown"
-            
-            # Use face with smallest distance
-            if True in matches:
-                face_distances = face_recognition.face_distance(
-                    self.known_encodings,
-                    face_encoding
-                )
-                best_match_index = np.argmin(face_distances)
-                
-                if matches[best_match_index]:
-                    name = self.known_names[best_match_index]
-            
-            # Store recognition result
-            recognized[name] = face_locations[i]
-        
-        return recognized
-    
     def parse_label(self, label: str) -> Tuple[str, int]:
         """
         Parse person label to get type and ID
@@ -292,100 +240,142 @@ class LiveZoneTrackingSystem:
         else:
             logger.warning(f"⚠️  Zone update failed: {label}")
     
+    def render(self, frame, recognized: Dict, fps: float):
+        """
+        Draw face boxes, zone label and the info panel onto a frame
+        
+        Args:
+            frame: Frame to draw on (modified in place)
+            recognized: label -> (x, y, w, h)
+            fps: Current FPS
+        """
+        for label, box in recognized.items():
+            color = (0, 255, 0) if label != "Unknown" else (0, 0, 255)
+            draw_face_box(frame, box, label, color)
+        
+        backend_status = "Connected" if self.backend_api.is_online else "Offline"
+        zone_text = f"Zone {self.tracker.zone_id}"
+        
+        # Draw zone info
+        cv2.putText(frame, zone_text, (10, frame.shape[0] - 10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        
+        draw_info_panel(
+            frame,
+            fps,
+            self.tracker.get_active_count(),
+            backend_status
+        )
+    
     def run(self):
         """Run live zone tracking system"""
         logger.info("Starting live zone tracking...")
         logger.info(f"Opening camera: {self.camera_source}")
         logger.info(f"Tracking Zone: {self.tracker.zone_id}")
         
-        # Open camera
-        video_capture = cv2.VideoCapture(self.camera_source)
+        # Open camera (frames are captured on a background thread); without
+        # a display only the frames that get processed are decoded
+        frame_reader = FrameReader(
+            self.camera_source,
+            self.camera_width,
+            self.camera_height,
+            self.capture_buffer_size,
+            decode_every=self.process_every_n_frames if self.headless else 1
+        ).start()
         
-        if not video_capture.isOpened():
-            raise RuntimeError(f"Failed to open camera: {self.camera_source}")
+        logger.info("✅ Camera opened successfully")
         
-        # Set camera resolution
-        video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.camera_width)
-        video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.camera_height)
+        controls = None
+        if self.headless:
+            controls = SignalControl()
+            controls.install()
+        else:
+            logger.info("Press 'q' to quit, 's' to sync offline entries, 'r' to reset tracker")
         
-        logger.info("✅ Camera opened successfully")
-        logger.info("Press 'q' to quit, 's' to sync offline entries, 'r' to reset tracker")
+        if self.gallery_watcher:
+            self.gallery_watcher.start()
+            self.gallery_watcher.install_signal_handler()
+        
+        # Detection, encoding and matching run in a staged pipeline;
+        # results come back in capture order
+        pipeline = RecognitionPipeline(
+            lambda face_encodings: self.matcher.match(face_encodings, tolerance=self.tolerance),
+            self.config
+        )
         
         try:
+            pipeline.start(frame_reader)
+            
             while True:
-                # Read frame
-                ret, frame = video_capture.read()
+                # Swap in a reloaded gallery between frames
+                if self.gallery_watcher:
+                    new_matcher = self.gallery_watcher.take()
+                    if new_matcher is not None:
+                        self.matcher = new_matcher
                 
-                if not ret:
-                    logger.error("Failed to read frame from camera")
-                    break
+                # Take the next recognized frame
+                result = pipeline.get()
                 
-                self.frame_count += 1
-                
-                # Process every N frames
-                recognized = {}
-                if self.frame_count % self.process_every_n_frames == 0:
-                    recognized = self.recognize_faces(frame)
-                
-                # Update tracker
-                recognized_labels = set(recognized.keys()) - {"Unknown"}
-                need_updates = self.tracker.update(recognized_labels)
-                
-                # Send zone updates
-                for label in need_updates:
-                    self.handle_zone_update(label)
-                
-                # Cleanup inactive persons
-                if self.frame_count % 100 == 0:  # Every 100 frames
-                    self.tracker.cleanup_inactive()
-                
-                # Draw results
-                for label, box in recognized.items():
-                    color = (0, 255, 0) if label != "Unknown" else (0, 0, 255)
-                    draw_face_box(frame, box, label, color)
-                
-                # Update FPS
-                fps = self.fps_counter.update()
-                
-                # Draw info panel
-                backend_status = "Connected" if self.backend_api.is_online else "Offline"
-                zone_text = f"Zone {self.tracker.zone_id}"
-                
-                # Draw zone info
-                cv2.putText(frame, zone_text, (10, frame.shape[0] - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                
-                draw_info_panel(
-                    frame,
-                    fps,
-                    self.tracker.get_active_count(),
-                    backend_status
-                )
+                if result is None and pipeline.finished:
+                    logger.error("No more frames from camera")
+                    break
                 
-                # Display frame
-                cv2.imshow(f'IntelliSight - Zone {self.tracker.zone_id} Tracking', frame)
+                command = None
+                if result is not None:
+                    frame = result.frame.image
+                    recognized = result.recognized
+                    self.frame_count += 1
+                    
+                    # Update tracker
+                    recognized_labels = set(recognized.keys()) - {"Unknown"}
+                    need_updates = self.tracker.update(recognized_labels, result.frame.timestamp)
+                    
+                    # Send zone updates
+                    for label in need_updates:
+                        self.handle_zone_update(label)
+                    
+                    # Cleanup inactive persons
+                    if self.frame_count % 100 == 0:  # Every 100 frames
+                        self.tracker.cleanup_inactive()
+                    
+                    # Update FPS
+                    fps = self.fps_counter.update()
+                    
+                    if not self.headless:
+                        # Draw results and display frame
+                        self.render(frame, recognized, fps)
+                        cv2.imshow(f'IntelliSight - Zone {self.tracker.zone_id} Tracking', frame)
+                        
+                        # Handle keyboard input
+                        command = KEY_COMMANDS.get(cv2.waitKey(1) & 0xFF)
+                    elif self.preview and self.preview.due():
+                        self.preview.write(frame, lambda image: self.render(image, recognized, fps))
                 
-                # Handle keyboard input
-                key = cv2.waitKey(1) & 0xFF
+                if controls:
+                    command = controls.take_command()
                 
-                if key == ord('q'):
+                if command == 'quit':
                     logger.info("Quit requested")
                     break
-                elif key == ord('s'):
+                elif command == 'sync':
                     logger.info("Syncing offline entries...")
-                    successful, failed = self.backend_api.sync_offline_entries()
-                    logger.info(f"Sync complete: {successful} synced, {failed} failed")
-                elif key == ord('r'):
+                    self.backend_api.schedule_sync(force=True)
+                elif command == 'reset':
                     logger.info("Resetting tracker...")
                     self.tracker.reset()
                 
-                # Auto-sync offline entries
-                self.backend_api.sync_offline_entries()
+                # Auto-sync offline entries (in the background)
+                self.backend_api.schedule_sync()
         
         finally:
             # Cleanup
-            video_capture.release()
-            cv2.destroyAllWindows()
+            pipeline.stop()
+            self.backend_api.close()
+            if self.gallery_watcher:
+                self.gallery_watcher.stop()
+            frame_reader.stop()
+            if not self.headless:
+                cv2.destroyAllWindows()
             logger.info("Camera released, windows closed")
 
 
@@ -403,6 +393,10 @@ if __name__ == "__main__":
                        help='Face detection method (default: dnn)')
     parser.add_argument('--update-interval', type=float, default=60.0,
                        help='Zone update interval in seconds (default: 60)')
+    parser.add_argument('--headless', action='store_true',
+                       help='No window or drawing; control by signals (SIGTERM/SIGUSR1/SIGUSR2)')
+    parser.add_argument('--preview', type=str, default=None,
+                       help='Headless: write an annotated JPEG snapshot to this path (default: from .env)')
     
     args = parser.parse_args()
     
@@ -416,6 +410,10 @@ if __name__ == "__main__":
         config['recognition_tolerance'] = args.tolerance
         config['detection_method'] = args.method
         config['zone_update_interval'] = args.update_interval
+        if args.headless:
+            config['headless'] = True
+        if args.preview is not None:
+            config['preview_file'] = args.preview
         
         # Initialize and run system
         system = LiveZoneTrackingSystem(config)
@@ -0,0 +1,146 @@
+"""
+IntelliSight - Motion Gate
+Author: IntelliSight Team
+Description: Cheap motion check that lets static frames skip face detection
+
+Each frame is shrunk to a small blurred grayscale image and compared with
+a running-average background (cv2.accumulateWeighted), so slow lighting
+changes are absorbed while people walking through the region register as
+motion. Detection only has to run when the share of changed pixels inside
+the region of interest exceeds a threshold.
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, Optional, Tuple, Union
+
+
+def parse_roi(roi: Union[str, Tuple, None]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Parse a region of interest given as relative corners
+    
+    Args:
+        roi: "x1,y1,x2,y2" string or tuple with values in 0..1, or empty/None
+            for the whole frame
+    
+    Returns:
+        Tuple (x1, y1, x2, y2) or None
+    """
+    if not roi:
+        return None
+    
+    if isinstance(roi, str):
+        roi = [float(v) for v in roi.split(',')]
+    
+    if len(roi) != 4:
+        raise ValueError(f"Motion ROI must have 4 values x1,y1,x2,y2: {roi}")
+    
+    x1, y1, x2, y2 = (min(max(float(v), 0.0), 1.0) for v in roi)
+    if x2 <= x1 or y2 <= y1:
+        raise ValueError(f"Empty motion ROI: {roi}")
+    
+    return x1, y1, x2, y2
+
+
+class MotionGate:
+    """Frame differencing against a running-average background"""
+    
+    def __init__(self, threshold: float = 0.005, pixel_threshold: int = 25,
+                 width: int = 160, roi: Union[str, Tuple, None] = None,
+                 learning_rate: float = 0.05):
+        """
+        Initialize motion gate
+        
+        Args:
+            threshold: Share of ROI pixels that must change to count as motion
+            pixel_threshold: Gray-level difference for a pixel to count as changed
+            width: Width of the downscaled analysis image
+            roi: Region of interest as relative "x1,y1,x2,y2" (None = whole frame)
+            learning_rate: Background adaptation rate per checked frame
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.roi = parse_roi(roi)
+        self.learning_rate = learning_rate
+        
+        self.background: Optional[np.ndarray] = None
+        self.last_motion = 0.0
+        
+        # Statistics
+        self.checked = 0
+        self.skipped = 0
+    
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        """Downscale, convert to gray, crop to the ROI and blur"""
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        
+        if self.roi:
+            x1, y1, x2, y2 = self.roi
+            gray = gray[int(y1 * height):max(int(y2 * height), int(y1 * height) + 1),
+                        int(x1 * self.width):max(int(x2 * self.width), int(x1 * self.width) + 1)]
+        
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+    
+    def has_motion(self, frame: np.ndarray) -> bool:
+        """
+        Check a frame for motion and update the background
+        
+        Args:
+            frame: Input image (BGR)
+        
+        Returns:
+            True if the changed share of the ROI exceeds the threshold
+            (always True for the first frame)
+        """
+        gray = self._prepare(frame)
+        
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.last_motion = 1.0
+            return True
+        
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        self.last_motion = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+        
+        return self.last_motion >= self.threshold
+    
+    def should_detect(self, frame: np.ndarray, faces_present: bool = False) -> bool:
+        """
+        Decide whether face detection should run on a frame
+        
+        Args:
+            frame: Input image (BGR)
+            faces_present: Faces were found on the previous detected frame
+        
+        Returns:
+            True if detection should run
+        """
+        self.checked += 1
+        
+        # The background is updated even when tracked faces force detection
+        motion = self.has_motion(frame)
+        if motion or faces_present:
+            return True
+        
+        self.skipped += 1
+        return False
+    
+    def get_stats(self) -> Dict:
+        """
+        Get gate statistics
+        
+        Returns:
+            Dictionary with checked and skipped frames, skip ratio and the
+            motion share of the last frame
+        """
+        return {
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / self.checked if self.checked else 0.0,
+            'last_motion': self.last_motion
+        }
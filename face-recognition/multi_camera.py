@@ -0,0 +1,446 @@
+"""
+IntelliSight - Multi-Camera Runner
+Author: IntelliSight Team
+Description: Run many cameras in one process with a shared gallery, pipeline and backend
+
+One process loads the gallery once, runs one recognition pipeline (shared
+detector and encoder worker pools) and one backend client per mode, while
+every camera keeps its own frame reader and tracker. Frames are taken from
+the cameras in turn, so a busy camera cannot starve the others.
+
+Camera file (JSON):
+    {
+        "cameras": [
+            {"camera_id": 1, "source": 0, "zone_id": 1, "mode": "attendance"},
+            {"camera_id": 2, "source": "rtsp://10.0.0.12/stream", "zone_id": 3, "mode": "zone",
+             "motion_roi": "0.2,0.1,0.8,1.0"}
+        ]
+    }
+
+Modes:
+    attendance - entry/exit logging (as live_recognition.py)
+    zone       - zone presence updates (as live_zone_tracking.py)
+
+Without --display the runner is headless: only processed frames are
+decoded, control is by signals (see headless.py) and PREVIEW_FILE, if set,
+receives a low-rate annotated snapshot per camera (name_<camera_id>.jpg).
+
+Usage:
+    python multi_camera.py --cameras cameras.json
+    python multi_camera.py --cameras cameras.json --display
+"""
+
+import os
+import cv2
+import json
+from typing import Dict, List, Optional
+from utils import (
+    setup_logging,
+    load_config,
+    load_encodings,
+    parse_person_id,
+    FPSCounter,
+    draw_face_box,
+    draw_info_panel
+)
+from gallery_matcher import build_matcher, GalleryWatcher
+from frame_reader import FrameReader
+from headless import KEY_COMMANDS, PreviewWriter, SignalControl
+from offline_journal import journal_path
+from pipeline import RecognitionPipeline, PipelineItem
+from live_recognition import PersonTracker
+from live_zone_tracking import ZoneTracker
+from send_to_backend import BackendAPI
+from send_zone_to_backend import ZoneTrackingAPI
+
+logger = setup_logging()
+
+CAMERA_MODES = ('attendance', 'zone')
+
+
+def load_camera_config(config_path: str, default_zone_id: int = 1) -> List[Dict]:
+    """
+    Load and validate the camera list
+    
+    Args:
+        config_path: Path to the JSON camera file
+        default_zone_id: Zone used for cameras without zone_id
+    
+    Returns:
+        List of camera dictionaries with camera_id, source, zone_id and mode
+    """
+    with open(config_path, 'r') as f:
+        data = json.load(f)
+    
+    cameras = data.get('cameras', []) if isinstance(data, dict) else data
+    
+    if not cameras:
+        raise ValueError(f"No cameras defined in {config_path}")
+    
+    result = []
+    seen_ids = set()
+    for i, camera in enumerate(cameras):
+        if 'source' not in camera:
+            raise ValueError(f"Camera #{i + 1} in {config_path} has no source")
+        
+        mode = camera.get('mode', 'attendance').lower()
+        if mode not in CAMERA_MODES:
+            raise ValueError(f"Camera #{i + 1}: unknown mode '{mode}' (use {' or '.join(CAMERA_MODES)})")
+        
+        camera_id = int(camera.get('camera_id', i + 1))
+        if camera_id in seen_ids:
+            raise ValueError(f"Duplicate camera_id {camera_id} in {config_path}")
+        seen_ids.add(camera_id)
+        
+        result.append({
+            **camera,
+            'camera_id': camera_id,
+            'zone_id': int(camera.get('zone_id', default_zone_id)),
+            'mode': mode
+        })
+    
+    return result
+
+
+class CameraChannel:
+    """Per-camera state: frame reader, tracker and event handling"""
+    
+    def __init__(self, camera: Dict, config: Dict,
+                 backend_api: Optional[BackendAPI] = None,
+                 zone_api: Optional[ZoneTrackingAPI] = None,
+                 decode_every: int = 1):
+        """
+        Initialize camera channel
+        
+        Args:
+            camera: Camera dictionary from load_camera_config
+            config: Configuration dictionary
+            backend_api: Shared entry/exit client (attendance mode)
+            zone_api: Shared zone update client (zone mode)
+            decode_every: Decode only every Nth camera frame (headless)
+        """
+        self.camera_id = camera['camera_id']
+        self.zone_id = camera['zone_id']
+        self.mode = camera['mode']
+        self.name = camera.get('name', f"Camera {self.camera_id}")
+        self.motion_roi = camera.get('motion_roi', '')
+        self.backend_api = backend_api
+        self.zone_api = zone_api
+        
+        if self.mode == 'attendance':
+            self.tracker = PersonTracker(config.get('disappear_threshold', 3.0))
+        else:
+            self.tracker = ZoneTracker(self.zone_id, config.get('zone_update_interval', 60.0))
+        
+        self.frame_reader = FrameReader(
+            camera['source'],
+            camera.get('width', config.get('camera_width', 640)),
+            camera.get('height', config.get('camera_height', 480)),
+            config.get('capture_buffer_size', 1),
+            decode_every=decode_every
+        )
+        self.preview: Optional[PreviewWriter] = None
+        
+        self.frame_count = 0
+        self.fps_counter = FPSCounter()
+    
+    def handle(self, item: PipelineItem):
+        """
+        Update the tracker with a recognized frame and send events
+        
+        Args:
+            item: Pipeline result for this camera
+        """
+        self.frame_count += 1
+        self.fps_counter.update()
+        recognized_labels = set(item.recognized.keys()) - {"Unknown"}
+        
+        if self.mode == 'attendance':
+            new_entries, new_exits = self.tracker.update(recognized_labels, item.frame.timestamp)
+            
+            for label in new_entries:
+                self._send(label, self.backend_api.send_entry, "Entry",
+                           camera_id=self.camera_id)
+            for label in new_exits:
+                self._send(label, self.backend_api.send_exit, "Exit",
+                           camera_id=self.camera_id)
+        else:
+            need_updates = self.tracker.update(recognized_labels, item.frame.timestamp)
+            
+            for label in need_updates:
+                self._send(label, self.zone_api.send_zone_update, "Zone update")
+            
+            # Cleanup inactive persons
+            if self.frame_count % 100 == 0:
+                self.tracker.cleanup_inactive()
+    
+    def _send(self, label: str, send_fn, event_name: str, **kwargs):
+        """
+        Send one event for a person label
+        
+        Args:
+            label: Person label (e.g., "STUDENT_5")
+            send_fn: Backend client method
+            event_name: Event name for logging
+            **kwargs: Extra arguments for send_fn
+        """
+        try:
+            person_type, person_id = parse_person_id(label)
+        except ValueError:
+            return
+        
+        success, _ = send_fn(person_type=person_type, person_id=person_id,
+                             zone_id=self.zone_id, **kwargs)
+        
+        if success:
+            logger.info(f"✅ [{self.name}] {event_name} logged: {label}")
+        else:
+            logger.warning(f"⚠️  [{self.name}] {event_name} failed: {label}")
+    
+    def draw(self, frame, recognized: Dict, backend_online: bool):
+        """
+        Draw recognition results and the info panel
+        
+        Args:
+            frame: Frame to draw on (modified in place)
+            recognized: label -> (x, y, w, h)
+            backend_online: Backend connection state
+        """
+        for label, box in recognized.items():
+            color = (0, 255, 0) if label != "Unknown" else (0, 0, 255)
+            draw_face_box(frame, box, label, color)
+        
+        cv2.putText(frame, f"{self.name} - Zone {self.zone_id} ({self.mode})",
+                    (10, frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        
+        draw_info_panel(
+            frame,
+            self.fps_counter.get_fps(),
+            self.tracker.get_active_count(),
+            "Connected" if backend_online else "Offline"
+        )
+
+
+class MultiCameraRunner:
+    """Run several cameras on one shared gallery, pipeline and backend client"""
+    
+    def __init__(self, cameras: List[Dict], config: Dict = None, display: bool = False):
+        """
+        Initialize runner
+        
+        Args:
+            cameras: Camera dictionaries from load_camera_config
+            config: Configuration dictionary
+            display: Show one window per camera
+        """
+        self.config = config or load_config()
+        self.display = display
+        
+        # Load face encodings once for all cameras
+        model_path = self.config.get('model_path', 'models/encodings.pickle')
+        encodings_data = load_encodings(model_path)
+        
+        if not encodings_data:
+            raise FileNotFoundError(
+                f"Encodings not found at {model_path}. "
+                f"Please run train_encodings.py first."
+            )
+        
+        self.matcher = build_matcher(encodings_data, self.config)
+        self.tolerance = self.config.get('recognition_tolerance', 0.6)
+        
+        logger.info(f"Loaded {len(self.matcher)} face encodings")
+        
+        reload_interval = self.config.get('gallery_reload_interval', 5.0)
+        self.gallery_watcher = (
+            GalleryWatcher(model_path, self.config, reload_interval)
+            if reload_interval > 0 else None
+        )
+        
+        # One backend client per mode, shared by all cameras of that mode
+        modes = {camera['mode'] for camera in cameras}
+        self.backend_api = None
+        self.zone_api = None
+        
+        entry_log = self.config.get('offline_log_file', 'logs/offline_entries.jsonl')
+        zone_log = self.config.get('zone_offline_log_file', 'logs/offline_zone_updates.jsonl')
+        if {'attendance', 'zone'} <= modes and \
+                os.path.realpath(journal_path(entry_log)) == os.path.realpath(journal_path(zone_log)):
+            # Each client's sync would replay the other's records to the wrong endpoint
+            raise ValueError(
+                f"OFFLINE_LOG_FILE and ZONE_OFFLINE_LOG_FILE both point to {entry_log}; "
+                f"attendance and zone cameras need separate offline logs"
+            )
+        
+        if 'attendance' in modes:
+            self.backend_api = BackendAPI(self.config)
+            self.backend_api.login()
+        
+        if 'zone' in modes:
+            # Zone updates are queued offline in ZONE_OFFLINE_LOG_FILE
+            self.zone_api = ZoneTrackingAPI(self.config)
+            self.zone_api.login()
+        
+        # Headless: frames that are not processed are never decoded
+        decode_every = 1 if display else max(1, self.config.get('process_every_n_frames', 2))
+        self.channels: Dict[int, CameraChannel] = {
+            camera['camera_id']: CameraChannel(camera, self.config, self.backend_api,
+                                               self.zone_api, decode_every)
+            for camera in cameras
+        }
+        
+        preview_file = self.config.get('preview_file', '')
+        if preview_file and not display:
+            root, ext = os.path.splitext(preview_file)
+            for camera_id, channel in self.channels.items():
+                channel.preview = PreviewWriter(f"{root}_{camera_id}{ext or '.jpg'}",
+                                                self.config.get('preview_interval', 2.0))
+        
+        # One pipeline (detector and encoder pools) for all cameras
+        self.pipeline = RecognitionPipeline(
+            lambda face_encodings: self.matcher.match(face_encodings, tolerance=self.tolerance),
+            self.config
+        )
+        
+        logger.info(f"Multi-camera runner initialized with {len(self.channels)} camera(s)")
+    
+    @property
+    def backend_clients(self) -> List:
+        """Backend clients in use"""
+        return [api for api in (self.backend_api, self.zone_api) if api is not None]
+    
+    def run(self):
+        """Run all cameras until quit or every stream has ended"""
+        # Open cameras; one that fails to open does not stop the others
+        readers = {}
+        for camera_id, channel in self.channels.items():
+            try:
+                readers[camera_id] = channel.frame_reader.start()
+                logger.info(f"✅ {channel.name} opened: zone {channel.zone_id}, {channel.mode}")
+            except RuntimeError as e:
+                logger.error(f"❌ {channel.name}: {e}")
+        
+        if not readers:
+            raise RuntimeError("No camera could be opened")
+        
+        if self.gallery_watcher:
+            self.gallery_watcher.start()
+            self.gallery_watcher.install_signal_handler()
+        
+        controls = None
+        if self.display:
+            logger.info("Press 'q' to quit, 's' to sync offline entries, 'r' to reset trackers")
+        else:
+            controls = SignalControl()
+            controls.install()
+        
+        try:
+            self.pipeline.start(readers, motion_rois={
+                camera_id: self.channels[camera_id].motion_roi for camera_id in readers
+            })
+            
+            while True:
+                # Swap in a reloaded gallery between frames
+                if self.gallery_watcher:
+                    new_matcher = self.gallery_watcher.take()
+                    if new_matcher is not None:
+                        self.matcher = new_matcher
+                
+                item = self.pipeline.get()
+                
+                if item is None and self.pipeline.finished:
+                    logger.info("All camera streams ended")
+                    break
+                
+                command = None
+                if item is not None:
+                    channel = self.channels[item.source]
+                    channel.handle(item)
+                    
+                    frame = item.frame.image
+                    api = channel.backend_api or channel.zone_api
+                    if self.display:
+                        channel.draw(frame, item.recognized, api.is_online)
+                        cv2.imshow(f'IntelliSight - {channel.name}', frame)
+                        
+                        # Handle keyboard input
+                        command = KEY_COMMANDS.get(cv2.waitKey(1) & 0xFF)
+                    elif channel.preview and channel.preview.due():
+                        channel.preview.write(
+                            frame, lambda image: channel.draw(image, item.recognized, api.is_online)
+                        )
+                
+                if controls:
+                    command = controls.take_command()
+                
+                if command == 'quit':
+                    logger.info("Quit requested")
+                    break
+                elif command == 'sync':
+                    logger.info("Syncing offline entries...")
+                    for api in self.backend_clients:
+                        api.schedule_sync(force=True)
+                elif command == 'reset':
+                    logger.info("Resetting trackers...")
+                    for ch in self.channels.values():
+                        ch.tracker.reset()
+                
+                # Auto-sync offline entries (in the background)
+                for api in self.backend_clients:
+                    api.schedule_sync()
+        
+        finally:
+            # Cleanup
+            self.pipeline.stop()
+            for api in self.backend_clients:
+                api.close()
+            if self.gallery_watcher:
+                self.gallery_watcher.stop()
+            for reader in readers.values():
+                reader.stop()
+            if self.display:
+                cv2.destroyAllWindows()
+            logger.info("Cameras released")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="IntelliSight Multi-Camera Runner")
+    parser.add_argument('--cameras', type=str, default='cameras.json',
+                       help='Camera configuration file (default: cameras.json)')
+    parser.add_argument('--display', action='store_true',
+                       help='Show a window per camera (default: headless, control by signals)')
+    parser.add_argument('--preview', type=str, default=None,
+                       help='Headless: annotated JPEG snapshot path, one file per camera (default: from .env)')
+    parser.add_argument('--tolerance', type=float, default=None,
+                       help='Recognition tolerance (default: from .env)')
+    parser.add_argument('--method', type=str, default=None, choices=['haar', 'dnn'],
+                       help='Face detection method (default: from .env)')
+    
+    args = parser.parse_args()
+    
+    try:
+        # Load config
+        config = load_config()
+        
+        # Override with command line arguments
+        if args.tolerance is not None:
+            config['recognition_tolerance'] = args.tolerance
+        if args.method is not None:
+            config['detection_method'] = args.method
+        if args.preview is not None:
+            config['preview_file'] = args.preview
+        
+        cameras = load_camera_config(args.cameras, config.get('default_zone_id', 1))
+        
+        # Initialize and run runner
+        runner = MultiCameraRunner(cameras, config, display=args.display)
+        runner.run()
+    
+    except KeyboardInterrupt:
+        logger.info("\n⚠️  Interrupted by user")
+    except Exception as e:
+        logger.error(f"❌ Error: {e}", exc_info=True)
+    finally:
+        logger.info("Shutting down...")
@@ -0,0 +1,487 @@
+"""
+IntelliSight - Offline Event Journal
+Author: IntelliSight Team
+Description: Append-only JSON-lines queue for events that could not be sent to the backend
+
+Storing an event appends one line instead of rewriting the whole log, so
+the cost per event stays constant however long the backend is down.
+Appends are flushed right away but fsync'ed in batches (every
+`fsync_batch` events or `fsync_interval` seconds, whichever comes first).
+
+The sync reads from a cursor and acknowledges what the backend accepted
+by advancing a byte offset, stored in a small '<journal>.ack' file, so
+nothing is rewritten then either. Once the acknowledged prefix is large
+the journal is compacted: the unacknowledged tail is copied to a new file
+that replaces the old one. The first line of every journal is a header
+with a generation number that the ack file repeats, so an ack offset is
+never applied to a file compacted after it was written.
+
+Only one process may use a journal: it holds a '<journal>.lock' file
+with its pid (created with O_EXCL like the gallery lock) until close().
+A lock left behind by a process that no longer runs is taken over.
+
+read() hands out stream positions rather than file offsets: a position
+counts the bytes of every record since the journal was opened, so one
+read before a compaction is still acknowledged correctly after it.
+
+A legacy JSON-array log (the '.json' file of older versions) is imported
+into the journal once and renamed to '<name>.json.imported'. Every stored
+event carries an 'eventId' (added here for events that have none), which
+the backend uses to ignore events the sync sends a second time.
+"""
+
+import os
+import time
+import json
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from utils import setup_logging, new_event_id
+
+logger = setup_logging()
+
+JOURNAL_FORMAT = 'intellisight-offline-journal'
+JOURNAL_VERSION = 1
+
+# Lock files held by journals of this process
+_held_locks = set()
+
+
+def journal_path(log_file: str) -> str:
+    """
+    Journal file used for a configured offline log path
+    
+    Args:
+        log_file: OFFLINE_LOG_FILE value ('.jsonl', or a legacy '.json' path)
+    
+    Returns:
+        Path of the JSON-lines journal
+    """
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.jsonl" if ext in ('.json', '') else log_file
+
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process with this pid is running"""
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class OfflineJournal:
+    """Append-only event journal with acknowledged-offset cursor and compaction"""
+    
+    def __init__(self, log_file: str = "logs/offline_entries.jsonl", fsync_interval: float = 1.0,
+                 fsync_batch: int = 100, compact_bytes: int = 1 << 20):
+        """
+        Open (or create) a journal
+        
+        Args:
+            log_file: Offline log path (see journal_path)
+            fsync_interval: Longest time in seconds an appended event may
+                stay un-fsync'ed (0 = fsync every append)
+            fsync_batch: Appends per fsync
+            compact_bytes: Acknowledged bytes that trigger a compaction
+        """
+        self.path = journal_path(log_file)
+        self.ack_path = f"{self.path}.ack"
+        self.lock_path = os.path.abspath(f"{self.path}.lock")
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = max(1, fsync_batch)
+        self.compact_bytes = compact_bytes
+        
+        self.lock = threading.RLock()
+        self.unsynced = 0
+        self.fsync_timer = None
+        
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._acquire_lock()
+        try:
+            self._open()
+        except Exception:
+            self._release_lock()
+            raise
+        
+        legacy_path = f"{os.path.splitext(self.path)[0]}.json"
+        if legacy_path != self.path and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path)
+        
+        if self.pending:
+            logger.info(f"Offline journal {self.path}: {self.pending} pending event(s)")
+        
+        atexit.register(self.close)
+    
+    # Process lock
+    def _acquire_lock(self):
+        """
+        Create the lock file, taking over one whose process is gone
+        
+        Raises:
+            RuntimeError: If another running process (or another journal
+                of this process) holds the journal
+        """
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                _held_locks.add(self.lock_path)
+                return
+            except FileExistsError:
+                pass
+            
+            try:
+                with open(self.lock_path, 'r') as f:
+                    pid = int(f.read() or 0)
+                age = time.time() - os.path.getmtime(self.lock_path)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError):
+                pid, age = 0, float('inf')
+            
+            if pid == os.getpid():
+                if self.lock_path in _held_locks:
+                    raise RuntimeError(f"Offline journal {self.path} is already open in this process "
+                                       f"(share it through get_journal)")
+            elif pid and _process_alive(pid):
+                raise RuntimeError(f"Offline journal {self.path} is in use by process {pid} "
+                                   f"(delete {self.lock_path} if that process is not IntelliSight)")
+            elif not pid and age < 2.0:
+                # Just created, the pid is being written
+                time.sleep(0.05)
+                continue
+            
+            logger.warning(f"Taking over offline journal lock of stopped process {pid or '?'}: {self.lock_path}")
+            try:
+                os.remove(self.lock_path)
+            except FileNotFoundError:
+                pass
+    
+    def _release_lock(self):
+        """Remove the lock file"""
+        if self.lock_path in _held_locks:
+            _held_locks.discard(self.lock_path)
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+    
+    # Opening and recovery
+    def _open(self):
+        """Create the file if needed, read header and cursor, recover and open for appending"""
+        if not os.path.exists(self.path):
+            self._create(generation=1)
+        
+        self.generation, self.start = self._read_header()
+        self.offset = self._load_ack()
+        self.size = self._recover()
+        with open(self.path, 'rb') as f:
+            self.pending = sum(1 for _ in self._records(f, self.offset))
+        
+        # Stream position of the first record in the file (grows with every compaction)
+        self.base = 0
+        self.file = open(self.path, 'ab')
+    
+    def _create(self, generation: int, records: bytes = b''):
+        """Write a new journal file (header plus records) atomically"""
+        header = json.dumps({'format': JOURNAL_FORMAT, 'version': JOURNAL_VERSION,
+                             'generation': generation}).encode() + b'\n'
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+    
+    def _read_header(self) -> Tuple[int, int]:
+        """
+        Read the journal header
+        
+        Returns:
+            Tuple of (generation, offset of the first record)
+        """
+        with open(self.path, 'rb') as f:
+            line = f.readline()
+        
+        try:
+            header = json.loads(line)
+            if not isinstance(header, dict) or header.get('format') != JOURNAL_FORMAT:
+                raise ValueError(f"not an offline journal: {self.path}")
+            return int(header['generation']), len(line)
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Corrupt offline journal header in {self.path}: {e}")
+    
+    def _load_ack(self) -> int:
+        """Acknowledged offset for the current generation (start if none)"""
+        try:
+            with open(self.ack_path, 'r') as f:
+                ack = json.load(f)
+            if ack.get('generation') == self.generation:
+                return max(self.start, int(ack['offset']))
+        except (OSError, ValueError, KeyError):
+            pass
+        return self.start
+    
+    def _recover(self) -> int:
+        """
+        Drop a partially written last line (crash during an append)
+        
+        Returns:
+            Journal size in bytes
+        """
+        size = os.path.getsize(self.path)
+        if size <= self.start:
+            return size
+        
+        with open(self.path, 'rb+') as f:
+            # Find the last newline from the end
+            position = size
+            while position > self.start:
+                step = min(4096, position - self.start)
+                f.seek(position - step)
+                block = f.read(step)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    end = position - step + newline + 1
+                    break
+                position -= step
+            else:
+                end = self.start
+            
+            if end < size:
+                logger.warning(f"Offline journal {self.path}: dropping {size - end} bytes of a partial record")
+                f.truncate(end)
+                f.flush()
+                os.fsync(f.fileno())
+        return end
+    
+    def _import_legacy(self, legacy_path: str):
+        """Append the events of a legacy JSON-array log and rename it"""
+        try:
+            with open(legacy_path, 'r') as f:
+                entries = json.load(f)
+        except ValueError:
+            logger.error(f"Failed to parse legacy offline log: {legacy_path}")
+            return
+        
+        self.extend(entries if isinstance(entries, list) else [])
+        os.replace(legacy_path, f"{legacy_path}.imported")
+        logger.info(f"Imported {len(entries)} event(s) from legacy offline log {legacy_path}")
+    
+    def _records(self, f, offset: int):
+        """Yield (end offset, event) for every record of open journal `f` from `offset`"""
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if not line.endswith(b'\n'):
+                break
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping corrupt record in offline journal {self.path}")
+    
+    # Writing
+    def append(self, event: Dict):
+        """
+        Append one event
+        
+        Args:
+            event: Event dictionary (a 'timestamp' and an 'eventId' are
+                added if missing)
+        """
+        self.extend([event])
+    
+    def extend(self, events: List[Dict]):
+        """
+        Append events with one write
+        
+        Args:
+            events: Event dictionaries (a 'timestamp' and an 'eventId' are
+                added if missing)
+        """
+        if not events:
+            return
+        
+        lines = []
+        for event in events:
+            if 'timestamp' not in event:
+                event['timestamp'] = datetime.now().isoformat()
+            if 'eventId' not in event:
+                event['eventId'] = new_event_id()
+            lines.append(json.dumps(event, separators=(',', ':')).encode() + b'\n')
+        data = b''.join(lines)
+        
+        with self.lock:
+            self.file.write(data)
+            self.file.flush()
+            self.size += len(data)
+            self.pending += len(events)
+            self.unsynced += len(events)
+            
+            if self.unsynced >= self.fsync_batch or self.fsync_interval <= 0:
+                self._fsync()
+            elif self.fsync_timer is None:
+                self.fsync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self.fsync_timer.daemon = True
+                self.fsync_timer.start()
+    
+    def sync(self):
+        """Fsync appended events now"""
+        with self.lock:
+            if self.unsynced:
+                self._fsync()
+            self.fsync_timer = None
+    
+    def _fsync(self):
+        """Fsync the journal (lock held)"""
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+    
+    # Reading and acknowledging
+    def read(self, max_events: Optional[int] = None) -> List[Tuple[int, Dict]]:
+        """
+        Read unacknowledged events from the cursor
+        
+        Args:
+            max_events: Most events to return (None = all)
+        
+        Returns:
+            List of (end position, event); pass an end position to ack()
+        """
+        # Opened with the cursor: a compaction replaces the file, but this
+        # handle keeps reading the one the offsets belong to
+        with self.lock:
+            offset, shift = self.offset, self.base - self.start
+            f = open(self.path, 'rb')
+        
+        records = []
+        with f:
+            for end, event in self._records(f, offset):
+                records.append((shift + end, event))
+                if max_events is not None and len(records) >= max_events:
+                    break
+        return records
+    
+    def ack(self, position: int, count: int):
+        """
+        Acknowledge every event before a record's end position
+        
+        Args:
+            position: End position of the last delivered record (from
+                read(), also after a compaction since)
+            count: Number of events acknowledged by this call
+        """
+        with self.lock:
+            offset = position - self.base + self.start
+            if offset <= self.offset:
+                return
+            
+            self.offset = offset
+            self.pending = max(0, self.pending - count)
+            
+            acked = self.offset - self.start
+            if self.offset >= self.size or (acked >= self.compact_bytes and acked * 2 >= self.size):
+                self.compact()
+            else:
+                self._write_ack()
+    
+    def _write_ack(self):
+        """Persist the cursor (lock held)"""
+        tmp_path = f"{self.ack_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'generation': self.generation, 'offset': self.offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.ack_path)
+    
+    def compact(self):
+        """Rewrite the journal with only its unacknowledged events"""
+        with self.lock:
+            self._fsync()
+            self.file.close()
+            
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                tail = f.read()
+            
+            acked = self.offset - self.start
+            self.generation += 1
+            self._create(self.generation, tail)
+            
+            self.base += acked
+            self.generation, self.start = self._read_header()
+            self.offset = self.start
+            self.size = self.start + len(tail)
+            self._write_ack()
+            self.file = open(self.path, 'ab')
+        
+        logger.info(f"Offline journal {self.path} compacted ({acked} acknowledged bytes removed)")
+    
+    def clear(self):
+        """Acknowledge everything and empty the journal"""
+        with self.lock:
+            self.offset = self.size
+            self.pending = 0
+            self.compact()
+    
+    def __len__(self) -> int:
+        """Number of unacknowledged events"""
+        return self.pending
+    
+    def close(self):
+        """Fsync and close the journal and release it to other processes"""
+        with self.lock:
+            if self.fsync_timer:
+                self.fsync_timer.cancel()
+                self.fsync_timer = None
+            if not self.file.closed:
+                self._fsync()
+                self.file.close()
+                self._release_lock()
+
+
+_journals: Dict[str, OfflineJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(log_file: str, config: Dict = None) -> OfflineJournal:
+    """
+    Shared journal instance for an offline log path
+    
+    Args:
+        log_file: Offline log path
+        config: Configuration dictionary (offline_fsync_interval,
+            offline_fsync_batch, offline_compact_bytes; used on first open)
+    
+    Returns:
+        OfflineJournal
+    """
+    config = config or {}
+    path = os.path.realpath(journal_path(log_file))
+    
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None or journal.file.closed:
+            journal = OfflineJournal(
+                path,
+                fsync_interval=config.get('offline_fsync_interval', 1.0),
+                fsync_batch=config.get('offline_fsync_batch', 100),
+                compact_bytes=config.get('offline_compact_bytes', 1 << 20)
+            )
+            _journals[path] = journal
+        return journal
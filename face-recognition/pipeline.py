@@ -0,0 +1,771 @@
+"""
+IntelliSight - Recognition Pipeline
+Author: IntelliSight Team
+Description: Staged capture -> detect -> encode -> match pipeline for the live systems
+
+Each stage has a bounded input queue served by a pool of worker threads.
+OpenCV and dlib release the GIL during detection and encoding, so the
+detect and encode pools run on several cores at once. Every worker holds
+its own detector/encoder instance since the models are not safe to share.
+
+Backpressure: for live sources the detect queue applies the configured drop
+policy (drop_oldest keeps the freshest frames when the system is
+overloaded); later stages block, so work that was already started is never
+thrown away. Recorded video blocks at every stage and no frame is dropped.
+
+A motion gate in front of detection lets static frames skip it unless
+faces were found on the camera's previous detected frame.
+
+With face tracking enabled, full detection only runs every few processed
+frames (or when a track is lost); the frames in between are tracked on the
+capture thread and skip detection. Identities are confirmed per track by
+k-of-n voting over successive matches and then stay with the track, so
+only unconfirmed faces and periodic re-checks are encoded, and only
+confirmed identities reach the entry/exit and zone trackers.
+
+Results are released in capture order by a reorder buffer, so the
+trackers always see monotonically increasing timestamps. Several cameras
+can share one pipeline: frames are taken from them in turn, ordering is
+kept per camera and results are handed out round-robin.
+"""
+
+import cv2
+import time
+import queue
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Union
+from face_tracker import FaceTracker
+from frame_reader import Frame, FrameReader
+from gallery_matcher import UNKNOWN_LABEL
+from motion_gate import MotionGate
+from utils import setup_logging, crop_face_chip, FaceDetector, FaceEncoder
+
+logger = setup_logging()
+
+DROP_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+class PipelineItem:
+    """A frame travelling through the pipeline, with the results of each stage"""
+    
+    __slots__ = ('source', 'seq', 'frame', 'process', 'face_locations', 'track_ids',
+                 'encode_index', 'encodings', 'recognized')
+    
+    def __init__(self, source: Hashable, seq: int, frame: Frame, process: bool):
+        """
+        Initialize pipeline item
+        
+        Args:
+            source: Key of the frame source (camera)
+            seq: Sequence number within the source (capture order)
+            frame: Captured frame
+            process: Run recognition on this frame (False = display only)
+        """
+        self.source = source
+        self.seq = seq
+        self.frame = frame
+        self.process = process
+        self.face_locations = []   # (x, y, w, h) boxes from the detector or tracker
+        self.track_ids = []        # Track ID per face location (face tracking only)
+        self.encode_index = []     # Face locations that need encoding
+        self.encodings = []        # One encoding per entry of encode_index
+        self.recognized = {}       # label -> (x, y, w, h)
+
+
+class Stage:
+    """Bounded input queue served by a pool of worker threads"""
+    
+    def __init__(self, name: str, handler: Callable, workers: int = 1,
+                 queue_size: int = 4, drop_policy: str = 'block',
+                 worker_init: Callable = None, batch_size: int = 1,
+                 batch_timeout: float = 0.0):
+        """
+        Initialize stage
+        
+        Args:
+            name: Stage name (used in metrics and thread names)
+            handler: Function (worker_context, items) updating a list of
+                items in place; the list holds one item unless batching
+            workers: Number of worker threads
+            queue_size: Input queue capacity
+            drop_policy: What put() does when the queue is full:
+                'block' waits, 'drop_oldest' evicts the oldest queued item,
+                'drop_newest' rejects the incoming item
+            worker_init: Factory for per-worker context (e.g. a detector)
+            batch_size: Maximum items handed to the handler at once
+            batch_timeout: Seconds a worker waits for a batch to fill after
+                its first item (bounds the latency added by batching)
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.drop_policy = drop_policy
+        self.worker_init = worker_init
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        
+        # Wired up by the pipeline
+        self.on_output: Callable = None
+        self.on_drop: Callable = None
+        
+        self.threads: List[threading.Thread] = []
+        self.running = False
+        
+        # Metrics
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.busy_time = 0.0
+    
+    def start(self):
+        """Create worker contexts and start the worker threads"""
+        # Contexts are created here so model loading errors surface immediately
+        contexts = [self.worker_init() if self.worker_init else None for _ in range(self.workers)]
+        
+        self.running = True
+        for i, context in enumerate(contexts):
+            thread = threading.Thread(
+                target=self._work, args=(context,),
+                name=f"{self.name}-{i + 1}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+    
+    def put(self, item: PipelineItem) -> bool:
+        """
+        Enqueue an item, applying the drop policy when the queue is full
+        
+        Args:
+            item: Pipeline item
+        
+        Returns:
+            True if the item was queued, False if it was dropped
+        """
+        accepted = False
+        
+        if self.drop_policy == 'block':
+            while self.running and not accepted:
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    accepted = True
+                except queue.Full:
+                    pass
+        elif self.drop_policy == 'drop_newest':
+            try:
+                self.queue.put_nowait(item)
+                accepted = True
+            except queue.Full:
+                pass
+        else:
+            while not accepted:
+                try:
+                    self.queue.put_nowait(item)
+                    accepted = True
+                except queue.Full:
+                    try:
+                        self._drop(self.queue.get_nowait())
+                    except queue.Empty:
+                        pass
+        
+        if accepted:
+            depth = self.queue.qsize()
+            with self.lock:
+                self.max_depth = max(self.max_depth, depth)
+        else:
+            self._drop(item)
+        
+        return accepted
+    
+    def _drop(self, item: PipelineItem):
+        """Count a dropped item and report it downstream"""
+        with self.lock:
+            self.dropped += 1
+        if self.on_drop:
+            self.on_drop(item)
+    
+    def _next_batch(self) -> List[PipelineItem]:
+        """
+        Wait for an item, then collect more until the batch is full or
+        batch_timeout has passed
+        
+        Returns:
+            Items in queue order (empty if none arrived)
+        """
+        try:
+            batch = [self.queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.perf_counter() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.perf_counter()
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _work(self, context):
+        """Worker loop: process items and pass them to the next stage"""
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            
+            start = time.perf_counter()
+            try:
+                self.handler(context, batch)
+            except Exception as e:
+                # Failed frames still move on so later frames are not held back
+                logger.error(f"Pipeline stage '{self.name}' failed on frames "
+                             f"{[item.seq for item in batch]}: {e}", exc_info=True)
+                for item in batch:
+                    item.process = False
+                    item.face_locations = []
+                    item.track_ids = []
+                    item.encode_index = []
+                    item.encodings = []
+                    item.recognized = {}
+                with self.lock:
+                    self.errors += len(batch)
+            
+            with self.lock:
+                self.processed += len(batch)
+                self.batches += 1
+                self.busy_time += time.perf_counter() - start
+            
+            for item in batch:
+                self.on_output(item)
+    
+    def get_metrics(self, reset_peak: bool = False) -> Dict:
+        """
+        Get stage metrics
+        
+        Args:
+            reset_peak: Start a new peak queue depth window
+        
+        Returns:
+            Dictionary with queue depth (current and peak), processed,
+            dropped and failed items, mean batch size and mean service
+            time per item
+        """
+        with self.lock:
+            metrics = {
+                'depth': self.queue.qsize(),
+                'max_depth': self.max_depth,
+                'capacity': self.queue.maxsize,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'avg_batch': self.processed / self.batches if self.batches else 0.0,
+                'avg_ms': self.busy_time / self.processed * 1000 if self.processed else 0.0
+            }
+            if reset_peak:
+                self.max_depth = 0
+        return metrics
+    
+    def stop(self):
+        """Stop the worker threads"""
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        self.threads = []
+
+
+class ReorderBuffer:
+    """Release pipeline items in sequence order per source, round-robin across sources"""
+    
+    def __init__(self, capacity: int = 8):
+        """
+        Initialize reorder buffer
+        
+        Args:
+            capacity: Completed items held per source for a slow consumer before producers wait
+        """
+        self.capacity = max(1, capacity)
+        self.sources: List[Hashable] = []
+        self.pending: Dict[Hashable, Dict[int, Optional[PipelineItem]]] = {}  # None = dropped
+        self.next_seq: Dict[Hashable, int] = {}
+        self.last_seq: Dict[Hashable, int] = {}  # Set when a source has ended
+        self.turn = 0
+        self.condition = threading.Condition()
+        self.running = True
+    
+    def add_source(self, source: Hashable):
+        """Register a frame source"""
+        with self.condition:
+            self.sources.append(source)
+            self.pending[source] = {}
+            self.next_seq[source] = 1
+    
+    def complete(self, item: PipelineItem):
+        """
+        Add a finished item
+        
+        Producers only wait while the consumer could make progress (the
+        source's next item is ready), so an item still in flight never deadlocks.
+        """
+        with self.condition:
+            pending = self.pending[item.source]
+            while (self.running and len(pending) >= self.capacity
+                   and self.next_seq[item.source] in pending):
+                self.condition.wait(0.1)
+            pending[item.seq] = item
+            self.condition.notify_all()
+    
+    def skip(self, item: PipelineItem):
+        """Mark an item as dropped so later items are not held back"""
+        with self.condition:
+            self.pending[item.source][item.seq] = None
+            self.condition.notify_all()
+    
+    def end(self, source: Hashable, last_seq: int):
+        """Mark the end of a source after sequence number last_seq"""
+        with self.condition:
+            self.last_seq[source] = last_seq
+            self.condition.notify_all()
+    
+    def source_finished(self, source: Hashable) -> bool:
+        """True when the source has ended and all its items have been released"""
+        return source in self.last_seq and self.next_seq[source] > self.last_seq[source]
+    
+    @property
+    def finished(self) -> bool:
+        """True when every source has ended and all items have been released"""
+        return bool(self.sources) and all(self.source_finished(s) for s in self.sources)
+    
+    def _pop_ready(self) -> Optional[PipelineItem]:
+        """Take the next ready item, visiting sources round-robin (lock held)"""
+        count = len(self.sources)
+        for offset in range(count):
+            index = (self.turn + offset) % count
+            source = self.sources[index]
+            pending = self.pending[source]
+            
+            while self.next_seq[source] in pending:
+                item = pending.pop(self.next_seq[source])
+                self.next_seq[source] += 1
+                self.condition.notify_all()
+                if item is not None:
+                    self.turn = (index + 1) % count
+                    return item
+        
+        return None
+    
+    def get(self, timeout: float) -> Optional[PipelineItem]:
+        """
+        Take the next item in sequence order
+        
+        Args:
+            timeout: Seconds to wait
+        
+        Returns:
+            Pipeline item, or None if none is ready yet
+        """
+        deadline = time.time() + timeout
+        
+        with self.condition:
+            while not self.finished:
+                item = self._pop_ready()
+                if item is not None:
+                    return item
+                
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+        
+        return None
+    
+    def stop(self):
+        """Release waiting producers"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+
+class RecognitionPipeline:
+    """Capture -> detect -> encode -> match pipeline delivering results in frame order"""
+    
+    def __init__(self, match_fn: Callable, config: Dict):
+        """
+        Initialize pipeline
+        
+        Args:
+            match_fn: Function mapping a list of encodings to gallery matches
+                (called on the match thread; may read a hot-swapped matcher)
+            config: Configuration dictionary
+        """
+        self.match_fn = match_fn
+        self.resize_scale = config.get('resize_scale', 0.25)
+        self.encoding_mode = config.get('encoding_mode', 'crop')
+        self.chip_size = config.get('chip_size', 150)
+        self.crop_margin = config.get('crop_margin', 0.25)
+        self.process_every_n_frames = max(1, config.get('process_every_n_frames', 2))
+        self.metrics_interval = config.get('pipeline_metrics_interval', 30.0)
+        self.config = config
+        
+        queue_size = config.get('pipeline_queue_size', 4)
+        detection_method = config.get('detection_method', 'dnn')
+        detection_confidence = config.get('detection_confidence', 0.5)
+        nms_threshold = config.get('detection_nms_threshold', 0.0)
+        
+        # Detection micro-batches frames (from all cameras) into one DNN
+        # forward pass, waiting at most detect_batch_timeout_ms for a batch
+        self.detect_stage = Stage(
+            'detect', self._detect,
+            workers=config.get('detect_workers', 2),
+            queue_size=queue_size,
+            drop_policy=config.get('pipeline_drop_policy', 'drop_oldest'),
+            worker_init=lambda: FaceDetector(detection_method, detection_confidence, nms_threshold),
+            batch_size=config.get('detect_batch_size', 4),
+            batch_timeout=config.get('detect_batch_timeout_ms', 10) / 1000.0
+        )
+        if self.encoding_mode not in ('crop', 'frame'):
+            raise ValueError(f"Unknown encoding mode: {self.encoding_mode}")
+        
+        # In crop mode the face chips of all queued frames form one batch
+        self.encode_stage = Stage(
+            'encode', self._encode,
+            workers=config.get('encode_workers', 2),
+            queue_size=queue_size,
+            worker_init=FaceEncoder,
+            batch_size=config.get('encode_batch_size', 4) if self.encoding_mode == 'crop' else 1
+        )
+        # Matching takes whatever is already queued as one gallery product
+        self.match_stage = Stage(
+            'match', self._match,
+            workers=1,
+            queue_size=queue_size,
+            batch_size=queue_size
+        )
+        self.stages = [self.detect_stage, self.encode_stage, self.match_stage]
+        
+        self.output = ReorderBuffer(capacity=queue_size * 2)
+        
+        # Wire the stages together
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.on_output = next_stage.put
+        self.match_stage.on_output = self.output.complete
+        for stage in self.stages:
+            stage.on_drop = self.output.skip
+        self.detect_stage.on_drop = self._drop_before_detection
+        
+        self.frame_readers: Dict[Hashable, FrameReader] = {}
+        self.capture_thread: Optional[threading.Thread] = None
+        self.running = False
+        self.submitted: Dict[Hashable, int] = {}
+        self.process_every: Dict[Hashable, int] = {}
+        self.last_metrics_log = time.time()
+        
+        # Motion gating per source (detection is skipped on static frames)
+        self.motion_gates: Dict[Hashable, MotionGate] = {}
+        self.faces_present: Dict[Hashable, bool] = {}
+        
+        # Face tracking per source (detection only every few processed frames)
+        self.trackers: Dict[Hashable, FaceTracker] = {}
+    
+    def start(self, frame_readers: Union[FrameReader, Dict[Hashable, FrameReader]],
+              motion_rois: Optional[Dict[Hashable, str]] = None):
+        """
+        Start the stage workers and the capture thread
+        
+        Args:
+            frame_readers: Started frame reader, or dict of source key ->
+                frame reader when several cameras share the pipeline
+            motion_rois: Optional source key -> motion region of interest
+                ("x1,y1,x2,y2", relative), overriding MOTION_ROI
+        """
+        if isinstance(frame_readers, FrameReader):
+            frame_readers = {None: frame_readers}
+        
+        if self.config.get('motion_gate', True):
+            motion_rois = motion_rois or {}
+            for source in frame_readers:
+                self.motion_gates[source] = MotionGate(
+                    threshold=self.config.get('motion_threshold', 0.005),
+                    pixel_threshold=self.config.get('motion_pixel_threshold', 25),
+                    width=self.config.get('motion_width', 160),
+                    roi=motion_rois.get(source) or self.config.get('motion_roi', '')
+                )
+        
+        if self.config.get('face_tracking', True):
+            for source in frame_readers:
+                self.trackers[source] = FaceTracker(
+                    tracker_type=self.config.get('tracker_type', 'flow'),
+                    detect_interval=self.config.get('track_detect_interval', 5),
+                    iou_threshold=self.config.get('track_iou_threshold', 0.3),
+                    max_misses=self.config.get('track_max_misses', 1),
+                    reverify_interval=self.config.get('track_reverify_interval', 2.0),
+                    vote_window=self.config.get('track_vote_window', 5),
+                    vote_min=self.config.get('track_vote_min', 3)
+                )
+        
+        # Recorded video is replayed in full: backpressure instead of dropping
+        if not all(reader.live for reader in frame_readers.values()):
+            self.detect_stage.drop_policy = 'block'
+        
+        for stage in reversed(self.stages):
+            stage.start()
+        
+        self.frame_readers = dict(frame_readers)
+        for source, reader in self.frame_readers.items():
+            self.submitted[source] = 0
+            # Readers that only decode every Nth frame already did the thinning
+            self.process_every[source] = 1 if reader.decode_every > 1 else self.process_every_n_frames
+            self.output.add_source(source)
+        
+        self.running = True
+        self.capture_thread = threading.Thread(target=self._capture_loop, name="capture", daemon=True)
+        self.capture_thread.start()
+        
+        logger.info(
+            f"Recognition pipeline started: {len(self.frame_readers)} source(s), "
+            f"{self.detect_stage.workers} detect, {self.encode_stage.workers} encode worker(s), "
+            f"drop policy '{self.detect_stage.drop_policy}'"
+        )
+    
+    def _capture_loop(self):
+        """Feed frames into the pipeline, taking one frame per source in turn"""
+        active = list(self.frame_readers.items())
+        single = len(active) == 1
+        
+        while self.running and active:
+            submitted = False
+            
+            for source, reader in list(active):
+                # A single source can block on its reader; several are polled fairly
+                frame = reader.read(timeout=1.0 if single else 0)
+                
+                if frame is None:
+                    if reader.ended:
+                        active.remove((source, reader))
+                        self.output.end(source, self.submitted[source])
+                    continue
+                
+                self.submit(source, frame)
+                submitted = True
+            
+            if not submitted and not single:
+                time.sleep(0.005)
+        
+        for source, _ in active:
+            self.output.end(source, self.submitted[source])
+    
+    def submit(self, source: Hashable, frame: Frame) -> bool:
+        """
+        Submit a frame (recognition runs on every Nth frame of each source)
+        
+        Args:
+            source: Source key
+            frame: Captured frame
+        
+        Returns:
+            True if the frame was queued, False if it was dropped
+        """
+        self.submitted[source] += 1
+        seq = self.submitted[source]
+        process = seq % self.process_every.get(source, self.process_every_n_frames) == 0
+        
+        tracker = self.trackers.get(source)
+        faces_present = self.faces_present.get(source, False) or (tracker is not None and tracker.has_tracks)
+        
+        # Skip detection on static frames unless faces are being tracked
+        gate = self.motion_gates.get(source)
+        if process and gate is not None:
+            process = gate.should_detect(frame.image, faces_present)
+        
+        item = PipelineItem(source, seq, frame, process)
+        
+        # Between full detections the tracks carry boxes and identities;
+        # unconfirmed tracks are still encoded to collect votes. A detection
+        # is claimed when scheduled, so frames captured before its result
+        # lands are tracked rather than detected again.
+        if process and tracker is not None and not tracker.claim_detection(frame.timestamp):
+            item.process = False
+            for i, (track, needs_encoding) in enumerate(tracker.track(frame.image)):
+                box = track.int_box()
+                item.face_locations.append(box)
+                item.track_ids.append(track.track_id)
+                if needs_encoding:
+                    item.encode_index.append(i)
+                else:
+                    item.recognized[track.label or UNKNOWN_LABEL] = box
+        
+        return self.detect_stage.put(item)
+    
+    def _drop_before_detection(self, item: PipelineItem):
+        """A frame dropped before detection releases its claimed detection"""
+        tracker = self.trackers.get(item.source)
+        if item.process and tracker is not None:
+            tracker.cancel_detection(item.frame.timestamp)
+        self.output.skip(item)
+    
+    def _detect(self, detector: FaceDetector, items: List[PipelineItem]):
+        """Detect stage: find face boxes, one batched forward pass per micro-batch"""
+        items = [item for item in items if item.process]
+        if not items:
+            return
+        
+        boxes = detector.detect_batch([item.frame.image for item in items])
+        for item, face_locations in zip(items, boxes):
+            item.face_locations = face_locations
+            self.faces_present[item.source] = bool(face_locations)
+            
+            tracker = self.trackers.get(item.source)
+            if tracker is None:
+                item.encode_index = list(range(len(face_locations)))
+                continue
+            
+            # Confirmed tracks keep their identity; only the rest is encoded
+            tracked = tracker.apply_detections(item.frame.image, face_locations, item.frame.timestamp)
+            for i, (track_id, needs_encoding) in enumerate(tracked):
+                item.track_ids.append(track_id)
+                if needs_encoding:
+                    item.encode_index.append(i)
+                else:
+                    item.recognized[tracker.get_label(track_id) or UNKNOWN_LABEL] = face_locations[i]
+    
+    def _encode(self, encoder: FaceEncoder, items: List[PipelineItem]):
+        """
+        Encode stage: in crop mode, encode face chips cut from the full frames
+        in one batch; in frame mode, encode each reduced-size RGB frame
+        """
+        items = [item for item in items if item.encode_index]
+        if not items:
+            return
+        
+        if self.encoding_mode == 'frame':
+            for item in items:
+                item.encodings = self._encode_item(encoder, item)
+            return
+        
+        chips = [
+            crop_face_chip(item.frame.image, item.face_locations[i], self.chip_size, self.crop_margin)
+            for item in items for i in item.encode_index
+        ]
+        encodings = iter(encoder.encode_chips(chips))
+        for item in items:
+            item.encodings = [next(encodings) for _ in item.encode_index]
+    
+    def _encode_item(self, encoder: FaceEncoder, item: PipelineItem) -> List:
+        """Encode the faces of one frame that are listed in encode_index (frame mode)"""
+        scale = self.resize_scale
+        small_frame = cv2.resize(item.frame.image, (0, 0), fx=scale, fy=scale)
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        
+        # Convert (x, y, w, h) boxes to scaled (top, right, bottom, left)
+        face_locations_rgb = [
+            (int(y * scale), int(x * scale) + int(w * scale),
+             int(y * scale) + int(h * scale), int(x * scale))
+            for (x, y, w, h) in (item.face_locations[i] for i in item.encode_index)
+        ]
+        
+        return encoder.encode(rgb_small_frame, face_locations_rgb)
+    
+    def _match(self, context, items: List[PipelineItem]):
+        """
+        Match stage: label the faces of all queued frames in one gallery pass;
+        with face tracking a match is a vote and faces show their track's
+        confirmed identity ("Unknown" until confirmed)
+        """
+        items = [item for item in items if item.encodings]
+        if not items:
+            return
+        
+        matches = iter(self.match_fn([e for item in items for e in item.encodings]))
+        for item in items:
+            tracker = self.trackers.get(item.source)
+            for i in item.encode_index[:len(item.encodings)]:
+                label = next(matches).label
+                if tracker is not None:
+                    label = tracker.add_vote(item.track_ids[i], label, item.frame.timestamp) or UNKNOWN_LABEL
+                item.recognized[label] = item.face_locations[i]
+    
+    def get(self, timeout: float = 0.1) -> Optional[PipelineItem]:
+        """
+        Take the next finished frame (capture order within each source)
+        
+        Args:
+            timeout: Seconds to wait
+        
+        Returns:
+            Pipeline item, or None if none is ready (check `finished`)
+        """
+        if self.metrics_interval > 0 and time.time() - self.last_metrics_log >= self.metrics_interval:
+            self.log_metrics()
+        
+        return self.output.get(timeout)
+    
+    @property
+    def finished(self) -> bool:
+        """True when all frame sources have ended and all frames were delivered"""
+        return self.output.finished
+    
+    def get_metrics(self, reset_peak: bool = False) -> Dict:
+        """
+        Get per-stage metrics
+        
+        Args:
+            reset_peak: Start a new peak queue depth window
+        
+        Returns:
+            Dictionary of stage name -> stage metrics, plus reorder buffer
+            and per-source capture, motion gate and tracking statistics
+        """
+        metrics = {stage.name: stage.get_metrics(reset_peak) for stage in self.stages}
+        metrics['reorder'] = {'pending': sum(len(p) for p in self.output.pending.values())}
+        metrics['capture'] = {source: reader.get_stats() for source, reader in self.frame_readers.items()}
+        metrics['motion'] = {source: gate.get_stats() for source, gate in self.motion_gates.items()}
+        metrics['tracking'] = {source: tracker.get_stats() for source, tracker in self.trackers.items()}
+        return metrics
+    
+    def log_metrics(self):
+        """Log queue depths and throughput of every stage"""
+        metrics = self.get_metrics(reset_peak=True)
+        stages = ", ".join(
+            f"{name} {m['depth']}/{m['capacity']} (peak {m['max_depth']}, "
+            f"{m['avg_ms']:.1f} ms, batch {m['avg_batch']:.1f}, {m['dropped']} dropped)"
+            for name, m in metrics.items() if name in ('detect', 'encode', 'match')
+        )
+        capture_dropped = sum(stats['dropped'] for stats in metrics['capture'].values())
+        motion_checked = sum(stats['checked'] for stats in metrics['motion'].values())
+        motion_skipped = sum(stats['skipped'] for stats in metrics['motion'].values())
+        motion = f"{motion_skipped / motion_checked:.0%}" if motion_checked else "n/a"
+        tracked = sum(stats['tracked_frames'] for stats in metrics['tracking'].values())
+        detected = sum(stats['detections'] for stats in metrics['tracking'].values())
+        tracking = f"{tracked / (tracked + detected):.0%}" if tracked + detected else "n/a"
+        logger.info(
+            f"Pipeline: {stages}; reorder {metrics['reorder']['pending']} pending; "
+            f"capture {capture_dropped} dropped; motion gate skipped {motion}; "
+            f"tracked without detection {tracking}"
+        )
+        self.last_metrics_log = time.time()
+    
+    def stop(self):
+        """Stop the capture thread and all stages"""
+        self.running = False
+        self.output.stop()
+        
+        if self.capture_thread:
+            self.capture_thread.join(timeout=2.0)
+            self.capture_thread = None
+        
+        # Stop all stages first so workers blocked on a full queue give up
+        for stage in self.stages:
+            stage.running = False
+        for stage in self.stages:
+            stage.stop()
+        
+        self.log_metrics()
@@ -9,23 +9,34 @@ This module handles:
 3. Sending exit records (POST /api/timetable/exit)
 4. Offline mode with local logging
 5. Auto-sync when backend reconnects
+
+With ASYNC_DISPATCH (default) entries and exits are queued and sent by an
+EventDispatcher on background threads, so callers in the frame loop never
+wait on the network. Queued events and the offline sync are sent in
+batches to POST /api/timetable/bulk.
 """
 
 import requests
-import json
 import time
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+from event_dispatcher import EventDispatcher
+from offline_journal import get_journal
 from utils import (
     setup_logging, 
     load_config, 
-    save_offline_entry, 
-    load_offline_entries, 
-    clear_offline_entries
+    create_http_session, 
+    to_bulk_event, 
+    bulk_supported, 
+    mark_bulk_unsupported, 
+    new_event_id
 )
 
 logger = setup_logging()
 
+# Most events the backend accepts per bulk request
+BULK_MAX_EVENTS = 500
+
 
 class BackendAPI:
     """Backend API client with authentication and offline support"""
@@ -48,14 +59,37 @@ class BackendAPI:
         self.default_camera_id = self.config.get('default_camera_id', 1)
         
         self.enable_offline_mode = self.config.get('enable_offline_mode', True)
-        self.offline_log_file = self.config.get('offline_log_file', 'logs/offline_entries.json')
+        self.offline_log_file = self.config.get('offline_log_file', 'logs/offline_entries.jsonl')
         self.sync_interval = self.config.get('sync_interval', 30)
         
+        # Keep-alive connection pool shared by all requests of this client
+        self.session = create_http_session(self.config)
+        
         self.token = None
         self.token_expiry = None
         self.is_online = False
         self.last_sync_time = time.time()
         
+        # Append-only offline log; the sync acknowledges what it delivered
+        self.journal = get_journal(self.offline_log_file, self.config)
+        self.sync_pending = False
+        
+        self.dispatcher = None
+        if self.config.get('async_dispatch', True):
+            self.dispatcher = EventDispatcher(
+                self._deliver,
+                self._save_offline,
+                can_send=lambda: bool(self.token and self.is_online),
+                workers=self.config.get('dispatch_workers', 2),
+                queue_size=self.config.get('dispatch_queue_size', 1000),
+                max_retries=self.config.get('dispatch_max_retries', 3),
+                backoff=self.config.get('dispatch_backoff', 0.5),
+                backoff_max=self.config.get('dispatch_backoff_max', 10.0),
+                batch_size=min(BULK_MAX_EVENTS, self.config.get('bulk_batch_size', 50)),
+                linger=self.config.get('bulk_linger_ms', 200) / 1000.0,
+                name='backend-events'
+            ).start()
+        
         logger.info(f"Backend API initialized: {self.api_base_url}")
     
     def login(self) -> bool:
@@ -72,7 +106,7 @@ class BackendAPI:
                 "password": self.admin_password
             }
             
-            response = requests.post(url, json=payload, timeout=5)
+            response = self.session.post(url, json=payload, timeout=5)
             
             if response.status_code == 200:
                 data = response.json()
@@ -106,7 +140,7 @@ class BackendAPI:
         """
         try:
             url = f"{self.backend_url}/health"
-            response = requests.get(url, timeout=3)
+            response = self.session.get(url, timeout=3)
             
             if response.status_code == 200:
                 data = response.json()
@@ -138,6 +172,8 @@ class BackendAPI:
         timestamp = timestamp or datetime.now().isoformat()
         
         payload = {
+            "type": "entry",
+            "eventId": new_event_id(),
             "personType": person_type,
             "personId": person_id,
             "zoneId": zone_id,
@@ -145,40 +181,11 @@ class BackendAPI:
             "entryTime": timestamp
         }
         
-        # Try to send to backend
-        if self.token and self.is_online:
-            try:
-                url = f"{self.api_base_url}/timetable/entry"
-                response = requests.post(
-                    url, 
-                    json=payload, 
-                    headers=self._get_headers(),
-                    timeout=5
-                )
-                
-                if response.status_code == 201:
-                    data = response.json()
-                    if data.get('success'):
-                        logger.info(f"✅ Entry recorded: {person_type} #{person_id} in Zone {zone_id}")
-                        return True, data.get('data')
-                
-                logger.warning(f"Entry request failed: {response.text}")
-            
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Failed to send entry: {e}")
-                self.is_online = False
-        
-        # Save offline if enabled
-        if self.enable_offline_mode:
-            payload['type'] = 'entry'
-            save_offline_entry(payload, self.offline_log_file)
-            logger.info(f"💾 Entry saved offline: {person_type} #{person_id}")
-            return True, None
-        
-        return False, None
+        return self._send_event(payload)
     
     def send_exit(self, person_type: str, person_id: int,
-                  zone_id: int = None, timestamp: str = None) -> Tuple[bool, Optional[Dict]]:
+                  zone_id: int = None, camera_id: int = None,
+                  timestamp: str = None) -> Tuple[bool, Optional[Dict]]:
         """
         Send exit record to backend
         
@@ -186,71 +193,236 @@ class BackendAPI:
             person_type: "STUDENT" or "TEACHER"
             person_id: Person ID (integer)
             zone_id: Zone ID (uses default if None)
+            camera_id: Camera ID (uses default if None)
             timestamp: ISO format timestamp (uses current time if None)
             
         Returns:
             Tuple of (success, response_data)
         """
         zone_id = zone_id or self.default_zone_id
+        camera_id = camera_id or self.default_camera_id
         timestamp = timestamp or datetime.now().isoformat()
         
         payload = {
+            "type": "exit",
+            "eventId": new_event_id(),
             "personType": person_type,
             "personId": person_id,
             "zoneId": zone_id,
+            "cameraId": camera_id,
             "exitTime": timestamp
         }
         
+        return self._send_event(payload)
+    
+    def _send_event(self, event: Dict) -> Tuple[bool, Optional[Dict]]:
+        """
+        Queue an event for the dispatcher, or send it right away without one
+        
+        Args:
+            event: Entry or exit payload with its 'type'
+            
+        Returns:
+            Tuple of (success, response_data); queued events report
+            success with no response data
+        """
+        if self.dispatcher:
+            queued = self.dispatcher.submit(event)
+            return queued or self.enable_offline_mode, None
+        
         # Try to send to backend
         if self.token and self.is_online:
-            try:
-                url = f"{self.api_base_url}/timetable/exit"
-                response = requests.post(
-                    url,
-                    json=payload,
-                    headers=self._get_headers(),
-                    timeout=5
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('success'):
-                        logger.info(f"✅ Exit recorded: {person_type} #{person_id} from Zone {zone_id}")
-                        return True, data.get('data')
-                
-                logger.warning(f"Exit request failed: {response.text}")
-            
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Failed to send exit: {e}")
-                self.is_online = False
+            success, data = self._post_event(event)
+            if success:
+                return True, data
         
         # Save offline if enabled
         if self.enable_offline_mode:
-            payload['type'] = 'exit'
-            save_offline_entry(payload, self.offline_log_file)
-            logger.info(f"💾 Exit saved offline: {person_type} #{person_id}")
+            self._save_offline(event)
             return True, None
         
         return False, None
     
-    def sync_offline_entries(self) -> Tuple[int, int]:
+    def _post_event(self, event: Dict) -> Tuple[bool, Optional[Dict]]:
+        """
+        POST one entry or exit event to the backend
+        
+        Args:
+            event: Entry or exit payload with its 'type'
+            
+        Returns:
+            Tuple of (success, response_data)
+        """
+        event_type = event.get('type')
+        person_type = event.get('personType')
+        person_id = event.get('personId')
+        zone_id = event.get('zoneId')
+        
+        if event_type == 'entry':
+            url, expected_status = f"{self.api_base_url}/timetable/entry", 201
+        elif event_type == 'exit':
+            url, expected_status = f"{self.api_base_url}/timetable/exit", 200
+        else:
+            logger.warning(f"Unknown entry type: {event_type}")
+            return False, None
+        
+        payload = to_bulk_event(event)
+        del payload['type']
+        
+        try:
+            response = self.session.post(
+                url,
+                json=payload,
+                headers=self._get_headers(),
+                timeout=5
+            )
+            
+            if response.status_code == expected_status:
+                data = response.json()
+                if data.get('success'):
+                    if event_type == 'entry':
+                        logger.info(f"✅ Entry recorded: {person_type} #{person_id} in Zone {zone_id}")
+                    else:
+                        logger.info(f"✅ Exit recorded: {person_type} #{person_id} from Zone {zone_id}")
+                    return True, data.get('data')
+            
+            logger.warning(f"{event_type.capitalize()} request failed: {response.text}")
+        
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send {event_type}: {e}")
+            self.is_online = False
+        
+        return False, None
+    
+    def _post_events(self, events: List[Dict]) -> List[bool]:
+        """
+        POST entry/exit events to the bulk endpoint in one request
+        
+        Args:
+            events: Entry or exit payloads with their 'type', in order
+            
+        Returns:
+            Per event whether it is done: recorded (now or by an earlier
+            request with the same eventId), or rejected by the backend
+            (sending it again would fail the same way)
+        """
+        if not self.bulk_supported:
+            return [self._post_event(event)[0] for event in events]
+        
+        try:
+            url = f"{self.api_base_url}/timetable/bulk"
+            response = self.session.post(
+                url,
+                json={'events': [to_bulk_event(event) for event in events]},
+                headers=self._get_headers(),
+                timeout=30
+            )
+            
+            if response.status_code == 404:
+                logger.warning("Backend has no bulk endpoint - sending events one by one")
+                mark_bulk_unsupported(self.api_base_url)
+                return [self._post_event(event)[0] for event in events]
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success'):
+                    result = data['data']
+                    for item in result['results']:
+                        if not item['success']:
+                            event = events[item['index']]
+                            logger.warning(f"Backend rejected {event.get('type')} of {event.get('personType')} "
+                                           f"#{event.get('personId')}: {item.get('message')}")
+                    
+                    logger.info(f"✅ {result['recorded']} event(s) recorded in bulk "
+                                f"({result['duplicates']} already recorded), {result['rejected']} rejected")
+                    
+                    # Matched by ID: an event without a result is sent again
+                    answered = {item.get('eventId') for item in result['results']}
+                    return [event.get('eventId') in answered for event in events]
+            
+            logger.warning(f"Bulk request failed: {response.text}")
+        
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send {len(events)} event(s): {e}")
+            self.is_online = False
+        
+        return [False] * len(events)
+    
+    @property
+    def bulk_supported(self) -> bool:
+        """False once this backend answered 404 on the bulk endpoint (events are then sent one by one)"""
+        return bulk_supported(self.api_base_url)
+    
+    def _deliver(self, events: List[Dict]) -> List[bool]:
+        """Dispatcher callback: send a batch of events"""
+        return self._post_events(events)
+    
+    def _save_offline(self, event: Dict):
+        """
+        Store an event in the offline log (dispatcher fallback)
+        
+        Args:
+            event: Entry or exit payload with its 'type'
+        """
+        if not self.enable_offline_mode:
+            logger.warning(f"Offline mode disabled - {event.get('type')} event dropped: "
+                           f"{event.get('personType')} #{event.get('personId')}")
+            return
+        
+        self.journal.append(event)
+        logger.info(f"💾 {event.get('type', 'event').capitalize()} saved offline: "
+                    f"{event.get('personType')} #{event.get('personId')}")
+    
+    def schedule_sync(self, force: bool = False):
+        """
+        Sync offline entries without blocking the caller
+        
+        With a dispatcher the sync runs on one of its workers; without one
+        it runs right away.
+        
+        Args:
+            force: Ignore the sync interval (manual sync)
+        """
+        if not self.dispatcher:
+            self.sync_offline_entries(force)
+            return
+        
+        if self.sync_pending:
+            return
+        if not force and time.time() - self.last_sync_time < self.sync_interval:
+            return
+        
+        def job():
+            try:
+                self.sync_offline_entries(force)
+            finally:
+                self.sync_pending = False
+        
+        self.sync_pending = True
+        if not self.dispatcher.run_in_background(job):
+            self.sync_pending = False
+    
+    def sync_offline_entries(self, force: bool = False) -> Tuple[int, int]:
         """
         Sync offline entries to backend
         
+        Args:
+            force: Ignore the sync interval
+            
         Returns:
             Tuple of (successful_syncs, failed_syncs)
         """
         # Check if we should sync
         current_time = time.time()
-        if current_time - self.last_sync_time < self.sync_interval:
+        if not force and current_time - self.last_sync_time < self.sync_interval:
             return 0, 0
         
         self.last_sync_time = current_time
         
-        # Load offline entries
-        offline_entries = load_offline_entries(self.offline_log_file)
+        # Load offline entries (from the acknowledged cursor on)
+        records = self.journal.read()
         
-        if not offline_entries:
+        if not records:
             return 0, 0
         
         # Check backend connection
@@ -263,54 +435,36 @@ class BackendAPI:
             if not self.login():
                 return 0, 0
         
-        logger.info(f"Syncing {len(offline_entries)} offline entries...")
+        logger.info(f"Syncing {len(records)} offline entries...")
         
-        successful = 0
-        failed = 0
-        synced_entries = []
+        known = sum(1 for _, entry in records if entry.get('type') in ('entry', 'exit'))
+        if known < len(records):
+            logger.warning(f"{len(records) - known} offline entries of unknown type dropped")
         
-        for entry in offline_entries:
-            try:
-                entry_type = entry.get('type')
-                person_type = entry.get('personType')
-                person_id = entry.get('personId')
-                zone_id = entry.get('zoneId')
-                
-                if entry_type == 'entry':
-                    success, _ = self.send_entry(
-                        person_type, person_id, zone_id,
-                        timestamp=entry.get('entryTime')
-                    )
-                elif entry_type == 'exit':
-                    success, _ = self.send_exit(
-                        person_type, person_id, zone_id,
-                        timestamp=entry.get('exitTime')
-                    )
-                else:
-                    logger.warning(f"Unknown entry type: {entry_type}")
-                    continue
-                
-                if success:
-                    successful += 1
-                    synced_entries.append(entry)
-                else:
-                    failed += 1
+        # Replayed in order, in bulk requests
+        successful = 0
+        for start in range(0, len(records), BULK_MAX_EVENTS):
+            chunk = records[start:start + BULK_MAX_EVENTS]
+            indices = [i for i, (_, entry) in enumerate(chunk) if entry.get('type') in ('entry', 'exit')]
             
-            except Exception as e:
-                logger.error(f"Error syncing entry: {e}")
-                failed += 1
-        
-        # Clear synced entries
-        if synced_entries:
-            remaining_entries = [e for e in offline_entries if e not in synced_entries]
+            done = [True] * len(chunk)
+            if indices:
+                for i, ok in zip(indices, self._post_events([chunk[i][1] for i in indices])):
+                    done[i] = ok
+            successful += sum(done[i] for i in indices)
+            
+            # The cursor moves past the delivered prefix; events after the
+            # first failure are sent again by the next sync, and the backend
+            # skips those it already has by their eventId
+            delivered = done.index(False) if not all(done) else len(done)
+            if delivered:
+                self.journal.ack(chunk[delivered - 1][0], delivered)
             
-            if remaining_entries:
-                # Save remaining entries
-                with open(self.offline_log_file, 'w') as f:
-                    json.dump(remaining_entries, f, indent=2)
-            else:
-                # Clear file if all synced
-                clear_offline_entries(self.offline_log_file)
+            # Later events may depend on this chunk (e.g. an exit on its entry)
+            if delivered < len(done):
+                break
+        
+        failed = known - successful
         
         logger.info(f"Sync complete: {successful} successful, {failed} failed")
         return successful, failed
@@ -326,8 +480,16 @@ class BackendAPI:
             'online': self.is_online,
             'authenticated': self.token is not None,
             'backend_url': self.backend_url,
-            'offline_entries': len(load_offline_entries(self.offline_log_file))
+            'offline_entries': len(self.journal),
+            'dispatcher': self.dispatcher.get_stats() if self.dispatcher else None
         }
+    
+    def close(self):
+        """Deliver or store queued events, stop the dispatcher and close connections"""
+        if self.dispatcher:
+            self.dispatcher.stop()
+        self.journal.sync()
+        self.session.close()
 
 
 # Convenience functions
@@ -5,28 +5,39 @@ Description: Send zone tracking data to backend (no attendance logging)
 
 This module handles:
 1. Authentication with backend (JWT tokens)
-2. Sending zone presence records (POST /api/timetable/zone)
+2. Sending zone presence records (POST /api/timetable/zone, in bulk via /api/timetable/bulk)
 3. Offline mode with local logging
 4. Auto-sync when backend reconnects
 
 Zone Tracking Only - No entry/exit attendance logging
+
+With ASYNC_DISPATCH (default) zone updates are queued and sent by an
+EventDispatcher on background threads, so callers in the frame loop never
+wait on the network. Queued updates and the offline sync are sent in
+batches to POST /api/timetable/bulk.
 """
 
 import requests
-import json
 import time
 from datetime import datetime
 from typing import Dict, Optional, Tuple, List
+from event_dispatcher import EventDispatcher
+from offline_journal import get_journal
 from utils import (
     setup_logging, 
     load_config, 
-    save_offline_entry, 
-    load_offline_entries, 
-    clear_offline_entries
+    create_http_session, 
+    to_bulk_event, 
+    bulk_supported, 
+    mark_bulk_unsupported, 
+    new_event_id
 )
 
 logger = setup_logging()
 
+# Most events the backend accepts per bulk request
+BULK_MAX_EVENTS = 500
+
 
 class ZoneTrackingAPI:
     """Backend API client for zone tracking with offline support"""
@@ -48,13 +59,37 @@ class ZoneTrackingAPI:
         self.default_zone_id = self.config.get('default_zone_id', 1)
         
         self.enable_offline_mode = self.config.get('enable_offline_mode', True)
-        self.offline_log_file = self.config.get('offline_log_file', 'logs/offline_zones.json')
+        # Never OFFLINE_LOG_FILE: the attendance client's sync would drop zone updates
+        self.offline_log_file = self.config.get('zone_offline_log_file', 'logs/offline_zone_updates.jsonl')
         self.sync_interval = self.config.get('sync_interval', 30)
         
+        # Keep-alive connection pool shared by all requests of this client
+        self.session = create_http_session(self.config)
+        
         self.token = None
         self.is_online = False
         self.last_sync_time = time.time()
         
+        # Append-only offline log; the sync acknowledges what it delivered
+        self.journal = get_journal(self.offline_log_file, self.config)
+        self.sync_pending = False
+        
+        self.dispatcher = None
+        if self.config.get('async_dispatch', True):
+            self.dispatcher = EventDispatcher(
+                self._deliver,
+                self._save_offline,
+                can_send=lambda: bool(self.token and self.is_online),
+                workers=self.config.get('dispatch_workers', 2),
+                queue_size=self.config.get('dispatch_queue_size', 1000),
+                max_retries=self.config.get('dispatch_max_retries', 3),
+                backoff=self.config.get('dispatch_backoff', 0.5),
+                backoff_max=self.config.get('dispatch_backoff_max', 10.0),
+                batch_size=min(BULK_MAX_EVENTS, self.config.get('bulk_batch_size', 50)),
+                linger=self.config.get('bulk_linger_ms', 200) / 1000.0,
+                name='zone-events'
+            ).start()
+        
         logger.info(f"Zone Tracking API initialized: {self.api_base_url}")
     
     def login(self) -> bool:
@@ -71,7 +106,7 @@ class ZoneTrackingAPI:
                 "password": self.admin_password
             }
             
-            response = requests.post(url, json=payload, timeout=5)
+            response = self.session.post(url, json=payload, timeout=5)
             
             if response.status_code == 200:
                 data = response.json()
@@ -105,7 +140,7 @@ class ZoneTrackingAPI:
         """
         try:
             url = f"{self.backend_url}/health"
-            response = requests.get(url, timeout=3)
+            response = self.session.get(url, timeout=3)
             
             if response.status_code == 200:
                 data = response.json()
@@ -134,62 +169,199 @@ class ZoneTrackingAPI:
         timestamp = timestamp or datetime.now().isoformat()
         
         payload = {
+            "type": "zone_update",
+            "eventId": new_event_id(),
             "personType": person_type,
             "personId": person_id,
             "zoneId": zone_id,
             "timestamp": timestamp
         }
         
+        if self.dispatcher:
+            queued = self.dispatcher.submit(payload)
+            return queued or self.enable_offline_mode, None
+        
         # Try to send to backend
         if self.token and self.is_online:
-            try:
-                url = f"{self.api_base_url}/timetable/zone"
-                response = requests.post(
-                    url, 
-                    json=payload, 
-                    headers=self._get_headers(),
-                    timeout=5
-                )
-                
-                if response.status_code in [200, 201]:
-                    data = response.json()
-                    if data.get('success'):
-                        logger.info(f"✅ Zone update: {person_type} #{person_id} in Zone {zone_id}")
-                        return True, data.get('data')
-                
-                logger.warning(f"Zone update failed: {response.text}")
-            
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Failed to send zone update: {e}")
-                self.is_online = False
+            success, data = self._post_update(payload)
+            if success:
+                return True, data
         
         # Save offline if enabled
         if self.enable_offline_mode:
-            payload['type'] = 'zone_update'
-            save_offline_entry(payload, self.offline_log_file)
-            logger.info(f"💾 Zone update saved offline: {person_type} #{person_id} → Zone {zone_id}")
+            self._save_offline(payload)
             return True, None
         
         return False, None
     
-    def sync_offline_entries(self) -> Tuple[int, int]:
+    def _post_update(self, update: Dict) -> Tuple[bool, Optional[Dict]]:
+        """
+        POST one zone update to the backend
+        
+        Args:
+            update: Zone update payload with its 'type'
+            
+        Returns:
+            Tuple of (success, response_data)
+        """
+        person_type = update.get('personType')
+        person_id = update.get('personId')
+        zone_id = update.get('zoneId')
+        payload = to_bulk_event(update)
+        del payload['type']
+        
+        try:
+            url = f"{self.api_base_url}/timetable/zone"
+            response = self.session.post(
+                url, 
+                json=payload, 
+                headers=self._get_headers(),
+                timeout=5
+            )
+            
+            if response.status_code in [200, 201]:
+                data = response.json()
+                if data.get('success'):
+                    logger.info(f"✅ Zone update: {person_type} #{person_id} in Zone {zone_id}")
+                    return True, data.get('data')
+            
+            logger.warning(f"Zone update failed: {response.text}")
+        
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send zone update: {e}")
+            self.is_online = False
+        
+        return False, None
+    
+    def _post_updates(self, updates: List[Dict]) -> List[bool]:
+        """
+        POST zone updates to the bulk endpoint in one request
+        
+        Args:
+            updates: Zone update payloads with their 'type', in order
+            
+        Returns:
+            Per update whether it is done: recorded (now or by an earlier
+            request with the same eventId), or rejected by the backend
+            (sending it again would fail the same way)
+        """
+        if not self.bulk_supported:
+            return [self._post_update(update)[0] for update in updates]
+        
+        try:
+            url = f"{self.api_base_url}/timetable/bulk"
+            response = self.session.post(
+                url,
+                json={'events': [to_bulk_event(update) for update in updates]},
+                headers=self._get_headers(),
+                timeout=30
+            )
+            
+            if response.status_code == 404:
+                logger.warning("Backend has no bulk endpoint - sending zone updates one by one")
+                mark_bulk_unsupported(self.api_base_url)
+                return [self._post_update(update)[0] for update in updates]
+            
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success'):
+                    result = data['data']
+                    for item in result['results']:
+                        if not item['success']:
+                            update = updates[item['index']]
+                            logger.warning(f"Backend rejected zone update of {update.get('personType')} "
+                                           f"#{update.get('personId')}: {item.get('message')}")
+                    
+                    logger.info(f"✅ {result['recorded']} zone update(s) recorded in bulk "
+                                f"({result['duplicates']} already recorded), {result['rejected']} rejected")
+                    
+                    # Matched by ID: an update without a result is sent again
+                    answered = {item.get('eventId') for item in result['results']}
+                    return [update.get('eventId') in answered for update in updates]
+            
+            logger.warning(f"Bulk zone update failed: {response.text}")
+        
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send {len(updates)} zone update(s): {e}")
+            self.is_online = False
+        
+        return [False] * len(updates)
+    
+    @property
+    def bulk_supported(self) -> bool:
+        """False once this backend answered 404 on the bulk endpoint (updates are then sent one by one)"""
+        return bulk_supported(self.api_base_url)
+    
+    def _deliver(self, updates: List[Dict]) -> List[bool]:
+        """Dispatcher callback: send a batch of zone updates"""
+        return self._post_updates(updates)
+    
+    def _save_offline(self, update: Dict):
+        """
+        Store a zone update in the offline log (dispatcher fallback)
+        
+        Args:
+            update: Zone update payload with its 'type'
+        """
+        if not self.enable_offline_mode:
+            logger.warning(f"Offline mode disabled - zone update dropped: "
+                           f"{update.get('personType')} #{update.get('personId')}")
+            return
+        
+        self.journal.append(update)
+        logger.info(f"💾 Zone update saved offline: {update.get('personType')} "
+                    f"#{update.get('personId')} → Zone {update.get('zoneId')}")
+    
+    def schedule_sync(self, force: bool = False):
+        """
+        Sync offline zone updates without blocking the caller
+        
+        With a dispatcher the sync runs on one of its workers; without one
+        it runs right away.
+        
+        Args:
+            force: Ignore the sync interval (manual sync)
+        """
+        if not self.dispatcher:
+            self.sync_offline_entries(force)
+            return
+        
+        if self.sync_pending:
+            return
+        if not force and time.time() - self.last_sync_time < self.sync_interval:
+            return
+        
+        def job():
+            try:
+                self.sync_offline_entries(force)
+            finally:
+                self.sync_pending = False
+        
+        self.sync_pending = True
+        if not self.dispatcher.run_in_background(job):
+            self.sync_pending = False
+    
+    def sync_offline_entries(self, force: bool = False) -> Tuple[int, int]:
         """
         Sync offline zone updates to backend
         
+        Args:
+            force: Ignore the sync interval
+            
         Returns:
             Tuple of (successful_syncs, failed_syncs)
         """
         # Check if we should sync
         current_time = time.time()
-        if current_time - self.last_sync_time < self.sync_interval:
+        if not force and current_time - self.last_sync_time < self.sync_interval:
             return 0, 0
         
         self.last_sync_time = current_time
         
-        # Load offline entries
-        offline_entries = load_offline_entries(self.offline_log_file)
+        # Load offline entries (from the acknowledged cursor on)
+        records = self.journal.read()
         
-        if not offline_entries:
+        if not records:
             return 0, 0
         
         # Check backend connection
@@ -202,44 +374,26 @@ class ZoneTrackingAPI:
             if not self.login():
                 return 0, 0
         
-        logger.info(f"Syncing {len(offline_entries)} offline zone updates...")
+        logger.info(f"Syncing {len(records)} offline zone updates...")
         
+        # Replayed in order, in bulk requests
         successful = 0
-        failed = 0
-        synced_entries = []
-        
-        for entry in offline_entries:
-            try:
-                person_type = entry.get('personType')
-                person_id = entry.get('personId')
-                zone_id = entry.get('zoneId')
-                timestamp = entry.get('timestamp')
-                
-                success, _ = self.send_zone_update(
-                    person_type, person_id, zone_id, timestamp
-                )
-                
-                if success:
-                    successful += 1
-                    synced_entries.append(entry)
-                else:
-                    failed += 1
+        for start in range(0, len(records), BULK_MAX_EVENTS):
+            chunk = records[start:start + BULK_MAX_EVENTS]
+            done = self._post_updates([update for _, update in chunk])
+            successful += sum(done)
             
-            except Exception as e:
-                logger.error(f"Error syncing entry: {e}")
-                failed += 1
-        
-        # Clear synced entries
-        if synced_entries:
-            remaining_entries = [e for e in offline_entries if e not in synced_entries]
+            # The cursor moves past the delivered prefix; updates after the
+            # first failure are sent again by the next sync, and the backend
+            # skips those it already has by their eventId
+            delivered = done.index(False) if not all(done) else len(done)
+            if delivered:
+                self.journal.ack(chunk[delivered - 1][0], delivered)
             
-            if remaining_entries:
-                # Save remaining entries
-                with open(self.offline_log_file, 'w') as f:
-                    json.dump(remaining_entries, f, indent=2)
-            else:
-                # Clear file if all synced
-                clear_offline_entries(self.offline_log_file)
+            if delivered < len(done):
+                break
+        
+        failed = len(records) - successful
         
         logger.info(f"Sync complete: {successful} successful, {failed} failed")
         return successful, failed
@@ -255,8 +409,16 @@ class ZoneTrackingAPI:
             'online': self.is_online,
             'authenticated': self.token is not None,
             'backend_url': self.backend_url,
-            'offline_entries': len(load_offline_entries(self.offline_log_file))
+            'offline_entries': len(self.journal),
+            'dispatcher': self.dispatcher.get_stats() if self.dispatcher else None
         }
+    
+    def close(self):
+        """Deliver or store queued updates, stop the dispatcher and close connections"""
+        if self.dispatcher:
+            self.dispatcher.stop()
+        self.journal.sync()
+        self.session.close()
 
 
 # Convenience functions
@@ -21,15 +21,30 @@ This script will:
 2. Detect faces in each image
 3. Generate face encodings using face_recognition library
 4. Save encodings to models/encodings.pickle
+
+Incremental enrollment (used by the backend for a single person):
+    python train_encodings.py --person-type STUDENT --person-id 5 --images a.jpg,b.jpg
 """
 
 import os
 import cv2
-import face_recognition
+import time
 import pickle
+import face_recognition
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
-from utils import setup_logging, parse_person_id, save_encodings
+from typing import List, Dict, Optional, Tuple
+from utils import (
+    setup_logging,
+    parse_person_id,
+    save_encodings,
+    load_encodings,
+    convert_encodings,
+    gallery_lock
+)
+from gallery_matcher import compute_prototypes
+from embedding_cache import EmbeddingCache
 
 logger = setup_logging()
 
@@ -52,8 +67,8 @@ def load_images_from_dataset(dataset_path: str = "dataset") -> Dict[str, List[st
     image_paths = {}
     supported_formats = {'.jpg', '.jpeg', '.png', '.bmp'}
     
-    # Iterate through person folders
-    for person_folder in dataset_path.iterdir():
+    # Iterate through person folders (sorted so training order is deterministic)
+    for person_folder in sorted(dataset_path.iterdir()):
         if not person_folder.is_dir():
             continue
         
@@ -64,7 +79,7 @@ def load_images_from_dataset(dataset_path: str = "dataset") -> Dict[str, List[st
             
             # Find all image files
             person_images = []
-            for img_file in person_folder.iterdir():
+            for img_file in sorted(person_folder.iterdir()):
                 if img_file.suffix.lower() in supported_formats:
                     person_images.append(str(img_file))
             
@@ -81,16 +96,25 @@ def load_images_from_dataset(dataset_path: str = "dataset") -> Dict[str, List[st
     return image_paths
 
 
-def extract_face_encodings(image_path: str, method: str = "hog") -> List:
+def extract_face_encodings(image_path: str, method: str = "hog",
+                           return_locations: bool = False,
+                           max_detect_size: int = 1024) -> List:
     """
     Extract face encodings from an image
     
+    Large photos are detected on a downscaled copy whose longest side is at
+    most `max_detect_size`; boxes are mapped back and each encoding is
+    computed from a crop of the full-resolution image around its box.
+    
     Args:
         image_path: Path to image file
         method: Detection method ('hog' or 'cnn')
+        return_locations: Also return face locations (top, right, bottom, left)
+        max_detect_size: Longest image side used for detection (0 = full resolution)
         
     Returns:
-        List of face encodings (128-dimensional vectors)
+        List of face encodings (128-dimensional vectors), or a tuple of
+        (face_locations, encodings) if return_locations is set
     """
     try:
         # Load image
@@ -99,36 +123,134 @@ def extract_face_encodings(image_path: str, method: str = "hog") -> List:
         # Convert RGB to BGR for OpenCV compatibility
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
-        # Detect face locations
-        face_locations = face_recognition.face_locations(rgb_image, model=method)
+        # Detect face locations on a reduced-size copy
+        height, width = rgb_image.shape[:2]
+        scale = 1.0
+        if max_detect_size and max(height, width) > max_detect_size:
+            scale = max_detect_size / max(height, width)
+            detect_image = cv2.resize(rgb_image, (0, 0), fx=scale, fy=scale,
+                                      interpolation=cv2.INTER_AREA)
+        else:
+            detect_image = rgb_image
+        
+        face_locations = face_recognition.face_locations(detect_image, model=method)
         
         if not face_locations:
             logger.warning(f"No faces detected in {image_path}")
-            return []
+            return ([], []) if return_locations else []
         
-        # Extract encodings
-        encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        if scale == 1.0:
+            # Extract encodings
+            encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        else:
+            # Map boxes back and encode from full-resolution crops
+            face_locations = [
+                (max(0, int(top / scale)), min(width, int(right / scale)),
+                 min(height, int(bottom / scale)), max(0, int(left / scale)))
+                for (top, right, bottom, left) in face_locations
+            ]
+            encodings = []
+            for (top, right, bottom, left) in face_locations:
+                margin = (bottom - top) // 2
+                y0, x0 = max(0, top - margin), max(0, left - margin)
+                crop = rgb_image[y0:min(height, bottom + margin), x0:min(width, right + margin)]
+                encodings.extend(face_recognition.face_encodings(
+                    np.ascontiguousarray(crop),
+                    [(top - y0, right - x0, bottom - y0, left - x0)]
+                ))
         
         if len(face_locations) > 1:
             logger.warning(f"Multiple faces detected in {image_path}. Using first face.")
         
-        return encodings
+        return (face_locations, encodings) if return_locations else encodings
     
     except Exception as e:
         logger.error(f"Error processing {image_path}: {e}")
-        return []
+        return ([], []) if return_locations else []
+
+
+def _encode_image(job: Tuple[str, str, int]) -> Tuple[str, Optional[Tuple], Optional[np.ndarray]]:
+    """
+    Encode the first face of one image (process pool work unit)
+    
+    Args:
+        job: Tuple of (image_path, detection_method, max_detect_size)
+        
+    Returns:
+        Tuple of (image_path, face box or None, encoding or None)
+    """
+    img_path, method, max_detect_size = job
+    locations, encodings = extract_face_encodings(img_path, method=method, return_locations=True,
+                                                  max_detect_size=max_detect_size)
+    if not encodings:
+        return img_path, None, None
+    return img_path, tuple(locations[0]), encodings[0]
+
+
+def _load_partial(partial_path: str) -> Dict[str, Optional[np.ndarray]]:
+    """
+    Load results of an interrupted training run
+    
+    Args:
+        partial_path: Path to the append-only partial results file
+        
+    Returns:
+        Dictionary mapping image path to encoding (None if no face)
+    """
+    results = {}
+    if not os.path.exists(partial_path):
+        return results
+    
+    valid_size = 0
+    with open(partial_path, 'rb') as f:
+        while True:
+            try:
+                img_path, encoding = pickle.load(f)
+                results[img_path] = encoding
+                valid_size = f.tell()
+            except Exception:
+                # A truncated last record is expected after an interruption
+                break
+    
+    # Drop the truncated tail so resumed results append cleanly
+    with open(partial_path, 'r+b') as f:
+        f.truncate(valid_size)
+    
+    return results
 
 
 def train_encodings(dataset_path: str = "dataset", 
                    output_path: str = "models/encodings.pickle",
-                   detection_method: str = "hog") -> Dict:
+                   detection_method: str = "hog",
+                   max_prototypes: int = 3,
+                   workers: int = 1,
+                   chunk_size: int = 8,
+                   resume: bool = False,
+                   cache_path: Optional[str] = "models/embedding_cache.sqlite",
+                   max_detect_size: int = 1024) -> Dict:
     """
     Train face encodings from dataset
     
+    With workers > 1 images are encoded by a process pool in chunks of
+    `chunk_size`; results are consumed in dataset order, so the gallery is
+    identical to a serial run. Every result is appended to
+    '<output_path>.partial'; after an interruption, `resume` skips images
+    that were already encoded.
+    
+    With a `cache_path`, face boxes and encodings are cached by image content
+    hash, detection method and model version; only new or changed images are
+    encoded, and cache entries of deleted images are pruned.
+    
     Args:
         dataset_path: Path to dataset directory
         output_path: Path to save encodings pickle
         detection_method: Face detection method ('hog' or 'cnn')
+        max_prototypes: Maximum k-means prototypes stored per person
+        workers: Number of encoding processes
+        chunk_size: Images per work unit sent to a process
+        resume: Reuse results of an interrupted run
+        cache_path: Embedding cache database (None disables the cache)
+        max_detect_size: Longest image side used for face detection (0 = full resolution)
         
     Returns:
         Dictionary with encodings data
@@ -147,7 +269,83 @@ def train_encodings(dataset_path: str = "dataset",
     total_images = sum(len(imgs) for imgs in image_paths.values())
     logger.info(f"Found {total_images} images for {total_persons} persons")
     
-    # Storage for encodings
+    # Flat, ordered list of work items
+    jobs = [(label, img_path) for label, img_paths in image_paths.items() for img_path in img_paths]
+    
+    # Results of an interrupted run
+    partial_path = f"{output_path}.partial"
+    os.makedirs(os.path.dirname(partial_path) or '.', exist_ok=True)
+    results = _load_partial(partial_path) if resume else {}
+    if resume and results:
+        logger.info(f"Resuming: {len(results)} images already encoded")
+    elif os.path.exists(partial_path):
+        os.remove(partial_path)
+    
+    # Reuse cached embeddings of unchanged images
+    # The detection resolution changes boxes and encodings, so it is part of the key
+    cache = EmbeddingCache(cache_path, f"{detection_method}@{max_detect_size}") if cache_path else None
+    cache_keys = {}
+    if cache:
+        for _, img_path in jobs:
+            cache_keys[img_path] = cache.key_for(img_path)
+            if img_path not in results:
+                found, _, encoding = cache.get(cache_keys[img_path])
+                if found:
+                    results[img_path] = encoding
+        cache.commit()
+        logger.info(f"Embedding cache: {cache.hits} cached, {cache.misses} to encode")
+    
+    pending = [(img_path, detection_method, max_detect_size)
+               for _, img_path in jobs if img_path not in results]
+    logger.info(f"Encoding {len(pending)} images with {workers} worker(s)")
+    
+    # Encode pending images, streaming results back in dataset order
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.time()
+    try:
+        stream = (executor.map(_encode_image, pending, chunksize=chunk_size)
+                  if executor else map(_encode_image, pending))
+        
+        with open(partial_path, 'ab') as partial_file:
+            for done, (img_path, box, encoding) in enumerate(stream, 1):
+                results[img_path] = encoding
+                pickle.dump((img_path, encoding), partial_file)
+                partial_file.flush()
+                
+                if cache:
+                    cache.put(cache_keys[img_path], box, encoding)
+                    if done % 50 == 0:
+                        cache.commit()
+                
+                if encoding is None:
+                    logger.warning(f"  ⚠️  Skipping {img_path} - no face detected")
+                
+                if done % 50 == 0 or done == len(pending):
+                    elapsed = time.time() - started
+                    rate = done / elapsed if elapsed > 0 else 0.0
+                    eta = (len(pending) - done) / rate if rate > 0 else 0.0
+                    logger.info(f"  Progress: {done}/{len(pending)} images "
+                                f"({rate:.1f} img/s, ETA {eta:.0f}s)")
+    
+    except KeyboardInterrupt:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"Training interrupted: {len(results)}/{total_images} images saved to {partial_path}")
+        logger.warning("Run again with --resume to continue")
+        raise
+    
+    finally:
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if cache:
+            cache.commit()
+    
+    # Images deleted from the dataset drop out of the cache as well
+    if cache:
+        cache.prune(cache_keys.values(), cache_keys.keys())
+        cache.close()
+    
+    # Assemble gallery in dataset order
     all_encodings = []
     all_names = []
     metadata = {
@@ -157,36 +355,33 @@ def train_encodings(dataset_path: str = "dataset",
         'detection_method': detection_method
     }
     
-    # Process each person
     processed_count = 0
     for label, img_paths in image_paths.items():
-        logger.info(f"\nProcessing {label} ({len(img_paths)} images)...")
-        
-        person_encodings = []
         person_type, person_id = parse_person_id(label.lower())
+        person_count = 0
         
-        # Process each image
-        for idx, img_path in enumerate(img_paths, 1):
-            logger.info(f"  [{idx}/{len(img_paths)}] {Path(img_path).name}")
-            
-            encodings = extract_face_encodings(img_path, method=detection_method)
-            
-            if encodings:
-                # Take first encoding if multiple faces detected
-                encoding = encodings[0]
-                person_encodings.append(encoding)
+        for img_path in img_paths:
+            encoding = results.get(img_path)
+            if encoding is not None:
                 all_encodings.append(encoding)
                 all_names.append(label)
-                processed_count += 1
-            else:
-                logger.warning(f"  ⚠️  Skipping {img_path} - no face detected")
+                person_count += 1
+        
+        processed_count += person_count
         
         # Store metadata
         metadata['person_types'][label] = person_type
         metadata['person_ids'][label] = person_id
-        metadata['image_counts'][label] = len(person_encodings)
+        metadata['image_counts'][label] = person_count
         
-        logger.info(f"✅ {label}: {len(person_encodings)}/{len(img_paths)} images processed successfully")
+        logger.info(f"✅ {label}: {person_count}/{len(img_paths)} images processed successfully")
+    
+    # Per-person prototypes for two-stage matching
+    if all_encodings:
+        labels, label_ids = np.unique(all_names, return_inverse=True)
+        metadata['prototypes'] = compute_prototypes(
+            all_encodings, label_ids, labels.tolist(), max_prototypes=max_prototypes
+        )
     
     # Create encodings data structure
     encodings_data = {
@@ -195,8 +390,12 @@ def train_encodings(dataset_path: str = "dataset",
         'metadata': metadata
     }
     
-    # Save encodings
-    save_encodings(encodings_data, output_path)
+    # Save encodings (locked so a concurrent enrollment is not lost or torn)
+    with gallery_lock(output_path):
+        save_encodings(encodings_data, output_path)
+    
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
     
     logger.info(f"\n{'='*60}")
     logger.info(f"✅ Training Complete!")
@@ -204,18 +403,117 @@ def train_encodings(dataset_path: str = "dataset",
     logger.info(f"Total persons: {total_persons}")
     logger.info(f"Total images processed: {processed_count}/{total_images}")
     logger.info(f"Total encodings: {len(all_encodings)}")
+    logger.info(f"Encoding time: {time.time() - started:.1f}s with {workers} worker(s)")
     logger.info(f"Encodings saved to: {output_path}")
     logger.info(f"{'='*60}\n")
     
     return encodings_data
 
 
+def enroll_person(person_type: str, person_id: int, image_paths: List[str],
+                  output_path: str = "models/encodings.pickle",
+                  detection_method: str = "hog",
+                  replace: bool = True,
+                  max_prototypes: int = 3,
+                  max_detect_size: int = 1024) -> Dict:
+    """
+    Incrementally enroll one person into an existing gallery
+    
+    Only the supplied images are encoded. The person's rows are replaced
+    (or appended to) in the gallery, which is then written atomically, so
+    running recognition processes can hot-reload it.
+    
+    Args:
+        person_type: "STUDENT" or "TEACHER"
+        person_id: Person ID from database
+        image_paths: Images of this person
+        output_path: Gallery file to update (pickle or .gallery)
+        detection_method: Face detection method ('hog' or 'cnn')
+        replace: Replace the person's existing encodings instead of appending
+        max_prototypes: Maximum k-means prototypes stored for the person
+        max_detect_size: Longest image side used for face detection (0 = full resolution)
+        
+    Returns:
+        Dictionary with enrollment summary
+    """
+    person_type, person_id = parse_person_id(f"{person_type}_{person_id}")
+    label = f"{person_type}_{person_id}"
+    
+    logger.info(f"Enrolling {label} from {len(image_paths)} images ({'replace' if replace else 'append'})")
+    
+    # Encode only the supplied images
+    new_encodings = []
+    for idx, img_path in enumerate(image_paths, 1):
+        logger.info(f"  [{idx}/{len(image_paths)}] {Path(img_path).name}")
+        
+        encodings = extract_face_encodings(img_path, method=detection_method,
+                                           max_detect_size=max_detect_size)
+        
+        if encodings:
+            new_encodings.append(encodings[0])
+        else:
+            logger.warning(f"  ⚠️  Skipping {img_path} - no face detected")
+    
+    if not new_encodings:
+        raise ValueError(f"No faces detected in the images supplied for {label}")
+    
+    # Merge into the existing gallery (locked against concurrent enrollments)
+    with gallery_lock(output_path):
+        existing = load_encodings(output_path) if os.path.exists(output_path) else None
+        
+        if existing and len(existing['names']) > 0:
+            names = np.asarray(existing['names'], dtype=object)
+            encodings = np.asarray(existing['encodings'])
+            metadata = dict(existing.get('metadata', {}))
+        
+            keep = names != label if replace else np.ones(len(names), dtype=bool)
+            names = list(names[keep])
+            encodings = list(encodings[keep])
+        else:
+            names, encodings = [], []
+            metadata = {'detection_method': detection_method}
+        
+        encodings.extend(new_encodings)
+        names.extend([label] * len(new_encodings))
+        
+        for key in ('person_types', 'person_ids', 'image_counts'):
+            metadata[key] = dict(metadata.get(key, {}))
+        metadata['person_types'][label] = person_type
+        metadata['person_ids'][label] = person_id
+        metadata['image_counts'][label] = names.count(label)
+        
+        # Only this person's prototypes change
+        person_encodings = [enc for enc, name in zip(encodings, names) if name == label]
+        metadata['prototypes'] = dict(metadata.get('prototypes', {}))
+        metadata['prototypes'].update(compute_prototypes(
+            person_encodings, np.zeros(len(person_encodings), dtype=np.int32), [label],
+            max_prototypes=max_prototypes
+        ))
+        
+        # Labels whose rows are all gone keep no metadata or prototypes
+        present = set(names)
+        for key in ('person_types', 'person_ids', 'image_counts', 'prototypes'):
+            metadata[key] = {name: value for name, value in metadata[key].items() if name in present}
+        
+        save_encodings({'encodings': encodings, 'names': names, 'metadata': metadata}, output_path)
+    
+    logger.info(f"✅ {label}: {len(new_encodings)}/{len(image_paths)} images enrolled "
+                f"({metadata['image_counts'][label]} encodings, gallery size {len(names)})")
+    
+    return {
+        'label': label,
+        'encoded': len(new_encodings),
+        'images': len(image_paths),
+        'gallery_size': len(names)
+    }
+
+
 def validate_encodings(encodings_path: str = "models/encodings.pickle"):
     """
     Validate saved encodings file
     
     Args:
-        encodings_path: Path to encodings pickle file
+        encodings_path: Path to encodings pickle or .gallery file
     """
     logger.info("Validating encodings file...")
     
@@ -224,8 +522,7 @@ def validate_encodings(encodings_path: str = "models/encodings.pickle"):
         return False
     
     try:
-        with open(encodings_path, 'rb') as f:
-            data = pickle.load(f)
+        data = load_encodings(encodings_path)
         
         required_keys = ['encodings', 'names', 'metadata']
         for key in required_keys:
@@ -272,17 +569,80 @@ if __name__ == "__main__":
                        help='Path to save encodings (default: models/encodings.pickle)')
     parser.add_argument('--method', type=str, default='hog', choices=['hog', 'cnn'],
                        help='Face detection method: hog (faster) or cnn (more accurate)')
+    parser.add_argument('--prototypes', type=int, default=3,
+                       help='Maximum k-means prototypes per person for two-stage matching (default: 3)')
+    parser.add_argument('--max-detect-size', type=int, default=1024,
+                       help='Longest image side used for face detection, 0 = full resolution (default: 1024)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Number of encoding processes (default: 1)')
+    parser.add_argument('--chunk-size', type=int, default=8,
+                       help='Images per work unit sent to a process (default: 8)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted training run from its partial results')
+    parser.add_argument('--cache', type=str, default='models/embedding_cache.sqlite',
+                       help='Embedding cache database (default: models/embedding_cache.sqlite)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Encode every image without using the embedding cache')
     parser.add_argument('--validate', action='store_true',
                        help='Validate encodings file after training')
+    parser.add_argument('--person-type', type=str, choices=['STUDENT', 'TEACHER'],
+                       help='Incremental enrollment: person type of the supplied images')
+    parser.add_argument('--person-id', type=int,
+                       help='Incremental enrollment: person ID of the supplied images')
+    parser.add_argument('--images', type=str,
+                       help='Incremental enrollment: comma-separated image paths')
+    parser.add_argument('--append', action='store_true',
+                       help='Incremental enrollment: keep the person\'s existing encodings')
+    parser.add_argument('--convert', type=str, default=None, metavar='SOURCE',
+                       help='Convert an existing encodings file to --output instead of training '
+                            '(use a .gallery output for the memory-mapped binary format)')
     
     args = parser.parse_args()
     
+    if args.convert:
+        try:
+            convert_encodings(args.convert, args.output)
+            if args.validate:
+                validate_encodings(args.output)
+            print(f"\n✅ Converted {args.convert} -> {args.output}")
+        except Exception as e:
+            logger.error(f"❌ Conversion failed: {e}")
+            exit(1)
+        exit(0)
+    
+    if args.person_type or args.person_id is not None or args.images:
+        if not (args.person_type and args.person_id is not None and args.images):
+            parser.error("--person-type, --person-id and --images must be used together")
+        
+        try:
+            summary = enroll_person(
+                person_type=args.person_type,
+                person_id=args.person_id,
+                image_paths=[p for p in args.images.split(',') if p],
+                output_path=args.output,
+                detection_method=args.method,
+                replace=not args.append,
+                max_prototypes=args.prototypes,
+                max_detect_size=args.max_detect_size
+            )
+            print(f"\n✅ Enrolled {summary['label']}: {summary['encoded']}/{summary['images']} images")
+        except Exception as e:
+            logger.error(f"❌ Enrollment failed: {e}")
+            exit(1)
+        exit(0)
+    
     try:
         # Train encodings
         encodings_data = train_encodings(
             dataset_path=args.dataset,
             output_path=args.output,
-            detection_method=args.method
+            detection_method=args.method,
+            max_prototypes=args.prototypes,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            resume=args.resume,
+            cache_path=None if args.no_cache else args.cache,
+            max_detect_size=args.max_detect_size
         )
         
         # Validate if requested
@@ -293,6 +653,8 @@ if __name__ == "__main__":
         print("\n✅ Training completed successfully!")
         print(f"You can now run live_recognition.py to start face recognition.")
     
+    except KeyboardInterrupt:
+        exit(130)
     except Exception as e:
         logger.error(f"❌ Training failed: {e}")
         exit(1)
@@ -9,8 +9,15 @@ import cv2
 import json
 import logging
 import pickle
+import tempfile
+import time
+import uuid
 import numpy as np
-from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from typing import Dict, List, Tuple, Optional
 from pathlib import Path
 
@@ -39,14 +46,23 @@ class FaceDetector:
     2. DNN (Deep Neural Network) - Slower but more accurate
     """
     
-    def __init__(self, method: str = "dnn"):
+    def __init__(self, method: str = "dnn", confidence_threshold: float = 0.5,
+                 nms_threshold: float = 0.0):
         """
         Initialize face detector
         
         Args:
             method: Detection method ('haar' or 'dnn')
+            confidence_threshold: Minimum DNN detection confidence
+            nms_threshold: IoU above which overlapping DNN boxes are
+                suppressed (0 = no NMS)
         """
         self.method = method.lower()
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        
+        # Reused output buffer for DNN box post-processing
+        self.box_buffer = np.empty((200, 4), dtype=np.int32)
         
         if self.method == "haar":
             self._init_haar()
@@ -115,13 +131,13 @@ class FaceDetector:
         )
         return faces.tolist() if len(faces) > 0 else []
     
-    def detect_faces_dnn(self, frame: np.ndarray, confidence_threshold: float = 0.5) -> List[Tuple[int, int, int, int]]:
+    def detect_faces_dnn(self, frame: np.ndarray, confidence_threshold: float = None) -> List[Tuple[int, int, int, int]]:
         """
         Detect faces using DNN
         
         Args:
             frame: Input image (BGR)
-            confidence_threshold: Minimum confidence for detection
+            confidence_threshold: Minimum confidence for detection (detector default if None)
             
         Returns:
             List of face bounding boxes (x, y, w, h)
@@ -140,24 +156,69 @@ class FaceDetector:
         self.net.setInput(blob)
         detections = self.net.forward()
         
-        faces = []
-        for i in range(detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
+        return self._dnn_boxes(detections[0, 0], w, h, confidence_threshold)
+    
+    def detect_faces_dnn_batch(self, frames: List[np.ndarray],
+                               confidence_threshold: float = None) -> List[List[Tuple[int, int, int, int]]]:
+        """
+        Detect faces in several frames with one DNN forward pass
+        
+        Args:
+            frames: Input images (BGR), any sizes
+            confidence_threshold: Minimum confidence for detection (detector default if None)
             
-            if confidence > confidence_threshold:
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (x1, y1, x2, y2) = box.astype("int")
-                
-                # Convert to (x, y, w, h) format
-                x = max(0, x1)
-                y = max(0, y1)
-                width = min(w - x, x2 - x1)
-                height = min(h - y, y2 - y1)
-                
-                if width > 0 and height > 0:
-                    faces.append((x, y, width, height))
-        
-        return faces
+        Returns:
+            List of face bounding boxes (x, y, w, h) per frame
+        """
+        if not frames:
+            return []
+        
+        # Prepare one blob of N 300x300 images
+        blob = cv2.dnn.blobFromImages(
+            [cv2.resize(frame, (300, 300)) for frame in frames],
+            1.0,
+            (300, 300),
+            (104.0, 177.0, 123.0)
+        )
+        
+        # Pass through network
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        
+        # Column 0 holds the index of the image each detection belongs to
+        image_ids = detections[:, 0].astype(int)
+        
+        results = []
+        for i, frame in enumerate(frames):
+            (h, w) = frame.shape[:2]
+            results.append(self._dnn_boxes(detections[image_ids == i], w, h, confidence_threshold))
+        
+        return results
+    
+    def _dnn_boxes(self, detections: np.ndarray, w: int, h: int,
+                   confidence_threshold: float = None) -> List[Tuple[int, int, int, int]]:
+        """
+        Convert SSD detections of one image to pixel boxes
+        
+        Args:
+            detections: Detection rows [image_id, label, confidence, x1, y1, x2, y2]
+            w: Image width
+            h: Image height
+            confidence_threshold: Minimum confidence (detector default if None)
+            
+        Returns:
+            List of face bounding boxes (x, y, w, h)
+        """
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        
+        if self.box_buffer.shape[0] < detections.shape[0]:
+            self.box_buffer = np.empty((detections.shape[0], 4), dtype=np.int32)
+        
+        boxes = dnn_detections_to_boxes(
+            detections, w, h, confidence_threshold, self.nms_threshold, out=self.box_buffer
+        )
+        return [tuple(box) for box in boxes.tolist()]
     
     def detect(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
@@ -173,6 +234,193 @@ class FaceDetector:
             return self.detect_faces_haar(frame)
         else:
             return self.detect_faces_dnn(frame)
+    
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Tuple[int, int, int, int]]]:
+        """
+        Detect faces in several frames (one forward pass with the DNN method)
+        
+        Args:
+            frames: Input images (BGR), e.g. from several cameras
+            
+        Returns:
+            List of face bounding boxes (x, y, w, h) per frame
+        """
+        if self.method == "haar":
+            return [self.detect_faces_haar(frame) for frame in frames]
+        else:
+            return self.detect_faces_dnn_batch(frames)
+
+
+def dnn_detections_to_boxes(detections: np.ndarray, w: int, h: int,
+                            confidence_threshold: float = 0.5,
+                            nms_threshold: float = 0.0,
+                            out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Threshold, scale and clip SSD detections of one image in one pass
+    
+    Args:
+        detections: Detection rows [image_id, label, confidence, x1, y1, x2, y2]
+            with coordinates relative to the image size
+        w: Image width
+        h: Image height
+        confidence_threshold: Minimum confidence for detection
+        nms_threshold: IoU above which overlapping boxes are suppressed (0 = no NMS)
+        out: Optional int32 buffer of shape (>= len(detections), 4) to write into
+        
+    Returns:
+        int32 array of (x, y, w, h) rows, in detection order (a view of `out` if given)
+    """
+    detections = detections.reshape(-1, 7)
+    confident = detections[detections[:, 2] > confidence_threshold]
+    
+    # Same truncation as astype("int") on the scaled corners
+    corners = (confident[:, 3:7] * np.array([w, h, w, h], dtype=np.float64)).astype(np.int64)
+    x = np.maximum(corners[:, 0], 0)
+    y = np.maximum(corners[:, 1], 0)
+    width = np.minimum(w - x, corners[:, 2] - corners[:, 0])
+    height = np.minimum(h - y, corners[:, 3] - corners[:, 1])
+    
+    valid = (width > 0) & (height > 0)
+    x, y, width, height = x[valid], y[valid], width[valid], height[valid]
+    
+    if nms_threshold > 0 and len(x) > 1:
+        keep = cv2.dnn.NMSBoxes(
+            np.stack([x, y, width, height], axis=1).tolist(),
+            confident[valid, 2].tolist(),
+            confidence_threshold,
+            nms_threshold
+        )
+        keep = np.sort(np.asarray(keep, dtype=np.int64).reshape(-1))
+        x, y, width, height = x[keep], y[keep], width[keep], height[keep]
+    
+    n = len(x)
+    boxes = out[:n] if out is not None else np.empty((n, 4), dtype=np.int32)
+    boxes[:, 0] = x
+    boxes[:, 1] = y
+    boxes[:, 2] = width
+    boxes[:, 3] = height
+    return boxes
+
+
+# Face Encoding
+class FaceEncoder:
+    """
+    dlib face encoder with its own model instances
+    
+    Equivalent to face_recognition.face_encodings, but the shape predictor
+    and the ResNet are not shared module globals, so each worker thread can
+    hold its own encoder and run concurrently.
+    """
+    
+    def __init__(self, num_jitters: int = 1):
+        """
+        Initialize face encoder
+        
+        Args:
+            num_jitters: Re-samples per face (higher = slower, slightly more accurate)
+        """
+        import dlib
+        import face_recognition_models
+        
+        self.dlib = dlib
+        self.num_jitters = num_jitters
+        self.pose_predictor = dlib.shape_predictor(
+            face_recognition_models.pose_predictor_model_location()
+        )
+        self.face_encoder = dlib.face_recognition_model_v1(
+            face_recognition_models.face_recognition_model_location()
+        )
+    
+    def encode(self, rgb_image: np.ndarray,
+               face_locations: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """
+        Compute face encodings
+        
+        Args:
+            rgb_image: Input image (RGB)
+            face_locations: Face boxes (top, right, bottom, left)
+        
+        Returns:
+            List of 128-dimensional encodings, one per face location
+        """
+        encodings = []
+        for (top, right, bottom, left) in face_locations:
+            landmarks = self.pose_predictor(rgb_image, self.dlib.rectangle(left, top, right, bottom))
+            encodings.append(np.array(
+                self.face_encoder.compute_face_descriptor(rgb_image, landmarks, self.num_jitters)
+            ))
+        return encodings
+    
+    def encode_chips(self, chips: List[Tuple[np.ndarray, Tuple[int, int, int, int]]]) -> List[np.ndarray]:
+        """
+        Compute face encodings for face chips in one batched ResNet call
+        
+        Args:
+            chips: (rgb_chip, (top, right, bottom, left)) pairs as returned
+                by crop_face_chip
+        
+        Returns:
+            List of 128-dimensional encodings, one per chip
+        """
+        if not chips:
+            return []
+        
+        # Landmarks per chip, then the aligned 150x150 chips dlib would cut
+        # itself (same 0.25 padding as compute_face_descriptor) in one batch
+        aligned = []
+        for chip, (top, right, bottom, left) in chips:
+            landmarks = self.pose_predictor(chip, self.dlib.rectangle(left, top, right, bottom))
+            aligned.append(self.dlib.get_face_chip(chip, landmarks, size=150, padding=0.25))
+        
+        descriptors = self.face_encoder.compute_face_descriptor(aligned, self.num_jitters)
+        return [np.array(descriptor) for descriptor in descriptors]
+
+
+def crop_face_chip(image: np.ndarray, box: Tuple[int, int, int, int], chip_size: int = 150,
+                   margin: float = 0.25) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+    """
+    Cut a face with margin from the full-resolution frame and resize it to a fixed chip
+    
+    Only the face region is resized and colour-converted, so the cost per face
+    does not depend on the frame size, and small faces keep enough pixels
+    for the landmark model.
+    
+    Args:
+        image: Input image (BGR)
+        box: Face box (x, y, w, h) in image coordinates
+        chip_size: Side length of the square chip
+        margin: Margin around the box as a fraction of its size
+    
+    Returns:
+        Tuple (rgb_chip, (top, right, bottom, left)) with the face box in chip coordinates
+    """
+    x, y, w, h = box
+    img_h, img_w = image.shape[:2]
+    
+    # Square crop around the box centre; parts outside the frame are padded
+    # black so the face keeps its aspect ratio
+    side = max(1, int(max(w, h) * (1 + 2 * margin)))
+    x1 = int(x + w / 2 - side / 2)
+    y1 = int(y + h / 2 - side / 2)
+    crop = image[max(0, y1):max(0, y1 + side), max(0, x1):max(0, x1 + side)]
+    
+    pad_top, pad_left = max(0, -y1), max(0, -x1)
+    pad_bottom = side - pad_top - crop.shape[0]
+    pad_right = side - pad_left - crop.shape[1]
+    if pad_top or pad_left or pad_bottom or pad_right:
+        crop = cv2.copyMakeBorder(crop, pad_top, pad_bottom, pad_left, pad_right, cv2.BORDER_CONSTANT)
+    
+    scale = chip_size / side
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    chip = cv2.cvtColor(cv2.resize(crop, (chip_size, chip_size), interpolation=interpolation),
+                        cv2.COLOR_BGR2RGB)
+    
+    top = max(0, int((y - y1) * scale))
+    left = max(0, int((x - x1) * scale))
+    bottom = min(chip_size - 1, int((y + h - y1) * scale))
+    right = min(chip_size - 1, int((x + w - x1) * scale))
+    
+    return chip, (top, right, bottom, left)
 
 
 # Configuration Loader
@@ -200,25 +448,89 @@ def load_config(env_file: str = ".env") -> Dict:
         # Recognition
         'recognition_tolerance': 0.6,
         'detection_method': 'dnn',
+        'detection_confidence': 0.5,   # Minimum DNN face detection confidence
+        'detection_nms_threshold': 0.0,  # IoU for suppressing overlapping DNN boxes (0 = off)
         'model_path': 'models/encodings.pickle',
         
+        # Gallery matching
+        'matcher_index': 'brute',      # brute, ivf or prototype
+        'ann_nlist': 0,                # IVF cells (0 = sqrt of gallery size)
+        'ann_nprobe': 8,               # Cells searched per face (higher = better recall)
+        'prototype_top_k': 5,          # Identities compared exactly by the prototype matcher
+        'ann_min_gallery_size': 2000,  # Below this size brute force is always used
+        'ann_exact_fallback': True,    # Full scan for faces the index could not match
+        'gallery_reload_interval': 5.0,  # Seconds between gallery file checks (0 = no hot reload)
+        
         # Camera
         'camera_source': 0,
         'camera_width': 640,
         'camera_height': 480,
         'camera_fps': 30,
+        'capture_buffer_size': 1,      # Frames buffered by the capture thread (newest is processed)
         
         # Performance
         'process_every_n_frames': 2,
-        'resize_scale': 0.25,
+        'resize_scale': 0.25,          # Frame scale for 'frame' encoding mode
+        'encoding_mode': 'crop',       # crop (face chips from the full frame) or frame (downscaled frame)
+        'chip_size': 150,              # Side of the square face chip in crop mode
+        'crop_margin': 0.25,           # Margin around the face box in crop mode (fraction of box size)
+        'encode_batch_size': 4,        # Frames whose face chips are encoded together
+        'detect_workers': 2,           # Face detection threads (one detector each)
+        'detect_batch_size': 4,        # Frames per batched DNN forward pass
+        'detect_batch_timeout_ms': 10, # Max wait for a detection batch to fill
+        'encode_workers': 2,           # Face encoding threads (one dlib model each)
+        'pipeline_queue_size': 4,      # Frames queued before each pipeline stage
+        'pipeline_drop_policy': 'drop_oldest',  # Full detect queue: drop_oldest, drop_newest or block
+        'pipeline_metrics_interval': 30.0,      # Seconds between queue-depth log lines (0 = off)
+        
+        # Headless mode (no window; signals instead of keys)
+        'headless': False,
+        'preview_file': '',            # Annotated JPEG snapshot in headless mode (empty = off)
+        'preview_interval': 2.0,       # Seconds between preview snapshots
+        
+        # Motion gate (skip detection on static frames)
+        'motion_gate': True,
+        'motion_threshold': 0.005,     # Share of ROI pixels that must change
+        'motion_pixel_threshold': 25,  # Gray-level change for a pixel to count
+        'motion_width': 160,           # Width of the downscaled analysis image
+        'motion_roi': '',              # Relative "x1,y1,x2,y2" region, empty = whole frame
+        
+        # Face tracking (full detection only every few processed frames)
+        'face_tracking': True,
+        'tracker_type': 'flow',        # none, flow (optical flow), kcf or csrt (opencv-contrib)
+        'track_detect_interval': 5,    # Processed frames per full detection
+        'track_iou_threshold': 0.3,    # Minimum IoU to match a detection to a track
+        'track_max_misses': 1,         # Detections a track may miss before it is dropped
+        'track_reverify_interval': 2.0,  # Seconds between re-checks of a confirmed identity
+        'track_vote_window': 5,        # Recent matches considered per track (n)
+        'track_vote_min': 3,           # Matching votes needed to confirm an identity (k)
         
         # Entry/Exit
         'disappear_threshold': 3.0,
         'recognition_confidence': 0.6,
         
+        # Backend HTTP connections
+        'http_pool_size': 4,           # Keep-alive connections per backend client
+        'http_retries': 3,             # Transport-level retries (connection errors; GET also on 502/503/504)
+        'http_backoff': 0.3,           # urllib3 retry backoff factor in seconds
+        
+        # Backend event dispatch (background sending)
+        'async_dispatch': True,        # Queue events for background workers instead of sending in the frame loop
+        'dispatch_workers': 2,         # Concurrent backend requests
+        'dispatch_queue_size': 1000,   # Queued events before new ones go straight to the offline log
+        'dispatch_max_retries': 3,     # Retries of a failed send before it is stored offline
+        'dispatch_backoff': 0.5,       # Base retry delay in seconds (doubled per retry, jittered)
+        'dispatch_backoff_max': 10.0,  # Longest retry delay in seconds
+        'bulk_batch_size': 50,         # Most events per bulk request from live traffic
+        'bulk_linger_ms': 200,         # Wait for more events before sending a batch
+        
         # Offline
         'enable_offline_mode': True,
-        'offline_log_file': 'logs/offline_entries.json',
+        'offline_log_file': 'logs/offline_entries.jsonl',
+        'zone_offline_log_file': 'logs/offline_zone_updates.jsonl',  # Zone updates (zone tracking clients)
+        'offline_fsync_interval': 1.0,    # Longest time in seconds an offline event stays un-fsync'ed
+        'offline_fsync_batch': 100,       # Offline events per fsync
+        'offline_compact_bytes': 1048576,  # Synced journal bytes that trigger a compaction
         'sync_interval': 30,
         
         # Logging
@@ -253,17 +565,62 @@ def load_config(env_file: str = ".env") -> Dict:
 
 
 # Save and Load Encodings
+GALLERY_MAGIC = b'ISGALLRY'
+GALLERY_VERSION = 1
+GALLERY_ALIGNMENT = 64
+GALLERY_EXTENSION = '.gallery'
+
+
+@contextmanager
+def _atomic_write(filepath: str):
+    """
+    Open a unique temporary file next to filepath and rename it into place
+    
+    Concurrent writers never share a temp file, and readers never see a
+    partially written file. The temp file is removed if writing fails.
+    
+    Args:
+        filepath: Final file path
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or '.',
+                                    prefix=f".{os.path.basename(filepath)}.", suffix='.tmp')
+    try:
+        # mkstemp creates the file 0600; keep the usual permissions of the target
+        try:
+            mode = os.stat(filepath).st_mode & 0o777
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp_path, mode)
+        
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 def save_encodings(encodings_data: Dict, filepath: str = "models/encodings.pickle"):
     """
-    Save face encodings to pickle file
+    Save face encodings to pickle file (or binary gallery for .gallery paths)
     
     Args:
         encodings_data: Dictionary with 'encodings', 'names', 'metadata'
         filepath: Output file path
     """
+    if filepath.endswith(GALLERY_EXTENSION):
+        save_gallery(encodings_data, filepath)
+        return
+    
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     
-    with open(filepath, 'wb') as f:
+    # Write to a temporary file and rename so readers never see a partial pickle
+    with _atomic_write(filepath) as f:
         pickle.dump(encodings_data, f)
     
     logger.info(f"Encodings saved to {filepath}")
@@ -271,10 +628,10 @@ def save_encodings(encodings_data: Dict, filepath: str = "models/encodings.pickl
 
 def load_encodings(filepath: str = "models/encodings.pickle") -> Optional[Dict]:
     """
-    Load face encodings from pickle file
+    Load face encodings from pickle file or binary gallery
     
     Args:
-        filepath: Pickle file path
+        filepath: Pickle or .gallery file path
         
     Returns:
         Dictionary with encodings data or None if file doesn't exist
@@ -283,6 +640,12 @@ def load_encodings(filepath: str = "models/encodings.pickle") -> Optional[Dict]:
         logger.warning(f"Encodings file not found: {filepath}")
         return None
     
+    with open(filepath, 'rb') as f:
+        is_gallery = f.read(len(GALLERY_MAGIC)) == GALLERY_MAGIC
+    
+    if is_gallery:
+        return load_gallery(filepath)
+    
     with open(filepath, 'rb') as f:
         data = pickle.load(f)
     
@@ -290,43 +653,376 @@ def load_encodings(filepath: str = "models/encodings.pickle") -> Optional[Dict]:
     return data
 
 
-# Offline Log Management
-def save_offline_entry(entry_data: Dict, log_file: str = "logs/offline_entries.json"):
+def save_gallery(encodings_data: Dict, filepath: str = "models/encodings.gallery"):
     """
-    Save entry to offline log file
+    Save face encodings in the binary gallery format
+    
+    Layout (little-endian):
+        magic (8 bytes) | version (uint32) | header length (uint32) | JSON header
+        | float32 embedding matrix | int32 label ids | optional prototype sections
+    
+    Every section starts on a 64-byte boundary so it can be opened with np.memmap.
+    The JSON header holds the label table, metadata and section offsets.
     
     Args:
-        entry_data: Entry data dictionary
-        log_file: Path to offline log file
+        encodings_data: Dictionary with 'encodings', 'names', 'metadata'
+        filepath: Output file path
     """
-    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    
+    embeddings = np.ascontiguousarray(encodings_data['encodings'], dtype='<f4')
+    if 'label_ids' in encodings_data and 'labels' in encodings_data:
+        labels = list(encodings_data['labels'])
+        label_ids = np.ascontiguousarray(encodings_data['label_ids'], dtype='<i4')
+    else:
+        unique_labels, inverse = np.unique(np.asarray(encodings_data['names'], dtype=object),
+                                           return_inverse=True)
+        labels = unique_labels.tolist()
+        label_ids = inverse.astype('<i4')
+    embeddings = embeddings.reshape(len(label_ids), -1)
+    
+    metadata = dict(encodings_data.get('metadata', {}))
+    sections = {'embeddings': embeddings, 'label_ids': label_ids}
+    
+    # Prototypes are stored as a matrix plus label ids, not in the JSON header
+    prototypes = metadata.pop('prototypes', None)
+    if prototypes:
+        label_index = {label: i for i, label in enumerate(labels)}
+        proto_rows, proto_ids = [], []
+        for label, label_protos in prototypes.items():
+            if label in label_index:
+                label_protos = np.asarray(label_protos, dtype='<f4').reshape(-1, embeddings.shape[1])
+                proto_rows.append(label_protos)
+                proto_ids.extend([label_index[label]] * len(label_protos))
+        if proto_rows:
+            sections['prototypes'] = np.ascontiguousarray(np.concatenate(proto_rows), dtype='<f4')
+            sections['prototype_label_ids'] = np.asarray(proto_ids, dtype='<i4')
+    
+    def _align(offset: int) -> int:
+        return (offset + GALLERY_ALIGNMENT - 1) // GALLERY_ALIGNMENT * GALLERY_ALIGNMENT
+    
+    def _header_bytes(section_table: Dict) -> bytes:
+        header = {
+            'version': GALLERY_VERSION,
+            'count': int(len(label_ids)),
+            'dim': int(embeddings.shape[1]),
+            'labels': labels,
+            'metadata': metadata,
+            'sections': section_table
+        }
+        return json.dumps(header, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o)).encode('utf-8')
+    
+    # Offsets depend on the header length, so lay out twice with a padded header
+    prefix_len = len(GALLERY_MAGIC) + 8
+    section_table = {name: {'offset': 0, 'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+                     for name, arr in sections.items()}
+    header_len = len(_header_bytes(section_table)) + 32 * len(sections)
+    
+    offset = _align(prefix_len + header_len)
+    for name, arr in sections.items():
+        section_table[name]['offset'] = offset
+        offset = _align(offset + arr.nbytes)
+    
+    header = _header_bytes(section_table)
+    if len(header) > header_len:
+        raise ValueError("Gallery header does not fit its reserved space")
+    header = header.ljust(header_len, b' ')
+    
+    # Write to a temporary file and rename so readers never see a partial gallery
+    with _atomic_write(filepath) as f:
+        f.write(GALLERY_MAGIC)
+        f.write(np.array([GALLERY_VERSION, header_len], dtype='<u4').tobytes())
+        f.write(header)
+        for name, arr in sections.items():
+            f.seek(section_table[name]['offset'])
+            f.write(arr.tobytes())
+        f.truncate(offset)
+    
+    logger.info(f"Gallery saved to {filepath} ({len(label_ids)} encodings, {len(labels)} persons)")
+
+
+def load_gallery(filepath: str = "models/encodings.gallery", use_mmap: Optional[bool] = None) -> Dict:
+    """
+    Load face encodings from the binary gallery format
+    
+    With use_mmap the embedding matrix is a read-only np.memmap, so several
+    camera processes on one machine share the same page-cache pages.
+    
+    Windows refuses to replace a file that another process has mapped, so
+    there the gallery is read into memory by default; otherwise enrollment
+    and retraining could not update a gallery the live systems are using.
+    
+    Args:
+        filepath: Gallery file path
+        use_mmap: Memory-map sections instead of reading them into memory
+            (default: everywhere except Windows)
+        
+    Returns:
+        Dictionary with 'encodings', 'label_ids', 'labels', 'names', 'metadata'
+    """
+    with open(filepath, 'rb') as f:
+        magic = f.read(len(GALLERY_MAGIC))
+        if magic != GALLERY_MAGIC:
+            raise ValueError(f"Not a gallery file: {filepath}")
+        
+        version, header_len = np.frombuffer(f.read(8), dtype='<u4')
+        if version > GALLERY_VERSION:
+            raise ValueError(f"Unsupported gallery version {version} in {filepath}")
+        
+        header = json.loads(f.read(int(header_len)).decode('utf-8'))
+    
+    if use_mmap is None:
+        use_mmap = os.name != 'nt'
+    
+    sections = {}
+    for name, info in header['sections'].items():
+        dtype = np.dtype(info['dtype'])
+        shape = tuple(info['shape'])
+        if use_mmap and int(np.prod(shape)) > 0:
+            sections[name] = np.memmap(filepath, dtype=dtype, mode='r',
+                                       offset=info['offset'], shape=shape)
+        else:
+            with open(filepath, 'rb') as f:
+                f.seek(info['offset'])
+                sections[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    
+    labels = header['labels']
+    label_ids = sections['label_ids']
+    metadata = header.get('metadata', {})
+    
+    if 'prototypes' in sections:
+        proto_ids = np.asarray(sections['prototype_label_ids'])
+        order = np.argsort(proto_ids, kind='stable')
+        offsets = np.searchsorted(proto_ids[order], np.arange(len(labels) + 1))
+        metadata['prototypes'] = {
+            labels[i]: sections['prototypes'][order[offsets[i]:offsets[i + 1]]]
+            for i in range(len(labels)) if offsets[i + 1] > offsets[i]
+        }
+    
+    data = {
+        'encodings': sections['embeddings'],
+        'label_ids': label_ids,
+        'labels': labels,
+        'names': np.asarray(labels, dtype=object)[np.asarray(label_ids)] if labels else [],
+        'metadata': metadata
+    }
+    
+    logger.info(f"Loaded {header['count']} encodings from gallery {filepath} (version {version})")
+    return data
+
+
+@contextmanager
+def gallery_lock(filepath: str, timeout: float = 60.0, stale_after: float = 300.0):
+    """
+    Exclusive lock for read-modify-write updates of a gallery file
+    
+    Uses a '<filepath>.lock' file created with O_EXCL, which works on every
+    platform. Locks older than `stale_after` seconds are assumed abandoned.
+    
+    Args:
+        filepath: Gallery file to lock
+        timeout: Seconds to wait for the lock
+        stale_after: Age in seconds after which a lock file is broken
+    """
+    lock_path = f"{filepath}.lock"
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    deadline = time.time() + timeout
+    
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_after:
+                    logger.warning(f"Breaking stale gallery lock: {lock_path}")
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            
+            if time.time() > deadline:
+                raise TimeoutError(f"Timed out waiting for gallery lock: {lock_path}")
+            time.sleep(0.05)
     
-    # Load existing entries
-    entries = []
-    if os.path.exists(log_file):
+    try:
+        yield
+    finally:
         try:
-            with open(log_file, 'r') as f:
-                entries = json.load(f)
-        except json.JSONDecodeError:
-            entries = []
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def convert_encodings(source_path: str, output_path: str):
+    """
+    Convert an encodings file between pickle and binary gallery formats
+    
+    Args:
+        source_path: Existing encodings file (pickle or .gallery)
+        output_path: Output path; the format follows the extension
+    """
+    encodings_data = load_encodings(source_path)
+    
+    if encodings_data is None:
+        raise FileNotFoundError(f"Encodings not found at {source_path}")
+    
+    save_encodings(encodings_data, output_path)
+    logger.info(f"Converted {source_path} -> {output_path}")
+
+
+# Backend Communication
+def create_http_session(config: Dict = None) -> requests.Session:
+    """
+    Create a keep-alive HTTP session for a backend client
+    
+    Requests reuse pooled connections instead of opening a new TCP
+    connection per event. Connection failures are retried by urllib3 for
+    every method (nothing was sent yet); read errors and 502/503/504 only
+    for GET, because a replayed POST could record an event twice.
     
-    # Add timestamp if not present
-    if 'timestamp' not in entry_data:
-        entry_data['timestamp'] = datetime.now().isoformat()
+    Args:
+        config: Configuration dictionary (http_pool_size, http_retries, http_backoff)
+        
+    Returns:
+        Configured requests.Session
+    """
+    config = config or {}
+    retries = config.get('http_retries', 3)
+    
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=config.get('http_backoff', 0.3),
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False
+    )
+    
+    # Dispatcher workers, the background sync and health checks share the pool
+    pool_size = max(1, config.get('http_pool_size', 4))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry, pool_block=False)
+    
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# Offline/queued event type -> bulk endpoint event type
+BULK_EVENT_TYPES = {'entry': 'entry', 'exit': 'exit', 'zone_update': 'zone'}
+
+
+def new_event_id() -> str:
+    """
+    Generate the client-side ID of a backend event
+    
+    The backend records each ID once, so an event sent again (a retry
+    whose response was lost, a replayed offline sync) is not recorded twice.
+    
+    Returns:
+        UUID4 string
+    """
+    return str(uuid.uuid4())
+
+
+def to_utc_iso(timestamp: str) -> str:
+    """
+    Convert an ISO timestamp to the UTC 'Z' form the backend validates
+    
+    Args:
+        timestamp: ISO timestamp; without an offset it is local time
+            (as written by datetime.now().isoformat())
+        
+    Returns:
+        Timestamp like '2025-11-19T08:00:00.000Z'
+    """
+    moment = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def to_bulk_event(event: Dict) -> Dict:
+    """
+    Convert a queued or offline event to a POST /api/timetable/bulk item
+    
+    Args:
+        event: Event with 'type' ('entry', 'exit' or 'zone_update'),
+            'personType', 'personId', 'zoneId', 'eventId' and its time in
+            'entryTime', 'exitTime' or 'timestamp'
+        
+    Returns:
+        Bulk event dictionary
+    """
+    item = {
+        'type': BULK_EVENT_TYPES.get(event.get('type'), event.get('type')),
+        'personType': event.get('personType'),
+        'personId': event.get('personId'),
+    }
+    
+    # The backend rejects nulls for optional fields
+    for key in ('zoneId', 'cameraId', 'eventId'):
+        if event.get(key) is not None:
+            item[key] = event[key]
+    
+    timestamp = event.get('entryTime') or event.get('exitTime') or event.get('timestamp')
+    if timestamp:
+        item['timestamp'] = to_utc_iso(timestamp)
+    
+    return item
+
+
+# Backends (API base URLs) that answered 404 on /timetable/bulk
+_bulk_unsupported = set()
+
+
+def bulk_supported(api_base_url: str) -> bool:
+    """
+    Whether events for a backend should go to the bulk endpoint
+    
+    Shared by every client of the process, so once one client learned that
+    an older backend has no bulk endpoint no other request tries it.
+    
+    Args:
+        api_base_url: Backend API base URL
+        
+    Returns:
+        False after mark_bulk_unsupported for this URL
+    """
+    return api_base_url not in _bulk_unsupported
+
+
+def mark_bulk_unsupported(api_base_url: str):
+    """Remember that a backend has no bulk endpoint (events then go one by one)"""
+    _bulk_unsupported.add(api_base_url)
+
+
+# Offline Log Management
+# The log is an append-only journal (offline_journal.py); imported here
+# lazily because offline_journal itself uses setup_logging from this module.
+def save_offline_entry(entry_data: Dict, log_file: str = "logs/offline_entries.jsonl", config: Dict = None):
+    """
+    Append entry to offline journal
     
-    # Append new entry
-    entries.append(entry_data)
+    Args:
+        entry_data: Entry data dictionary
+        log_file: Path to offline log file
+        config: Configuration dictionary (journal fsync/compaction settings)
+    """
+    from offline_journal import get_journal
     
-    # Save back
-    with open(log_file, 'w') as f:
-        json.dump(entries, f, indent=2)
+    get_journal(log_file, config).append(entry_data)
     
     logger.info(f"Saved offline entry for person {entry_data.get('personId')}")
 
 
-def load_offline_entries(log_file: str = "logs/offline_entries.json") -> List[Dict]:
+def load_offline_entries(log_file: str = "logs/offline_entries.jsonl") -> List[Dict]:
     """
-    Load offline entries
+    Load offline entries that are not yet acknowledged
     
     Args:
         log_file: Path to offline log file
@@ -334,22 +1030,17 @@ def load_offline_entries(log_file: str = "logs/offline_entries.json") -> List[Di
     Returns:
         List of entry dictionaries
     """
-    if not os.path.exists(log_file):
-        return []
+    from offline_journal import get_journal
     
-    try:
-        with open(log_file, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        logger.error(f"Failed to parse offline log: {log_file}")
-        return []
+    return [event for _, event in get_journal(log_file).read()]
 
 
-def clear_offline_entries(log_file: str = "logs/offline_entries.json"):
+def clear_offline_entries(log_file: str = "logs/offline_entries.jsonl"):
     """Clear offline entries log file"""
-    if os.path.exists(log_file):
-        os.remove(log_file)
-        logger.info("Offline entries cleared")
+    from offline_journal import get_journal
+    
+    get_journal(log_file).clear()
+    logger.info("Offline entries cleared")
 
 
 # FPS Counter
@@ -42,4 +42,12 @@ export const SUCCESS_MESSAGES = {
   REGISTER_SUCCESS: 'Registration successful',
   ENTRY_RECORDED: 'Entry recorded successfully',
   EXIT_RECORDED: 'Exit recorded successfully',
+  ZONE_RECORDED: 'Zone presence recorded successfully',
+  EVENTS_PROCESSED: 'Events processed',
+  EVENT_ALREADY_RECORDED: 'Event already recorded',
+};
+
+export const BULK_EVENTS = {
+  MAX_EVENTS: 500, // Events per bulk request
+  TRANSACTION_TIMEOUT_MS: 30000, // One bulk request runs in one transaction
 };
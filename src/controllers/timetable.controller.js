@@ -5,14 +5,16 @@ import { HTTP_STATUS, SUCCESS_MESSAGES } from '../config/constants.js';
 
 /**
  * @route   POST /api/timetable/entry
- * @desc    Record entry event
+ * @desc    Record entry event (once per eventId)
  * @access  Private
  */
 export const recordEntry = asyncHandler(async (req, res) => {
-  const { personType, personId, zoneId, cameraId, timestamp } = req.body;
+  const { personType, personId, zoneId, cameraId, timestamp, eventId } = req.body;
   const adminId = req.user.adminId;
 
-  const entry = await timetableService.recordEntry({
+  const { record: entry, duplicate } = await timetableService.recordEvent({
+    type: 'entry',
+    eventId,
     personType,
     personId,
     zoneId,
@@ -24,21 +26,23 @@ export const recordEntry = asyncHandler(async (req, res) => {
   successResponse(
     res,
     entry,
-    SUCCESS_MESSAGES.ENTRY_RECORDED,
+    duplicate ? SUCCESS_MESSAGES.EVENT_ALREADY_RECORDED : SUCCESS_MESSAGES.ENTRY_RECORDED,
     HTTP_STATUS.CREATED
   );
 });
 
 /**
  * @route   POST /api/timetable/exit
- * @desc    Record exit event
+ * @desc    Record exit event (once per eventId)
  * @access  Private
  */
 export const recordExit = asyncHandler(async (req, res) => {
-  const { personType, personId, zoneId, timestamp } = req.body;
+  const { personType, personId, zoneId, timestamp, eventId } = req.body;
   const adminId = req.user.adminId;
 
-  const exit = await timetableService.recordExit({
+  const { record: exit, duplicate } = await timetableService.recordEvent({
+    type: 'exit',
+    eventId,
     personType,
     personId,
     zoneId,
@@ -46,7 +50,62 @@ export const recordExit = asyncHandler(async (req, res) => {
     adminId,
   });
 
-  successResponse(res, exit, SUCCESS_MESSAGES.EXIT_RECORDED);
+  successResponse(
+    res,
+    exit,
+    duplicate ? SUCCESS_MESSAGES.EVENT_ALREADY_RECORDED : SUCCESS_MESSAGES.EXIT_RECORDED
+  );
+});
+
+/**
+ * @route   POST /api/timetable/zone
+ * @desc    Record zone presence (zone tracking cameras, once per eventId)
+ * @access  Private
+ */
+export const recordZone = asyncHandler(async (req, res) => {
+  const { personType, personId, zoneId, timestamp, eventId } = req.body;
+  const adminId = req.user.adminId;
+
+  const { record: entry, duplicate } = await timetableService.recordEvent({
+    type: 'zone',
+    eventId,
+    personType,
+    personId,
+    zoneId,
+    timestamp,
+    adminId,
+  });
+
+  successResponse(
+    res,
+    entry,
+    duplicate ? SUCCESS_MESSAGES.EVENT_ALREADY_RECORDED : SUCCESS_MESSAGES.ZONE_RECORDED
+  );
+});
+
+/**
+ * @route   POST /api/timetable/bulk
+ * @desc    Record an ordered batch of entry/exit/zone events in one transaction
+ * @access  Private
+ */
+export const recordBulk = asyncHandler(async (req, res) => {
+  const { events } = req.body;
+  const adminId = req.user.adminId;
+
+  const results = await timetableService.recordBulk(events, adminId);
+  const recorded = results.filter((result) => result.success).length;
+  const duplicates = results.filter((result) => result.duplicate).length;
+
+  successResponse(
+    res,
+    {
+      recorded,
+      duplicates,
+      rejected: results.length - recorded,
+      results,
+    },
+    SUCCESS_MESSAGES.EVENTS_PROCESSED
+  );
 });
 
 /**
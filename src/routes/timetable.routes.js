@@ -2,6 +2,8 @@ import express from 'express';
 import {
   recordEntry,
   recordExit,
+  recordZone,
+  recordBulk,
   queryTimetable,
   getActivePersons,
   getAnalytics,
@@ -11,6 +13,8 @@ import { validateRequest } from '../middlewares/validateRequest.js';
 import {
   entrySchema,
   exitSchema,
+  zoneSchema,
+  bulkEventsSchema,
   queryTimetableSchema,
 } from '../validators/timetable.validator.js';
 import { authenticateToken } from '../middlewares/auth.js';
@@ -22,6 +26,8 @@ router.use(authenticateToken);
 
 router.post('/entry', validateRequest(entrySchema), recordEntry);
 router.post('/exit', validateRequest(exitSchema), recordExit);
+router.post('/zone', validateRequest(zoneSchema), recordZone);
+router.post('/bulk', validateRequest(bulkEventsSchema), recordBulk);
 router.get('/', validateRequest(queryTimetableSchema), queryTimetable);
 router.get('/active', getActivePersons);
 router.get('/analytics', getAnalytics);
@@ -0,0 +1,163 @@
+/**
+ * Pool of persistent Python enrollment workers (face-recognition/enrollment_worker.py)
+ *
+ * Each worker keeps dlib/face_recognition models loaded and receives jobs as
+ * JSON lines on stdin, replying with one JSON line per job on stdout. Jobs wait
+ * in a bounded FIFO queue until a worker is idle.
+ */
+
+import { spawn } from 'child_process';
+import { createInterface } from 'readline';
+
+export class EnrollmentWorkerPool {
+    /**
+     * @param {Object} options
+     * @param {string} options.scriptPath - Path to enrollment_worker.py
+     * @param {string} options.cwd - Working directory for the workers
+     * @param {string} [options.pythonCommand='python'] - Python executable
+     * @param {number} [options.size=1] - Number of worker processes
+     * @param {number} [options.maxQueue=50] - Maximum queued jobs before rejecting
+     * @param {number} [options.jobTimeoutMs=120000] - Per-job timeout
+     */
+    constructor({ scriptPath, cwd, pythonCommand = 'python', size = 1, maxQueue = 50, jobTimeoutMs = 120000 }) {
+        this.scriptPath = scriptPath;
+        this.cwd = cwd;
+        this.pythonCommand = pythonCommand;
+        this.size = Math.max(1, size);
+        this.maxQueue = maxQueue;
+        this.jobTimeoutMs = jobTimeoutMs;
+
+        this.workers = [];
+        this.queue = [];
+        this.nextJobId = 1;
+        this.closed = false;
+    }
+
+    /**
+     * Submit an enrollment job
+     * @param {Object} job - { personType, personId, images, replace }
+     * @returns {Promise<Object>} - Worker response { success, message, result }
+     */
+    submit(job) {
+        if (this.closed) {
+            return Promise.reject(new Error('Enrollment worker pool is shut down'));
+        }
+
+        if (this.queue.length >= this.maxQueue) {
+            return Promise.reject(new Error('Enrollment queue is full, please retry later'));
+        }
+
+        return new Promise((resolve, reject) => {
+            this.queue.push({ job: { ...job, id: String(this.nextJobId++) }, resolve, reject });
+            this.dispatch();
+        });
+    }
+
+    /**
+     * Hand queued jobs to idle workers, starting workers up to the pool size
+     */
+    dispatch() {
+        while (this.queue.length > 0) {
+            const worker = this.workers.find((w) => w.ready && !w.current);
+
+            if (!worker) {
+                // Start workers for the backlog, up to the pool size
+                const starting = this.workers.filter((w) => !w.ready).length;
+                if (this.workers.length < this.size && starting < this.queue.length) {
+                    this.startWorker();
+                }
+                return;
+            }
+
+            const entry = this.queue.shift();
+            worker.current = entry;
+            entry.timer = setTimeout(() => {
+                // A stuck worker is killed; its exit handler rejects the job
+                console.error(`Enrollment job ${entry.job.id} timed out, restarting worker`);
+                worker.process.kill();
+            }, this.jobTimeoutMs);
+
+            worker.process.stdin.write(`${JSON.stringify(entry.job)}\n`);
+        }
+    }
+
+    /**
+     * Spawn one worker process
+     */
+    startWorker() {
+        const child = spawn(this.pythonCommand, [this.scriptPath], {
+            cwd: this.cwd,
+            stdio: ['pipe', 'pipe', 'pipe'],
+        });
+        const worker = { process: child, ready: false, current: null, stderr: '' };
+        this.workers.push(worker);
+
+        createInterface({ input: child.stdout }).on('line', (line) => {
+            let message;
+            try {
+                message = JSON.parse(line);
+            } catch {
+                return;
+            }
+
+            if (message.type === 'ready') {
+                worker.ready = true;
+                this.dispatch();
+                return;
+            }
+
+            const entry = worker.current;
+            if (entry && message.id === entry.job.id) {
+                clearTimeout(entry.timer);
+                worker.current = null;
+                entry.resolve(message);
+                this.dispatch();
+            }
+        });
+
+        child.stderr.on('data', (data) => {
+            // Keep only the tail of the worker log for error reports
+            worker.stderr = (worker.stderr + data.toString()).slice(-4000);
+        });
+
+        // Writes to a worker that just died are reported through 'close'
+        child.stdin.on('error', () => {});
+
+        child.on('error', (error) => {
+            console.error('Failed to start enrollment worker:', error);
+        });
+
+        child.on('close', (code) => {
+            this.workers = this.workers.filter((w) => w !== worker);
+
+            if (worker.current) {
+                clearTimeout(worker.current.timer);
+                worker.current.reject(
+                    new Error(`Enrollment worker exited (code ${code}): ${worker.stderr || 'Unknown error'}`)
+                );
+            }
+
+            if (!worker.ready && !this.closed) {
+                // Worker died during startup: fail queued jobs instead of respawning in a loop
+                const pending = this.queue.splice(0);
+                pending.forEach((entry) =>
+                    entry.reject(new Error(`Enrollment worker failed to start: ${worker.stderr || `exit code ${code}`}`))
+                );
+                return;
+            }
+
+            if (!this.closed) {
+                this.dispatch();
+            }
+        });
+    }
+
+    /**
+     * Stop all workers and reject queued jobs
+     */
+    shutdown() {
+        this.closed = true;
+        this.queue.splice(0).forEach((entry) => entry.reject(new Error('Enrollment worker pool is shut down')));
+        this.workers.forEach((worker) => worker.process.stdin.end());
+    }
+}
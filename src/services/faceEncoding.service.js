@@ -2,11 +2,11 @@
  * Service for generating face encodings using Python face recognition scripts
  */
 
-import { spawn } from 'child_process';
 import { writeFile, mkdir, unlink } from 'fs/promises';
 import { join, dirname } from 'path';
 import { fileURLToPath } from 'url';
 import { existsSync } from 'fs';
+import { EnrollmentWorkerPool } from './enrollmentWorker.service.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -17,6 +17,15 @@ export class FaceEncodingService {
         this.faceRecognitionPath = join(__dirname, '../../face-recognition');
         this.tempImagesPath = join(this.faceRecognitionPath, 'dataset', 'temp');
         this.pythonScript = join(this.faceRecognitionPath, 'train_encodings.py');
+
+        // Warm Python workers; models load once instead of per request
+        this.workerPool = new EnrollmentWorkerPool({
+            scriptPath: join(this.faceRecognitionPath, 'enrollment_worker.py'),
+            cwd: this.faceRecognitionPath,
+            size: parseInt(process.env.ENROLLMENT_WORKERS) || 1,
+            maxQueue: parseInt(process.env.ENROLLMENT_QUEUE_LIMIT) || 50,
+            jobTimeoutMs: parseInt(process.env.ENROLLMENT_JOB_TIMEOUT_MS) || 120000,
+        });
     }
 
     /**
@@ -84,54 +93,31 @@ export class FaceEncodingService {
     }
 
     /**
-     * Call Python script to generate encodings
+     * Send an enrollment job to the persistent Python worker pool
      * @param {string} personType - 'STUDENT' or 'TEACHER'
      * @param {number} personId - Person's ID
      * @param {string[]} imagePaths - Array of image file paths
      * @returns {Promise<{success: boolean, message: string}>}
      */
-    callPythonScript(personType, personId, imagePaths) {
-        return new Promise((resolve, reject) => {
-            // For now, we'll call the train_encodings.py script
-            // This assumes the script can handle individual person encoding
-            const pythonProcess = spawn('python', [
-                this.pythonScript,
-                '--person-type', personType,
-                '--person-id', personId.toString(),
-                '--images', imagePaths.join(',')
-            ]);
-
-            let stdout = '';
-            let stderr = '';
-
-            pythonProcess.stdout.on('data', (data) => {
-                stdout += data.toString();
-            });
-
-            pythonProcess.stderr.on('data', (data) => {
-                stderr += data.toString();
-            });
-
-            pythonProcess.on('close', (code) => {
-                if (code === 0) {
-                    resolve({
-                        success: true,
-                        message: 'Face encodings generated successfully'
-                    });
-                } else {
-                    console.error('Python script error:', stderr);
-                    resolve({
-                        success: false,
-                        message: `Face encoding generation failed: ${stderr || 'Unknown error'}`
-                    });
-                }
-            });
-
-            pythonProcess.on('error', (error) => {
-                console.error('Failed to start Python process:', error);
-                reject(new Error(`Failed to start face encoding process: ${error.message}`));
-            });
+    async callPythonScript(personType, personId, imagePaths) {
+        const response = await this.workerPool.submit({
+            personType,
+            personId,
+            images: imagePaths,
         });
+
+        if (response.success) {
+            return {
+                success: true,
+                message: 'Face encodings generated successfully'
+            };
+        }
+
+        console.error('Enrollment worker error:', response.message);
+        return {
+            success: false,
+            message: `Face encoding generation failed: ${response.message || 'Unknown error'}`
+        };
     }
 
     /**
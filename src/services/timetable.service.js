@@ -1,6 +1,14 @@
 import { prisma } from '../config/database.js';
-import { PERSON_TYPES } from '../config/constants.js';
+import { PERSON_TYPES, BULK_EVENTS } from '../config/constants.js';
 import { BadRequestError, NotFoundError, ConflictError } from '../utils/errors.js';
+import { bulkEventSchema } from '../validators/timetable.validator.js';
+
+// Event type -> service method
+const EVENT_HANDLERS = {
+  entry: 'recordEntry',
+  exit: 'recordExit',
+  zone: 'recordZonePresence',
+};
 
 /**
  * Business logic for entry/exit tracking
@@ -9,6 +17,13 @@ import { BadRequestError, NotFoundError, ConflictError } from '../utils/errors.j
  * 1. Entry: Check for existing open entry (no ExitTime), prevent duplicate
  * 2. Exit: Find most recent open entry, update ExitTime
  * 3. Edge case: Exit without entry logs anomaly but still records
+ * 4. Zone presence: Moves the open entry to the reported zone
+ * 5. Bulk: Applies an ordered batch of the above in one transaction
+ * 6. Idempotency: An event with a client eventId is recorded once; sending
+ *    it again returns the first result (ProcessedEvent table)
+ *
+ * The write methods take an optional Prisma client `db` so that bulk
+ * requests can run them on a transaction client.
  */
 
 export class TimetableService {
@@ -16,11 +31,11 @@ export class TimetableService {
    * Record entry event
    * Prevents duplicate open entries for the same person
    */
-  async recordEntry({ personType, personId, zoneId, cameraId, timestamp, adminId }) {
+  async recordEntry({ personType, personId, zoneId, cameraId, timestamp, adminId }, db = prisma) {
     const entryTime = timestamp ? new Date(timestamp) : new Date();
 
     // Check for existing open entry
-    const existingOpenEntry = await this.findOpenEntry(personType, personId);
+    const existingOpenEntry = await this.findOpenEntry(personType, personId, null, db);
 
     if (existingOpenEntry) {
       throw new ConflictError(
@@ -30,11 +45,11 @@ export class TimetableService {
     }
 
     // Verify person exists
-    await this.verifyPersonExists(personType, personId);
+    await this.verifyPersonExists(personType, personId, db);
 
     // Verify zone exists
     if (zoneId) {
-      await this.verifyZoneExists(zoneId);
+      await this.verifyZoneExists(zoneId, db);
     }
 
     // Create entry record
@@ -52,7 +67,7 @@ export class TimetableService {
       data.Student_ID = personId;
     }
 
-    const entry = await prisma.timeTable.create({
+    const entry = await db.timeTable.create({
       data,
       include: {
         zone: true,
@@ -69,15 +84,15 @@ export class TimetableService {
    * Finds most recent open entry and updates ExitTime
    * If no open entry found, creates exit-only record (logs anomaly)
    */
-  async recordExit({ personType, personId, zoneId, timestamp, adminId }) {
+  async recordExit({ personType, personId, zoneId, timestamp, adminId }, db = prisma) {
     const exitTime = timestamp ? new Date(timestamp) : new Date();
 
     // Find most recent open entry
-    const openEntry = await this.findOpenEntry(personType, personId, zoneId);
+    const openEntry = await this.findOpenEntry(personType, personId, zoneId, db);
 
     if (openEntry) {
       // Update existing entry with exit time
-      const updated = await prisma.timeTable.update({
+      const updated = await db.timeTable.update({
         where: { TimeTable_ID: openEntry.TimeTable_ID },
         data: { ExitTime: exitTime },
         include: {
@@ -106,7 +121,7 @@ export class TimetableService {
       data.Student_ID = personId;
     }
 
-    const exitRecord = await prisma.timeTable.create({
+    const exitRecord = await db.timeTable.create({
       data,
       include: {
         zone: true,
@@ -118,10 +133,132 @@ export class TimetableService {
     return exitRecord;
   }
 
+  /**
+   * Record zone presence reported by zone tracking cameras
+   * Keeps an open entry in the same zone, moves an open entry in another
+   * zone (exit there, entry here) and opens an entry if there is none
+   */
+  async recordZonePresence({ personType, personId, zoneId, timestamp, adminId }, db = prisma) {
+    const seenAt = timestamp ? new Date(timestamp) : new Date();
+
+    const openEntry = await this.findOpenEntry(personType, personId, null, db);
+
+    if (openEntry && openEntry.Zone_id === zoneId) {
+      return openEntry;
+    }
+
+    if (openEntry) {
+      // Check the new zone first so a rejected move leaves the entry open
+      await this.verifyZoneExists(zoneId, db);
+
+      await db.timeTable.update({
+        where: { TimeTable_ID: openEntry.TimeTable_ID },
+        data: { ExitTime: seenAt },
+      });
+    }
+
+    return this.recordEntry({ personType, personId, zoneId, timestamp: seenAt, adminId }, db);
+  }
+
+  /**
+   * Record an entry/exit/zone event at most once per client eventId
+   * Without an eventId the event is simply recorded. With one, the
+   * TimeTable row and its ProcessedEvent are written in one transaction,
+   * and a replay (a retry whose response was lost, an offline sync sent
+   * again) returns the row recorded the first time
+   * Returns { record, duplicate }
+   */
+  async recordEvent({ type, eventId, ...event }, db = prisma) {
+    const handler = (client) => this[EVENT_HANDLERS[type]](event, client);
+
+    if (!eventId) {
+      return { record: await handler(db), duplicate: false };
+    }
+
+    if (db === prisma) {
+      return prisma.$transaction((tx) => this.recordEvent({ type, eventId, ...event }, tx));
+    }
+
+    const processed = await db.processedEvent.findUnique({
+      where: { Event_ID: eventId },
+      include: { timeTable: { include: { zone: true } } },
+    });
+
+    if (processed) {
+      return { record: processed.timeTable, duplicate: true };
+    }
+
+    const record = await handler(db);
+
+    // A concurrent request with the same eventId fails here on the primary
+    // key and rolls back, so the event is never recorded twice
+    await db.processedEvent.create({
+      data: { Event_ID: eventId, Type: type, TimeTable_ID: record.TimeTable_ID },
+    });
+
+    return { record, duplicate: false };
+  }
+
+  /**
+   * Record an ordered batch of entry/exit/zone events in one transaction
+   * Invalid or rejected events (validation, unknown person, duplicate
+   * entry) get an error result and do not stop the batch; database
+   * errors roll back the whole batch. Events whose eventId was already
+   * recorded succeed with `duplicate: true` and change nothing
+   */
+  async recordBulk(events, adminId) {
+    return prisma.$transaction(
+      async (tx) => {
+        const results = [];
+
+        // Sequential on purpose: later events depend on earlier ones
+        for (const [index, rawEvent] of events.entries()) {
+          const parsed = bulkEventSchema.safeParse(rawEvent);
+
+          if (!parsed.success) {
+            results.push({
+              index,
+              type: rawEvent.type ?? null,
+              eventId: rawEvent.eventId ?? null,
+              success: false,
+              statusCode: 422,
+              message: parsed.error.errors
+                .map((e) => `${e.path.join('.') || 'event'}: ${e.message}`)
+                .join('; '),
+            });
+            continue;
+          }
+
+          const { type, eventId = null } = parsed.data;
+
+          try {
+            const { record, duplicate } = await this.recordEvent({ ...parsed.data, adminId }, tx);
+            results.push({ index, type, eventId, success: true, duplicate, id: record?.TimeTable_ID ?? null });
+          } catch (error) {
+            if (!error.isOperational) {
+              throw error;
+            }
+            results.push({
+              index,
+              type,
+              eventId,
+              success: false,
+              statusCode: error.statusCode,
+              message: error.message,
+            });
+          }
+        }
+
+        return results;
+      },
+      { timeout: BULK_EVENTS.TRANSACTION_TIMEOUT_MS }
+    );
+  }
+
   /**
    * Find open entry (no exit time) for a person
    */
-  async findOpenEntry(personType, personId, zoneId = null) {
+  async findOpenEntry(personType, personId, zoneId = null, db = prisma) {
     const where = {
       PersonType: personType,
       ExitTime: null,
@@ -137,7 +274,7 @@ export class TimetableService {
       where.Zone_id = zoneId;
     }
 
-    const openEntry = await prisma.timeTable.findFirst({
+    const openEntry = await db.timeTable.findFirst({
       where,
       orderBy: { EntryTime: 'desc' },
     });
@@ -327,15 +464,15 @@ export class TimetableService {
   /**
    * Verify person exists
    */
-  async verifyPersonExists(personType, personId) {
+  async verifyPersonExists(personType, personId, db = prisma) {
     let person;
 
     if (personType === PERSON_TYPES.TEACHER) {
-      person = await prisma.teacher.findUnique({
+      person = await db.teacher.findUnique({
         where: { Teacher_ID: personId },
       });
     } else {
-      person = await prisma.students.findUnique({
+      person = await db.students.findUnique({
         where: { Student_ID: personId },
       });
     }
@@ -350,8 +487,8 @@ export class TimetableService {
   /**
    * Verify zone exists
    */
-  async verifyZoneExists(zoneId) {
-    const zone = await prisma.zone.findUnique({
+  async verifyZoneExists(zoneId, db = prisma) {
+    const zone = await db.zone.findUnique({
       where: { Zone_id: zoneId },
     });
 
@@ -1,5 +1,8 @@
 import { z } from 'zod';
-import { PERSON_TYPES } from '../config/constants.js';
+import { PERSON_TYPES, BULK_EVENTS } from '../config/constants.js';
+
+// Client-generated event ID; an event sent again with the same ID is not recorded twice
+const eventId = z.string().uuid('eventId must be a UUID').optional();
 
 export const entrySchema = z.object({
   body: z.object({
@@ -10,6 +13,7 @@ export const entrySchema = z.object({
     zoneId: z.number().int().positive('zoneId must be a positive integer'),
     cameraId: z.number().int().positive().optional(),
     timestamp: z.string().datetime().optional(), // ISO 8601 format
+    eventId,
   }),
 });
 
@@ -20,7 +24,38 @@ export const exitSchema = z.object({
     }),
     personId: z.number().int().positive('personId must be a positive integer'),
     zoneId: z.number().int().positive('zoneId must be a positive integer').optional(),
+    cameraId: z.number().int().positive().optional(),
     timestamp: z.string().datetime().optional(),
+    eventId,
+  }),
+});
+
+export const zoneSchema = z.object({
+  body: z.object({
+    personType: z.enum([PERSON_TYPES.TEACHER, PERSON_TYPES.STUDENT], {
+      errorMap: () => ({ message: 'personType must be TEACHER or STUDENT' }),
+    }),
+    personId: z.number().int().positive('personId must be a positive integer'),
+    zoneId: z.number().int().positive('zoneId must be a positive integer'),
+    timestamp: z.string().datetime().optional(),
+    eventId,
+  }),
+});
+
+// One event of a bulk request, checked on its own so that an invalid
+// event is reported in its result instead of failing the whole batch
+export const bulkEventSchema = z.discriminatedUnion('type', [
+  entrySchema.shape.body.extend({ type: z.literal('entry') }),
+  exitSchema.shape.body.extend({ type: z.literal('exit') }),
+  zoneSchema.shape.body.extend({ type: z.literal('zone') }),
+]);
+
+export const bulkEventsSchema = z.object({
+  body: z.object({
+    events: z
+      .array(z.object({}).passthrough())
+      .min(1, 'events must not be empty')
+      .max(BULK_EVENTS.MAX_EVENTS, `At most ${BULK_EVENTS.MAX_EVENTS} events per request`),
   }),
 });
 
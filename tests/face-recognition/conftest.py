@@ -0,0 +1,103 @@
+"""
+IntelliSight - Face Recognition Test Fixtures
+Author: IntelliSight Team
+Description: Shared fixtures for the face-recognition client tests (no backend needed)
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'face-recognition'))
+
+
+class StubResponse:
+    """Minimal requests.Response"""
+    
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+        self.text = str(data)
+    
+    def json(self):
+        return self.data
+
+
+class StubSession:
+    """
+    In-memory stand-in for the backend behind a requests.Session
+    
+    Records every event once per eventId like the backend does. Set
+    `bulk_status` to answer the bulk endpoint with an error status,
+    `fail_after` to fail bulk requests after that many succeeded and
+    `drop_results` to leave the last results out of a bulk response.
+    """
+    
+    def __init__(self):
+        self.recorded = []
+        self.seen = set()
+        self.requests = []
+        self.bulk_status = 200
+        self.fail_after = None
+        self.drop_results = 0
+    
+    def get(self, url, **kwargs):
+        self.requests.append(('GET', url))
+        return StubResponse(200, {'success': True})
+    
+    def post(self, url, json=None, **kwargs):
+        self.requests.append(('POST', url))
+        
+        if url.endswith('/auth/login'):
+            return StubResponse(200, {'success': True, 'data': {'token': 'token'}})
+        
+        if url.endswith('/timetable/bulk'):
+            if self.bulk_status != 200:
+                return StubResponse(self.bulk_status, {'success': False})
+            if self.fail_after is not None:
+                if self.fail_after <= 0:
+                    return StubResponse(500, {'success': False})
+                self.fail_after -= 1
+            
+            results = []
+            for index, event in enumerate(json['events']):
+                duplicate = self._record(event)
+                results.append({'index': index, 'success': True, 'eventId': event.get('eventId'),
+                                'duplicate': duplicate})
+            if self.drop_results:
+                results = results[:-self.drop_results]
+            return StubResponse(200, {'success': True, 'data': {
+                'results': results,
+                'recorded': sum(1 for item in results if not item['duplicate']),
+                'duplicates': sum(1 for item in results if item['duplicate']),
+                'rejected': 0,
+            }})
+        
+        event_type = url.rsplit('/', 1)[-1]
+        self._record(dict(json, type=event_type))
+        return StubResponse(201 if event_type == 'entry' else 200, {'success': True, 'data': {}})
+    
+    def _record(self, event):
+        """Record an event unless its eventId was seen; True for a duplicate"""
+        event_id = event.get('eventId')
+        if event_id is not None:
+            if event_id in self.seen:
+                return True
+            self.seen.add(event_id)
+        self.recorded.append(event)
+        return False
+    
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def stub_session():
+    """Backend stand-in"""
+    return StubSession()
+
+
+@pytest.fixture
+def journal_file(tmp_path):
+    """Offline log path in a fresh directory"""
+    return str(tmp_path / 'offline_entries.jsonl')
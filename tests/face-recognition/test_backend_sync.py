@@ -0,0 +1,145 @@
+"""
+IntelliSight - Backend Sync Tests
+Author: IntelliSight Team
+Description: Offline sync and bulk result reconciliation of BackendAPI against a stub session
+"""
+
+import pytest
+from send_to_backend import BackendAPI, BULK_MAX_EVENTS
+from send_zone_to_backend import ZoneTrackingAPI
+
+
+def make_api(journal_file, session, **config):
+    api = BackendAPI({
+        'api_base_url': 'http://backend.test/api',
+        'backend_url': 'http://backend.test',
+        'offline_log_file': journal_file,
+        'offline_fsync_interval': 0,
+        'async_dispatch': False,
+        **config
+    })
+    api.session = session
+    api.token = 'token'
+    api.is_online = True
+    return api
+
+
+@pytest.fixture
+def api(journal_file, stub_session):
+    api = make_api(journal_file, stub_session)
+    yield api
+    api.close()
+    api.journal.close()
+
+
+def entries(n):
+    return [{'type': 'entry', 'personType': 'STUDENT', 'personId': i} for i in range(n)]
+
+
+def test_post_events_reports_events_by_id(api, stub_session):
+    events = entries(3)
+    for i, event in enumerate(events):
+        event['eventId'] = f"id-{i}"
+    stub_session.drop_results = 1
+    
+    assert api._post_events(events) == [True, True, False]
+    
+    # Sending the batch again records only the missing event
+    stub_session.drop_results = 0
+    assert api._post_events(events) == [True, True, True]
+    assert [event['eventId'] for event in stub_session.recorded] == ['id-0', 'id-1', 'id-2']
+
+
+def test_sync_delivers_in_bulk_chunks_and_empties_the_journal(api, stub_session):
+    api.journal.extend(entries(BULK_MAX_EVENTS + 20))
+    
+    assert api.sync_offline_entries(force=True) == (BULK_MAX_EVENTS + 20, 0)
+    assert sum(1 for method, url in stub_session.requests if url.endswith('/bulk')) == 2
+    assert len(stub_session.recorded) == BULK_MAX_EVENTS + 20
+    assert len(api.journal) == 0
+
+
+def test_failed_chunk_keeps_the_cursor(api, stub_session):
+    api.journal.extend(entries(BULK_MAX_EVENTS + 20))
+    stub_session.fail_after = 1
+    
+    assert api.sync_offline_entries(force=True) == (BULK_MAX_EVENTS, 20)
+    assert len(api.journal) == 20
+    
+    stub_session.fail_after = None
+    assert api.sync_offline_entries(force=True) == (20, 0)
+    assert len(stub_session.recorded) == BULK_MAX_EVENTS + 20
+    assert len(api.journal) == 0
+
+
+def test_events_without_result_are_sent_again_once(api, stub_session):
+    api.journal.extend(entries(10))
+    stub_session.drop_results = 3
+    
+    assert api.sync_offline_entries(force=True) == (7, 3)
+    assert len(api.journal) == 3
+    
+    stub_session.drop_results = 0
+    api.sync_offline_entries(force=True)
+    
+    # The replayed events were recorded by the first request already
+    assert len(stub_session.recorded) == 10
+    assert len(api.journal) == 0
+
+
+def test_unknown_event_types_are_dropped(api, stub_session):
+    api.journal.extend(entries(1) + [{'type': 'zone', 'personId': 9}] + entries(1))
+    
+    assert api.sync_offline_entries(force=True) == (2, 0)
+    assert len(api.journal) == 0
+
+
+def test_sync_acks_chunks_across_a_compaction(journal_file, stub_session):
+    api = make_api(journal_file, stub_session, offline_compact_bytes=1)
+    api.journal.extend(entries(BULK_MAX_EVENTS + 100))
+    
+    # The first chunk's ack compacts the journal under the running sync;
+    # the response to the second loses its last 10 results
+    post = stub_session.post
+    def post_then_drop(url, **kwargs):
+        response = post(url, **kwargs)
+        if url.endswith('/bulk'):
+            stub_session.drop_results = 10
+        return response
+    stub_session.post = post_then_drop
+    
+    assert api.sync_offline_entries(force=True) == (BULK_MAX_EVENTS + 90, 10)
+    assert [event['personId'] for _, event in api.journal.read()] == list(range(590, 600))
+    
+    stub_session.drop_results = 0
+    stub_session.post = post
+    api.sync_offline_entries(force=True)
+    assert len(stub_session.recorded) == BULK_MAX_EVENTS + 100
+    assert len(api.journal) == 0
+    api.close()
+    api.journal.close()
+
+
+def test_backend_without_bulk_endpoint_is_asked_once(api, stub_session, tmp_path, monkeypatch):
+    monkeypatch.setattr('utils._bulk_unsupported', set())
+    stub_session.bulk_status = 404
+    
+    assert api._post_events(entries(2)) == [True, True]
+    assert api._post_events(entries(2)) == [True, True]
+    
+    # Other clients of the same backend skip the bulk endpoint as well
+    zone_api = ZoneTrackingAPI({
+        'api_base_url': api.api_base_url,
+        'zone_offline_log_file': str(tmp_path / 'offline_zone_updates.jsonl'),
+        'async_dispatch': False,
+    })
+    zone_api.session = stub_session
+    zone_api.token = 'token'
+    update = {'type': 'zone_update', 'personType': 'STUDENT', 'personId': 1, 'zoneId': 2}
+    assert zone_api._post_updates([update]) == [True]
+    zone_api.close()
+    zone_api.journal.close()
+    
+    bulk = [url for method, url in stub_session.requests if url.endswith('/bulk')]
+    assert len(bulk) == 1
+    assert len(stub_session.recorded) == 5
@@ -0,0 +1,128 @@
+"""
+IntelliSight - Event Dispatcher Tests
+Author: IntelliSight Team
+Description: Batching, jittered retries and offline fallback of EventDispatcher
+"""
+
+import threading
+from event_dispatcher import EventDispatcher
+
+
+class Recorder:
+    """deliver/fallback pair that records calls"""
+    
+    def __init__(self, outcomes=None):
+        self.batches = []
+        self.offline = []
+        self.outcomes = outcomes or []
+        self.lock = threading.Lock()
+    
+    def deliver(self, events):
+        with self.lock:
+            self.batches.append(list(events))
+            if self.outcomes:
+                return self.outcomes.pop(0)(events)
+        return [True] * len(events)
+    
+    def fallback(self, event):
+        with self.lock:
+            self.offline.append(event)
+
+
+def test_events_are_delivered_in_batches():
+    recorder = Recorder()
+    dispatcher = EventDispatcher(recorder.deliver, recorder.fallback, workers=1,
+                                 batch_size=10, linger=0.5)
+    for i in range(25):
+        dispatcher.submit({'n': i})
+    dispatcher.start()
+    dispatcher.stop()
+    
+    assert [len(batch) for batch in recorder.batches] == [10, 10, 5]
+    assert [event['n'] for batch in recorder.batches for event in batch] == list(range(25))
+    assert dispatcher.get_stats()['delivered'] == 25
+    assert recorder.offline == []
+
+
+def test_failed_events_are_retried_with_jittered_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr('event_dispatcher.random.uniform', lambda low, high: delays.append(high) or 0.0)
+    
+    # First attempt: second event fails; second attempt: it fails again; then it succeeds
+    recorder = Recorder([
+        lambda events: [True, False],
+        lambda events: [False],
+    ])
+    dispatcher = EventDispatcher(recorder.deliver, recorder.fallback, workers=1, batch_size=2,
+                                 linger=0.5, backoff=0.5, backoff_max=0.75)
+    dispatcher.submit({'n': 0})
+    dispatcher.submit({'n': 1})
+    dispatcher.start()
+    dispatcher.stop()
+    
+    assert recorder.batches == [[{'n': 0}, {'n': 1}], [{'n': 1}], [{'n': 1}]]
+    assert delays == [0.5, 0.75]  # doubled per retry, capped at backoff_max
+    assert dispatcher.get_stats()['retried'] == 2
+    assert recorder.offline == []
+
+
+def test_events_that_keep_failing_go_offline(monkeypatch):
+    monkeypatch.setattr('event_dispatcher.random.uniform', lambda low, high: 0.0)
+    
+    recorder = Recorder([lambda events: [False] * len(events)] * 3)
+    dispatcher = EventDispatcher(recorder.deliver, recorder.fallback, workers=1, max_retries=2)
+    dispatcher.submit({'n': 0})
+    dispatcher.start()
+    dispatcher.stop()
+    
+    assert len(recorder.batches) == 3
+    assert recorder.offline == [{'n': 0}]
+    assert dispatcher.get_stats()['stored_offline'] == 1
+
+
+def test_delivery_errors_count_as_failures(monkeypatch):
+    monkeypatch.setattr('event_dispatcher.random.uniform', lambda low, high: 0.0)
+    
+    def deliver(events):
+        raise RuntimeError("connection reset")
+    
+    offline = []
+    dispatcher = EventDispatcher(deliver, offline.append, workers=1, max_retries=1)
+    dispatcher.submit({'n': 0})
+    dispatcher.start()
+    dispatcher.stop()
+    
+    assert offline == [{'n': 0}]
+
+
+def test_events_go_offline_while_backend_unreachable():
+    recorder = Recorder()
+    dispatcher = EventDispatcher(recorder.deliver, recorder.fallback, can_send=lambda: False, workers=1)
+    dispatcher.submit({'n': 0})
+    dispatcher.start()
+    dispatcher.stop()
+    
+    assert recorder.batches == []
+    assert recorder.offline == [{'n': 0}]
+
+
+def test_full_queue_falls_back_without_blocking():
+    recorder = Recorder()
+    dispatcher = EventDispatcher(recorder.deliver, recorder.fallback, queue_size=2)
+    
+    assert dispatcher.submit({'n': 0}) and dispatcher.submit({'n': 1})
+    assert not dispatcher.submit({'n': 2})
+    assert recorder.offline == [{'n': 2}]
+
+
+def test_queued_job_runs_after_the_batch_before_it():
+    order = []
+    dispatcher = EventDispatcher(lambda events: order.extend(events) or [True] * len(events),
+                                 lambda event: None, workers=1, batch_size=10, linger=0.5)
+    dispatcher.submit('a')
+    dispatcher.submit('b')
+    dispatcher.run_in_background(lambda: order.append('job'))
+    dispatcher.start()
+    dispatcher.stop()
+    
+    assert order == ['a', 'b', 'job']
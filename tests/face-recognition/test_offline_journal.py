@@ -0,0 +1,245 @@
+"""
+IntelliSight - Offline Journal Tests
+Author: IntelliSight Team
+Description: Append, crash recovery, acknowledgement, compaction and legacy import of OfflineJournal
+"""
+
+import os
+import sys
+import json
+import pytest
+import subprocess
+from offline_journal import OfflineJournal, journal_path
+
+
+def events(n, start=0):
+    return [{'type': 'entry', 'personType': 'STUDENT', 'personId': i} for i in range(start, start + n)]
+
+
+def ids(records):
+    return [event['personId'] for _, event in records]
+
+
+@pytest.fixture
+def journal(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0)
+    yield journal
+    journal.close()
+
+
+def test_journal_path_maps_legacy_names():
+    assert journal_path('logs/offline_entries.json') == 'logs/offline_entries.jsonl'
+    assert journal_path('logs/offline_entries') == 'logs/offline_entries.jsonl'
+    assert journal_path('logs/offline_entries.jsonl') == 'logs/offline_entries.jsonl'
+
+
+def test_append_adds_timestamp_and_event_id(journal):
+    journal.append({'type': 'entry', 'personId': 1})
+    journal.append({'type': 'exit', 'personId': 1, 'eventId': 'given'})
+    
+    (_, first), (_, second) = journal.read()
+    assert first['timestamp'] and first['eventId']
+    assert second['eventId'] == 'given'
+    assert len(journal) == 2
+
+
+def test_events_survive_reopen(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0)
+    journal.extend(events(3))
+    journal.close()
+    
+    reopened = OfflineJournal(journal_file)
+    assert ids(reopened.read()) == [0, 1, 2]
+    assert len(reopened) == 3
+    reopened.close()
+
+
+def test_partial_last_record_is_dropped_on_open(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0)
+    journal.extend(events(2))
+    journal.close()
+    with open(journal_file, 'ab') as f:
+        f.write(b'{"type": "entry", "perso')
+    
+    reopened = OfflineJournal(journal_file)
+    assert ids(reopened.read()) == [0, 1]
+    reopened.append(events(1, start=2)[0])
+    assert ids(reopened.read()) == [0, 1, 2]
+    reopened.close()
+
+
+def test_ack_moves_the_cursor_and_persists(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0)
+    journal.extend(events(5))
+    records = journal.read()
+    journal.ack(records[1][0], 2)
+    
+    assert ids(journal.read()) == [2, 3, 4]
+    assert len(journal) == 3
+    
+    # An older offset changes nothing
+    journal.ack(records[0][0], 1)
+    assert len(journal) == 3
+    journal.close()
+    
+    reopened = OfflineJournal(journal_file)
+    assert ids(reopened.read()) == [2, 3, 4]
+    reopened.close()
+
+
+def test_acknowledging_everything_empties_the_journal(journal):
+    journal.extend(events(3))
+    records = journal.read()
+    journal.ack(records[-1][0], 3)
+    
+    assert journal.read() == []
+    assert len(journal) == 0
+    assert os.path.getsize(journal.path) == journal.start
+
+
+def test_compaction_keeps_the_unacknowledged_tail(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0, compact_bytes=1)
+    journal.extend(events(4))
+    generation = journal.generation
+    
+    records = journal.read()
+    journal.ack(records[2][0], 3)
+    
+    assert journal.generation == generation + 1
+    assert ids(journal.read()) == [3]
+    journal.append(events(1, start=4)[0])
+    journal.close()
+    
+    reopened = OfflineJournal(journal_file)
+    assert ids(reopened.read()) == [3, 4]
+    reopened.close()
+
+
+def test_ack_of_an_older_generation_is_ignored_on_open(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0)
+    journal.extend(events(3))
+    journal.close()
+    with open(f"{journal_file}.ack", 'w') as f:
+        json.dump({'generation': 0, 'offset': os.path.getsize(journal_file)}, f)
+    
+    reopened = OfflineJournal(journal_file)
+    assert ids(reopened.read()) == [0, 1, 2]
+    reopened.close()
+
+
+def test_clear(journal):
+    journal.extend(events(3))
+    journal.clear()
+    assert journal.read() == []
+    assert len(journal) == 0
+
+
+def test_legacy_json_log_is_imported_once(tmp_path):
+    legacy = tmp_path / 'offline_entries.json'
+    legacy.write_text(json.dumps(events(2)))
+    
+    journal = OfflineJournal(str(legacy))
+    assert journal.path == str(tmp_path / 'offline_entries.jsonl')
+    assert ids(journal.read()) == [0, 1]
+    assert all(event['eventId'] for _, event in journal.read())
+    journal.close()
+    
+    assert not legacy.exists()
+    assert (tmp_path / 'offline_entries.json.imported').exists()
+    
+    reopened = OfflineJournal(str(legacy))
+    assert ids(reopened.read()) == [0, 1]
+    reopened.close()
+
+
+
+def test_partial_ack_after_compaction(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0, compact_bytes=1)
+    journal.extend(events(6))
+    records = journal.read()
+    
+    # The sync acks chunk by chunk from one read; the first ack compacts
+    journal.ack(records[3][0], 4)
+    assert ids(journal.read()) == [4, 5]
+    
+    journal.ack(records[1][0], 2)
+    assert ids(journal.read()) == [4, 5]
+    
+    journal.ack(records[4][0], 1)
+    assert ids(journal.read()) == [5]
+    assert len(journal) == 1
+    journal.close()
+    
+    reopened = OfflineJournal(journal_file)
+    assert ids(reopened.read()) == [5]
+    reopened.close()
+
+
+def test_positions_from_a_read_during_compaction_stay_valid(journal_file):
+    journal = OfflineJournal(journal_file, fsync_interval=0, compact_bytes=1)
+    journal.extend(events(4))
+    first = journal.read()
+    journal.ack(first[2][0], 3)
+    journal.extend(events(2, start=4))
+    
+    # Positions of one read continue those handed out before the compaction
+    second = journal.read()
+    assert ids(second) == [3, 4, 5]
+    assert second[0][0] == first[3][0]
+    
+    journal.ack(second[1][0], 2)
+    assert ids(journal.read()) == [5]
+    journal.close()
+
+
+def test_corrupt_header_is_reported(journal_file):
+    with open(journal_file, 'w') as f:
+        f.write('[]\n')
+    
+    with pytest.raises(ValueError):
+        OfflineJournal(journal_file)
+
+
+def test_journal_held_by_another_process_is_refused(journal_file):
+    holder = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        with open(f"{journal_file}.lock", 'w') as f:
+            f.write(str(holder.pid))
+        
+        with pytest.raises(RuntimeError, match=str(holder.pid)):
+            OfflineJournal(journal_file)
+    finally:
+        holder.kill()
+        holder.wait()
+
+
+def test_lock_of_a_stopped_process_is_taken_over(journal_file):
+    stopped = subprocess.Popen([sys.executable, '-c', 'pass'])
+    stopped.wait()
+    with open(f"{journal_file}.lock", 'w') as f:
+        f.write(str(stopped.pid))
+    
+    journal = OfflineJournal(journal_file)
+    with open(f"{journal_file}.lock") as f:
+        assert f.read() == str(os.getpid())
+    journal.close()
+    assert not os.path.exists(f"{journal_file}.lock")
+
+
+def test_journal_is_open_once_per_process(journal_file):
+    journal = OfflineJournal(journal_file)
+    with pytest.raises(RuntimeError):
+        OfflineJournal(journal_file)
+    journal.close()
+    
+    # Released on close
+    OfflineJournal(journal_file).close()
+
+
+def test_failed_open_releases_the_lock(journal_file):
+    with open(journal_file, 'w') as f:
+        f.write('not a journal\n')
+    
+    with pytest.raises(ValueError):
+        OfflineJournal(journal_file)
+    assert not os.path.exists(f"{journal_file}.lock")
@@ -1,5 +1,6 @@
 import { describe, test, expect, beforeAll, beforeEach } from '@jest/globals';
 import request from 'supertest';
+import { randomUUID } from 'crypto';
 import app from '../src/app.js';
 import { prisma } from '../src/config/database.js';
 
@@ -93,6 +94,44 @@ describe('TimeTable API - Entry/Exit Logic', () => {
       expect(response.body.message).toContain('already has an active entry');
     });
 
+    test('should return the recorded entry when the same eventId is sent again', async () => {
+      const entry = {
+        eventId: randomUUID(),
+        personType: 'STUDENT',
+        personId: testStudentId,
+        zoneId: testZoneId,
+      };
+
+      const first = await request(app)
+        .post('/api/timetable/entry')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send(entry)
+        .expect(201);
+
+      // A retry is not a duplicate open entry (no 409)
+      const retry = await request(app)
+        .post('/api/timetable/entry')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send(entry)
+        .expect(201);
+
+      expect(retry.body.message).toBe('Event already recorded');
+      expect(retry.body.data.TimeTable_ID).toBe(first.body.data.TimeTable_ID);
+    });
+
+    test('should reject an eventId that is not a UUID', async () => {
+      await request(app)
+        .post('/api/timetable/entry')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({
+          eventId: 'not-a-uuid',
+          personType: 'STUDENT',
+          personId: testStudentId,
+          zoneId: testZoneId,
+        })
+        .expect(422);
+    });
+
     test('should record entry for teacher', async () => {
       const response = await request(app)
         .post('/api/timetable/entry')
@@ -192,6 +231,206 @@ describe('TimeTable API - Entry/Exit Logic', () => {
     });
   });
 
+  describe('POST /api/timetable/zone', () => {
+    test('should open an entry and move it to another zone', async () => {
+      const first = await request(app)
+        .post('/api/timetable/zone')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({
+          personType: 'STUDENT',
+          personId: testStudentId,
+          zoneId: testZoneId,
+        })
+        .expect(200);
+
+      expect(first.body.data).toHaveProperty('Zone_id', testZoneId);
+      expect(first.body.data).toHaveProperty('ExitTime', null);
+
+      // Same zone again keeps the open entry
+      const same = await request(app)
+        .post('/api/timetable/zone')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({
+          personType: 'STUDENT',
+          personId: testStudentId,
+          zoneId: testZoneId,
+        })
+        .expect(200);
+
+      expect(same.body.data.TimeTable_ID).toBe(first.body.data.TimeTable_ID);
+
+      const moved = await request(app)
+        .post('/api/timetable/zone')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({
+          personType: 'STUDENT',
+          personId: testStudentId,
+          zoneId: testZoneId + 1,
+        })
+        .expect(200);
+
+      expect(moved.body.data).toHaveProperty('Zone_id', testZoneId + 1);
+
+      const previous = await prisma.timeTable.findUnique({
+        where: { TimeTable_ID: first.body.data.TimeTable_ID },
+      });
+      expect(previous.ExitTime).not.toBeNull();
+    });
+  });
+
+  describe('POST /api/timetable/bulk', () => {
+    test('should apply events in order in one request', async () => {
+      const response = await request(app)
+        .post('/api/timetable/bulk')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({
+          events: [
+            {
+              type: 'entry',
+              personType: 'STUDENT',
+              personId: testStudentId,
+              zoneId: testZoneId,
+              timestamp: '2025-11-19T08:00:00Z',
+            },
+            {
+              type: 'exit',
+              personType: 'STUDENT',
+              personId: testStudentId,
+              zoneId: testZoneId,
+              timestamp: '2025-11-19T12:00:00Z',
+            },
+          ],
+        })
+        .expect('Content-Type', /json/)
+        .expect(200);
+
+      expect(response.body).toHaveProperty('success', true);
+      expect(response.body.data).toHaveProperty('recorded', 2);
+      expect(response.body.data).toHaveProperty('rejected', 0);
+
+      const [entry, exit] = response.body.data.results;
+      expect(entry).toMatchObject({ index: 0, type: 'entry', success: true });
+      expect(exit).toMatchObject({ index: 1, type: 'exit', success: true });
+
+      // The exit closed the entry from the same batch
+      expect(exit.id).toBe(entry.id);
+    });
+
+    test('should report rejected events without failing the batch', async () => {
+      const response = await request(app)
+        .post('/api/timetable/bulk')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({
+          events: [
+            { type: 'entry', personType: 'STUDENT', personId: 999999, zoneId: testZoneId },
+            { type: 'entry', personType: 'INVALID', personId: testStudentId, zoneId: testZoneId },
+            { type: 'entry', personType: 'TEACHER', personId: testTeacherId, zoneId: testZoneId },
+          ],
+        })
+        .expect(200);
+
+      expect(response.body.data).toHaveProperty('recorded', 1);
+      expect(response.body.data).toHaveProperty('rejected', 2);
+
+      const [missing, invalid, recorded] = response.body.data.results;
+      expect(missing).toMatchObject({ index: 0, success: false, statusCode: 404 });
+      expect(invalid).toMatchObject({ index: 1, success: false, statusCode: 422 });
+      expect(recorded).toMatchObject({ index: 2, success: true });
+    });
+
+    test('should not record a replayed event twice', async () => {
+      const events = [
+        {
+          type: 'entry',
+          eventId: randomUUID(),
+          personType: 'STUDENT',
+          personId: testStudentId,
+          zoneId: testZoneId,
+          timestamp: '2025-11-19T08:00:00Z',
+        },
+        {
+          type: 'exit',
+          eventId: randomUUID(),
+          personType: 'STUDENT',
+          personId: testStudentId,
+          zoneId: testZoneId,
+          timestamp: '2025-11-19T12:00:00Z',
+        },
+      ];
+
+      const first = await request(app)
+        .post('/api/timetable/bulk')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({ events })
+        .expect(200);
+
+      const rows = await prisma.timeTable.count({ where: { Student_ID: testStudentId } });
+
+      // Same events again, e.g. an offline sync retried after a lost response
+      const replay = await request(app)
+        .post('/api/timetable/bulk')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({ events })
+        .expect(200);
+
+      expect(replay.body.data).toMatchObject({ recorded: 2, duplicates: 2, rejected: 0 });
+      replay.body.data.results.forEach((result, index) => {
+        expect(result).toMatchObject({
+          eventId: events[index].eventId,
+          success: true,
+          duplicate: true,
+          id: first.body.data.results[index].id,
+        });
+      });
+
+      const rowsAfterReplay = await prisma.timeTable.count({ where: { Student_ID: testStudentId } });
+      expect(rowsAfterReplay).toBe(rows);
+    });
+
+    test('should record an eventId repeated within one request once', async () => {
+      const entry = {
+        type: 'entry',
+        eventId: randomUUID(),
+        personType: 'STUDENT',
+        personId: testStudentId,
+        zoneId: testZoneId,
+        timestamp: '2025-11-19T08:00:00Z',
+      };
+
+      const rows = await prisma.timeTable.count({ where: { Student_ID: testStudentId } });
+
+      // E.g. an event queued twice by a client before its first send completed
+      const response = await request(app)
+        .post('/api/timetable/bulk')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({ events: [entry, entry] })
+        .expect(200);
+
+      expect(response.body.data).toMatchObject({ recorded: 2, duplicates: 1, rejected: 0 });
+
+      const [first, repeated] = response.body.data.results;
+      expect(first).toMatchObject({ index: 0, eventId: entry.eventId, success: true, duplicate: false });
+      expect(repeated).toMatchObject({
+        index: 1,
+        eventId: entry.eventId,
+        success: true,
+        duplicate: true,
+        id: first.id,
+      });
+
+      const rowsAfter = await prisma.timeTable.count({ where: { Student_ID: testStudentId } });
+      expect(rowsAfter).toBe(rows + 1);
+    });
+
+    test('should reject an empty batch', async () => {
+      await request(app)
+        .post('/api/timetable/bulk')
+        .set('Authorization', `Bearer ${authToken}`)
+        .send({ events: [] })
+        .expect(422);
+    });
+  });
+
   describe('GET /api/timetable/active', () => {
     test('should get all currently active persons', async () => {
       // First create a new entry for a student who doesn't have an open entry